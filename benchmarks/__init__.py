@@ -0,0 +1,6 @@
+"""
+Замеры производительности транслятора Pascal → C++
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_lexer
+"""
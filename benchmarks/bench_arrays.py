@@ -0,0 +1,169 @@
+"""
+Обращения к массивам в сгенерированном C++: вычитание начала диапазона при
+каждом обращении (rebase_arrays=False) против циклов for по индексам C++.
+Ядра повторяют examples/sorting.pas и examples/arrays.pas на больших
+массивах; нужен g++
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+
+from benchmarks.common import best_time
+from src.codegen import CodeGenerator
+from src.lexer import Lexer
+from src.parser import Parser
+
+SIZE = 12000
+
+KERNELS = {
+    # Сортировка пузырьком из examples/sorting.pas
+    "sorting": """
+program BubbleSort;
+var
+    arr: array[1..{size}] of integer;
+    i, seed: integer;
+
+procedure swap(var a, b: integer);
+var
+    temp: integer;
+begin
+    temp := a;
+    a := b;
+    b := temp;
+end;
+
+procedure bubbleSort(var a: array[1..{size}] of integer; size: integer);
+var
+    i, j: integer;
+    swapped: boolean;
+begin
+    for i := 1 to size - 1 do
+    begin
+        swapped := false;
+        for j := 1 to size - i do
+            if a[j] > a[j + 1] then
+            begin
+                swap(a[j], a[j + 1]);
+                swapped := true;
+            end;
+        if not swapped then
+            break;
+    end
+end;
+
+begin
+    seed := 1;
+    for i := 1 to {size} do
+    begin
+        seed := (seed * 1103 + 12345) mod 65536;
+        arr[i] := seed;
+    end;
+    bubbleSort(arr, {size});
+    writeln(arr[1], ' ', arr[{size}]);
+end.
+""",
+    # Сумма и максимум из examples/arrays.pas, много проходов
+    "arrays": """
+program ArrayDemo;
+var
+    arr: array[1..{size}] of integer;
+    i, k, sum, max: integer;
+begin
+    for i := 1 to {size} do
+        arr[i] := (i * 7919) mod 10;
+    sum := 0;
+    max := 0;
+    for k := 1 to 20000 do
+    begin
+        for i := 1 to {size} do
+            sum := sum + arr[i];
+        for i := 2 to {size} do
+            if arr[i] > max then
+                max := arr[i];
+        arr[k mod {size} + 1] := k mod 10;
+        sum := sum mod 1000000;
+    end;
+    writeln(sum, ' ', max);
+end.
+""",
+    # Диапазон не с начала: цикл for идет сразу по индексам C++
+    "offset": """
+program Offset;
+var
+    a, b: array[1000..{last}] of integer;
+    i, k, sum: integer;
+begin
+    for i := 1000 to {last} do
+        a[i] := i mod 97;
+    sum := 0;
+    for k := 1 to 20000 do
+    begin
+        for i := 1000 to {last} do
+            b[i] := a[i] + b[i];
+        sum := (sum + b[{last}]) mod 1000000;
+    end;
+    writeln(sum);
+end.
+""",
+}
+
+
+def translate(source: str, rebase_arrays: bool) -> str:
+    program = Parser(Lexer(source).tokenize()).parse()
+    return CodeGenerator(rebase_arrays=rebase_arrays).generate(program)
+
+
+def build(compiler: str, code: str, directory: str, name: str, level: str) -> tuple:
+    # Исполняемый файл и ассемблерный код (без имени исходного файла)
+    source_path = os.path.join(directory, f"{name}.cpp")
+    binary_path = os.path.join(directory, f"{name}{level}")
+    with open(source_path, "w", encoding="utf-8") as file:
+        file.write(code)
+    subprocess.run([compiler, level, "-w", "-o", binary_path, source_path], check=True)
+    assembly = subprocess.run(
+        [compiler, level, "-w", "-S", "-o", "-", source_path],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return binary_path, assembly.replace(name, "")
+
+
+def run(binary_path: str) -> str:
+    return subprocess.run([binary_path], capture_output=True, text=True, check=True).stdout
+
+
+def main():
+    compiler = shutil.which("g++")
+    if compiler is None:
+        print("g++ не найден")
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, template in KERNELS.items():
+            source = template.replace("{size}", str(SIZE)).replace("{last}", str(999 + SIZE))
+            codes = [translate(source, rebase_arrays) for rebase_arrays in (False, True)]
+            print(f"{name}:")
+            for level in ("-O0", "-O1", "-O2"):
+                outputs, times, assemblies = [], [], []
+                for number, code in enumerate(codes):
+                    binary_path, assembly = build(
+                        compiler, code, directory, f"{name}{number}", level
+                    )
+                    outputs.append(run(binary_path))
+                    times.append(best_time(lambda: run(binary_path), repeat=5))
+                    assemblies.append(assembly)
+                assert outputs[0] == outputs[1], f"{name}: разный вывод"
+                # Если компилятор сам убрал вычитания, разница во времени — шум
+                note = (
+                    "машинный код совпадает" if assemblies[0] == assemblies[1]
+                    else f"ускорение {times[0] / times[1]:5.2f}x"
+                )
+                print(
+                    f"  {level}  вычитание {times[0]:7.3f} с  индексы C++ {times[1]:7.3f} с"
+                    f"  {note}"
+                )
+
+
+if __name__ == "__main__":
+    main()
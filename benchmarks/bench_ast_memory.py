@@ -0,0 +1,110 @@
+"""
+Сравнение памяти, занимаемой AST: узлы со __slots__ против узлов со
+словарем атрибутов (__dict__) и собственными пустыми списками, а также
+плоская арена ASTArena; те и другие — с хеш-консингом выражений и без него
+"""
+
+from dataclasses import make_dataclass
+
+from benchmarks.common import generate_program, traced_size
+from src import ast_nodes
+from src.ast_nodes import ASTArena, ASTNode, InterningNodes, Statement, node_fields
+from src.lexer import Lexer
+from src.parser import Parser
+
+
+def dict_classes() -> dict:
+    # Копии классов узлов без __slots__, как до перехода на слоты
+    twins = {}
+    for value in vars(ast_nodes).values():
+        if isinstance(value, type) and issubclass(value, ASTNode):
+            twins[value] = make_dataclass(
+                value.__name__,
+                [(field.name, field.type) for field in node_fields(value)],
+            )
+    return twins
+
+
+def to_dict_nodes(root, twins: dict):
+    # Перестраивает дерево на классах без слотов (без рекурсии).
+    # Общий пустой кортеж заменяется собственным пустым списком
+    def convert(value):
+        if isinstance(value, ASTNode):
+            node = twins[type(value)].__new__(twins[type(value)])
+            pending.append((value, node))
+            return node
+        if isinstance(value, list) or value == ():
+            return [convert(item) for item in value]
+        if isinstance(value, tuple):
+            return tuple(convert(item) for item in value)
+        return value
+
+    pending = []
+    result = convert(root)
+    while pending:
+        source, node = pending.pop()
+        for field in node_fields(source):
+            setattr(node, field.name, convert(getattr(source, field.name)))
+    return result
+
+
+def count_statements(root) -> int:
+    count = 0
+    stack = [root]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, ASTNode):
+            count += isinstance(value, Statement)
+            stack.extend(getattr(value, field.name) for field in node_fields(value))
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return count
+
+
+def main():
+    source = generate_program(2000)
+    twins = dict_classes()
+
+    def parse():
+        return Parser(Lexer(source).tokenize()).parse()
+
+    def parse_interned():
+        # Таблица интернирования нужна только при разборе
+        return Parser(Lexer(source).tokenize(), nodes=InterningNodes()).parse()
+
+    def parse_arena(interning: bool = False):
+        arena = ASTArena()
+        nodes = arena.builder()
+        if interning:
+            nodes = InterningNodes(nodes)
+        Parser(Lexer(source).tokenize(), nodes=nodes).parse()
+        return arena
+
+    program, slotted = traced_size(parse)
+    _, interned = traced_size(parse_interned)
+    arena, packed = traced_size(parse_arena)
+    shared, packed_interned = traced_size(lambda: parse_arena(True))
+    _, plain = traced_size(lambda: to_dict_nodes(parse(), twins))
+    statements = count_statements(program)
+    scale = 100_000 / statements
+
+    rows = [
+        ("__dict__", plain),
+        ("__slots__", slotted),
+        ("__slots__ + интернирование", interned),
+        ("ASTArena", packed),
+        ("ASTArena + интернирование", packed_interned),
+    ]
+
+    print(f"Операторов в программе: {statements}")
+    for label, size in rows:
+        print(
+            f"  {label:28} {size / 2**20:7.2f} МБ  {size * scale / 2**20:7.2f} МБ "
+            f"на 100 тыс. операторов  ({plain / size:.1f}x)"
+        )
+    print(f"Узлов в арене: {len(arena)} ({packed / len(arena):.1f} байт/узел, "
+          f"объекты: {slotted / len(arena):.1f} байт/узел), "
+          f"с интернированием: {len(shared)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Скорость генерации кода C++ на большом AST: CodeGenerator (таблица
+диспетчеризации NodeVisitor) и ChainCodeGenerator (цепочка isinstance).
+Таблица — переход на общий обход AST, а не ускорение: замер проверяет,
+что генерация не стала медленнее
+"""
+
+from typing import List
+
+from benchmarks.common import best_time, generate_program
+from src.ast_nodes import (
+    Statement,
+    CompoundStatement,
+    AssignmentStatement,
+    IfStatement,
+    WhileStatement,
+    RepeatStatement,
+    ForStatement,
+    CaseStatement,
+    ProcedureCall,
+    EmptyStatement,
+    Expression,
+    BinaryOp,
+    UnaryOp,
+    Variable,
+    IntegerLiteral,
+    RealLiteral,
+    StringLiteral,
+    CharLiteral,
+    BooleanLiteral,
+    FunctionCall,
+)
+from src.codegen import CodeGenerator
+from src.lexer import Lexer
+from src.parser import Parser
+from src.semantic import analyze
+
+
+class ChainCodeGenerator(CodeGenerator):
+    # Выбор метода для узла цепочкой isinstance, как до таблицы
+    # диспетчеризации NodeVisitor. Эталон для проверки, что CodeGenerator
+    # строит тот же код и не медленнее
+
+    def generate_statements(self, statements: List[Statement], function_name=None):
+        work = list(reversed(statements))
+
+        while work:
+            item = work.pop()
+
+            if isinstance(item, str):
+                self.emit_line(item)
+                continue
+
+            if isinstance(item, int):
+                self.indent_level += item
+                continue
+
+            if isinstance(item, dict):
+                self.offsets = item
+                continue
+
+            if self.line_index is not None:
+                self.mark(item)
+
+            if isinstance(item, CompoundStatement):
+                self.visit_CompoundStatement(item, work, function_name)
+            elif isinstance(item, AssignmentStatement):
+                self.visit_AssignmentStatement(item, work, function_name)
+            elif isinstance(item, IfStatement):
+                self.visit_IfStatement(item, work, function_name)
+            elif isinstance(item, WhileStatement):
+                self.visit_WhileStatement(item, work, function_name)
+            elif isinstance(item, RepeatStatement):
+                self.visit_RepeatStatement(item, work, function_name)
+            elif isinstance(item, ForStatement):
+                self.visit_ForStatement(item, work, function_name)
+            elif isinstance(item, CaseStatement):
+                self.visit_CaseStatement(item, work, function_name)
+            elif isinstance(item, ProcedureCall):
+                self.visit_ProcedureCall(item, work, function_name)
+            elif isinstance(item, EmptyStatement):
+                self.visit_EmptyStatement(item, work, function_name)
+            else:
+                self.generic_visit(item, work, function_name)
+
+    def generate_expression(self, expr: Expression) -> str:
+        parts = []
+        work = [expr]
+
+        while work:
+            item = work.pop()
+
+            if isinstance(item, str):
+                parts.append(item)
+            elif isinstance(item, BinaryOp):
+                self.visit_BinaryOp(item, parts, work)
+            elif isinstance(item, UnaryOp):
+                self.visit_UnaryOp(item, parts, work)
+            elif isinstance(item, Variable):
+                self.visit_Variable(item, parts, work)
+            elif isinstance(item, IntegerLiteral):
+                self.visit_IntegerLiteral(item, parts, work)
+            elif isinstance(item, RealLiteral):
+                self.visit_RealLiteral(item, parts, work)
+            elif isinstance(item, StringLiteral):
+                self.visit_StringLiteral(item, parts, work)
+            elif isinstance(item, CharLiteral):
+                self.visit_CharLiteral(item, parts, work)
+            elif isinstance(item, BooleanLiteral):
+                self.visit_BooleanLiteral(item, parts, work)
+            elif isinstance(item, FunctionCall):
+                self.visit_FunctionCall(item, parts, work)
+            else:
+                self.generic_visit(item, parts, work)
+
+        return "".join(parts)
+
+
+def main():
+    source = generate_program(2000)
+    program = Parser(Lexer(source).tokenize()).parse()
+    # Семантический анализ общий для обоих генераторов и в замер не входит
+    semantics = analyze(program)
+
+    code = CodeGenerator().generate(program, semantics)
+    assert code == ChainCodeGenerator().generate(program, semantics), "Код C++ различается"
+    lines = len(code.splitlines())
+    # Текст не удерживается во время замеров
+    del code
+
+    print(f"Строк C++: {lines}")
+
+    results = {}
+    for name, generator_class in (
+        ("ChainCodeGenerator", ChainCodeGenerator), ("CodeGenerator", CodeGenerator)
+    ):
+        seconds = best_time(lambda: generator_class().generate(program, semantics), repeat=5)
+        results[name] = seconds
+        print(f"  {name:<18} {seconds:7.3f} с  {lines / seconds / 1e3:7.1f} тыс. строк/с")
+
+    print(f"Отношение времени: {results['ChainCodeGenerator'] / results['CodeGenerator']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
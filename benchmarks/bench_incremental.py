@@ -0,0 +1,71 @@
+"""
+Односимвольные правки файла в 100 тысяч строк:
+полный повторный разбор против IncrementalLexer.edit и IncrementalParser.edit
+"""
+
+import random
+import re
+import time
+
+from benchmarks.common import best_time, generate_program
+from src.lexer import IncrementalLexer, Lexer
+from src.parser import IncrementalParser, Parser
+
+EDITS = 200
+
+
+def main():
+    source = generate_program(4000)
+    print(f"Исходный код: {len(source.splitlines())} строк, {len(source)} символов")
+
+    full = best_time(lambda: Lexer(source).tokenize(), repeat=3)
+    print(f"  Полный разбор:          {full * 1000:8.2f} мс")
+
+    incremental = IncrementalLexer(source)
+    random.seed(0)
+    elapsed = 0.0
+    for _ in range(EDITS):
+        # Замена одного символа внутри идентификатора или комментария
+        offset = random.randrange(len(incremental.source))
+        while not incremental.source[offset].isalpha():
+            offset = random.randrange(len(incremental.source))
+        start = time.perf_counter()
+        incremental.edit(offset, 1, "z")
+        elapsed += time.perf_counter() - start
+    per_edit = elapsed / EDITS
+    print(f"  Инкрементальная правка: {per_edit * 1000:8.2f} мс (в среднем)")
+    print(f"Ускорение: {full / per_edit:.0f}x")
+
+    expected = Lexer(incremental.source).tokenize()
+    assert incremental.tokens == expected, "Потоки токенов различаются"
+
+    bench_parser(source)
+
+
+def bench_parser(source: str):
+    full = best_time(lambda: Parser(Lexer(source).tokenize()).parse(), repeat=3)
+    print(f"  Полный разбор + AST:    {full * 1000:8.2f} мс")
+
+    incremental = IncrementalParser(source)
+    # Правки в числовых литералах тел подпрограмм: программа остается верной
+    digits = [m.start() for m in re.finditer(r"(?<=total > )\d", source)]
+    random.seed(0)
+    elapsed = 0.0
+    reused = 0
+    for _ in range(EDITS):
+        offset = random.choice(digits)
+        start = time.perf_counter()
+        incremental.edit(offset, 1, str(random.randrange(1, 10)))
+        elapsed += time.perf_counter() - start
+        reused += incremental.reused
+    per_edit = elapsed / EDITS
+    print(f"  Инкрементальный разбор: {per_edit * 1000:8.2f} мс (в среднем, "
+          f"переиспользовано {reused / EDITS:.0f} подпрограмм)")
+    print(f"Ускорение: {full / per_edit:.0f}x")
+
+    expected = Parser(Lexer(incremental.lexer.source).tokenize()).parse()
+    assert incremental.program == expected, "Деревья различаются"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Сравнение пропускной способности Lexer (мастер-шаблон)
+и CharLexer (исходный посимвольный разбор)
+"""
+
+from benchmarks.common import best_time, generate_program
+from src.lexer import CharLexer, Lexer
+
+
+def main():
+    source = generate_program(2000)
+    size_mb = len(source.encode("utf-8")) / 2**20
+
+    reference = CharLexer(source).tokenize()
+    tokens = Lexer(source).tokenize()
+    assert tokens == reference, "Потоки токенов различаются"
+
+    print(f"Исходный код: {len(source.splitlines())} строк, {size_mb:.2f} МБ, "
+          f"{len(tokens)} токенов")
+
+    results = {}
+    for name, lexer_class in (("CharLexer", CharLexer), ("Lexer", Lexer)):
+        seconds = best_time(lambda: lexer_class(source).tokenize(), repeat=3)
+        results[name] = seconds
+        print(f"  {name:<10} {seconds:7.3f} с  {size_mb / seconds:7.2f} МБ/с  "
+              f"{len(tokens) / seconds / 1e6:6.2f} млн токенов/с")
+
+    print(f"Ускорение: {results['CharLexer'] / results['Lexer']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Масштабирование трансляции глубоко вложенных программ
+Проверяет, что время растет линейно с глубиной вложенности и не
+упирается в предел рекурсии Python, в том числе с оптимизацией (-O)
+"""
+
+import sys
+
+from benchmarks.common import best_time, translate_optimized
+from src.codegen import CodeGenerator
+from src.lexer import Lexer
+from src.parser import Parser
+
+DEPTHS = (25_000, 50_000, 100_000)
+
+# Оптимизация медленнее разбора и генерации, поэтому глубины меньше
+OPTIMIZED_DEPTHS = (2_500, 5_000, 10_000)
+
+# Допустимое отклонение времени на один уровень вложенности от самой
+# малой глубины к самой большой (линейный рост дает около 1)
+MAX_GROWTH = 2.0
+
+SHAPES = {
+    "begin ... end": lambda n: "begin " * n + "x := 1" + " end" * n,
+    "else if": lambda n: "if x = 0 then x := 0 else " * n + "x := 1",
+    "while ... do": lambda n: "while x > 0 do " * n + "x := x - 1",
+    "(((...)))": lambda n: "x := " + "(" * n + "1" + ")" * n,
+    "a + b + ...": lambda n: "x := " + " + ".join(["x"] * n),
+    "not not ...": lambda n: "b := " + "not " * n + "true",
+    "f(f(...))": lambda n: "x := " + "f(" * n + "1" + ")" * n,
+    "a[a[...]]": lambda n: "x := " + "a[" * n + "1" + "]" * n,
+    "for i0, i1 ...": lambda n: (
+        "".join(f"for i{k} := 1 to 2 do " for k in range(n)) + "a[i0] := 1",
+        [f"i{k}" for k in range(n)],
+    ),
+}
+
+# Вложенные циклы: анализ потока данных оптимизатора (список работ) не
+# обходит граф заново целиком на каждом уровне вложенности
+OPTIMIZED_SHAPES = {
+    "while ... do -O": SHAPES["while ... do"],
+}
+
+
+def wrap(statement: str, variables: list = ()) -> str:
+    # variables — дополнительные переменные integer (например, счетчики
+    # вложенных циклов)
+    declarations = f"    {', '.join(variables)}: integer;\n" if variables else ""
+    return (
+        "program Deep;\nvar\n    x: integer;\n    b: boolean;\n"
+        "    a: array[1..10] of integer;\n"
+        f"{declarations}begin\n{statement}\nend.\n"
+    )
+
+
+def translate(source: str) -> str:
+    ast = Parser(Lexer(source).tokenize()).parse()
+    return CodeGenerator().generate(ast)
+
+
+def measure(shapes: dict, depths: tuple, translate_source):
+    print(f"{'Конструкция':<16}" + "".join(f"{depth:>12}" for depth in depths) + "   Рост")
+
+    for name, build in shapes.items():
+        times = []
+        for depth in depths:
+            # Конструкция — оператор или (оператор, переменные)
+            built = build(depth)
+            source = wrap(*built) if isinstance(built, tuple) else wrap(built)
+            times.append(best_time(lambda: translate_source(source), repeat=3))
+
+        growth = (times[-1] / depths[-1]) / (times[0] / depths[0])
+        print(f"{name:<16}" + "".join(f"{t:11.3f}с" for t in times) + f"   {growth:4.2f}")
+        assert growth < MAX_GROWTH, f"{name}: время растет быстрее линейного"
+
+
+def main():
+    limit = sys.getrecursionlimit()
+    print(f"Предел рекурсии: {limit}")
+    measure(SHAPES, DEPTHS, translate)
+    print()
+    measure(OPTIMIZED_SHAPES, OPTIMIZED_DEPTHS, translate_optimized)
+
+    assert sys.getrecursionlimit() == limit
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Проверка оптимизации (-O) на исполняемых программах: вывод программы,
+оттранслированной с -O, должен совпадать с выводом без оптимизации.
+Программы — examples/*.pas и случаи, на которых оптимизация или
+генерация кода раньше меняли поведение (для них известен и точный
+вывод); нужен g++
+"""
+
+import glob
+import os
+import shutil
+import subprocess
+import tempfile
+
+from benchmarks.common import translate_optimized
+from src.codegen import CodeGenerator
+from src.lexer import Lexer
+from src.parser import Parser
+
+# Ввод для программ, которые читают числа
+INPUT = "5 3 1 2 4 6 7 8 9 10\n" * 4
+
+# Секунд на запуск программы: зациклившаяся программа — ошибка, а не ожидание
+RUN_TIMEOUT = 10
+
+REGRESSIONS = {
+    # Индекс следующего аргумента read читает только что прочитанную
+    # переменную: общее подвыражение i + 1 нельзя вычислить до read
+    "read_indices": """
+program ReadIndices;
+var
+    i: integer;
+    a: array[1..10] of integer;
+begin
+    read(i, a[i + 1], a[i + 1]);
+    writeln(i, ' ', a[i + 1]);
+end.
+""",
+    # and, or и not над integer — поразрядные и со сверткой констант, и без
+    "integer_logic": """
+program IntegerLogic;
+var
+    x, y: integer;
+    p, q: boolean;
+begin
+    readln(x, y);
+    p := x > y;
+    q := x < 3;
+    writeln(x and y, ' ', x or y, ' ', x xor y, ' ', not x);
+    writeln(6 and 3, ' ', 6 or 3, ' ', 6 xor 3, ' ', not 6);
+    writeln(p and q, ' ', p or q, ' ', p xor q, ' ', not p);
+end.
+""",
+    # Одно вынесенное выражение для двух циклов, пока его переменные не
+    # меняются, и новое — после изменения
+    "shared_invariants": """
+program SharedInvariants;
+var
+    i, n, s: integer;
+    a: array[1..10] of integer;
+begin
+    readln(n);
+    s := 0;
+    for i := 1 to n do
+        s := s + sqr(n) + sqr(n);
+    for i := 1 to n do
+        a[i] := sqr(n) * i;
+    n := n div 2;
+    for i := 1 to 3 do
+        s := s + sqr(n);
+    writeln(s, ' ', a[3]);
+end.
+""",
+    # Конец диапазона for — наибольшее значение integer (для downto —
+    # наименьшее): переменная цикла не должна переполняться после
+    # последнего шага
+    "for_type_bounds": """
+program ForTypeBounds;
+var
+    i, n, m, k, s: integer;
+begin
+    n := 2147483647;
+    k := 0;
+    for i := 2147483645 to n do
+    begin
+        k := k + 1;
+        if k > 5 then break
+    end;
+    m := -n - 1;
+    s := 0;
+    for i := -2147483646 downto m do
+    begin
+        s := s + 1;
+        if s > 5 then break;
+        continue
+    end;
+    writeln(k, ' ', s);
+    k := 0;
+    for i := 2147483646 to 2147483647 do k := k + 1;
+    for i := 3 to 1 do k := k + 100;
+    writeln(k);
+end.
+""",
+}
+
+# Ожидаемый вывод (программы, для которых он известен)
+EXPECTED = {
+    "for_type_bounds": "3 3\n2\n",
+}
+
+
+def translate(source: str) -> str:
+    return CodeGenerator().generate(Parser(Lexer(source).tokenize()).parse())
+
+
+def build(compiler: str, code: str, directory: str, name: str) -> str:
+    source_path = os.path.join(directory, f"{name}.cpp")
+    binary_path = os.path.join(directory, name)
+    with open(source_path, "w", encoding="utf-8") as file:
+        file.write(code)
+    subprocess.run([compiler, "-O2", "-w", "-o", binary_path, source_path], check=True)
+    return binary_path
+
+
+def run(binary_path: str) -> str:
+    return subprocess.run(
+        [binary_path], input=INPUT, capture_output=True, text=True, check=True,
+        timeout=RUN_TIMEOUT,
+    ).stdout
+
+
+def main():
+    compiler = shutil.which("g++")
+    if compiler is None:
+        print("g++ не найден")
+        return
+
+    programs = dict(REGRESSIONS)
+    examples = os.path.join(os.path.dirname(__file__), "..", "examples", "*.pas")
+    for path in sorted(glob.glob(examples)):
+        with open(path, encoding="utf-8") as file:
+            programs[os.path.basename(path)] = file.read()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, source in programs.items():
+            binaries = [
+                build(compiler, translate(source), directory, "plain"),
+                build(compiler, translate_optimized(source), directory, "optimized"),
+            ]
+            outputs = [run(binary_path) for binary_path in binaries]
+            assert outputs[0] == outputs[1], f"{name}: вывод с -O отличается"
+            assert EXPECTED.get(name, outputs[0]) == outputs[0], f"{name}: неверный вывод"
+            print(f"  {name:<20} вывод совпадает")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Параллельный разбор подпрограмм: время в зависимости от числа процессов
+"""
+
+import os
+import pickle
+
+from benchmarks.common import best_time, generate_program
+from src.parallel import parse_parallel, parse_serial
+
+
+def main():
+    source = generate_program(4000)
+    print(f"Исходный код: {len(source.splitlines())} строк, "
+          f"процессоров: {os.cpu_count()}")
+
+    expected = parse_serial(source)
+    serial = best_time(lambda: parse_serial(source), repeat=3)
+    print(f"  Последовательно:   {serial:7.3f} с")
+
+    size = len(pickle.dumps(expected.subprograms, pickle.HIGHEST_PROTOCOL))
+    print(f"  Подпрограммы в pickle: {size / 2**20:.2f} МБ")
+
+    workers = 1
+    while workers <= max(2, os.cpu_count() or 1):
+        seconds = best_time(lambda: parse_parallel(source, workers), repeat=3)
+        print(f"  Процессов: {workers:3}   {seconds:7.3f} с   "
+              f"ускорение {serial / seconds:4.2f}x")
+        workers *= 2
+
+    assert parse_parallel(source) == expected, "Деревья различаются"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Сравнение пропускной способности Parser (разбор выражений по приоритетам)
+и RecursiveParser (исходный рекурсивный спуск)
+"""
+
+from benchmarks.common import best_time, generate_program
+from src.ast_nodes import Expression
+from src.lexer import Lexer, TokenType
+from src.parser import FUNCTION_TOKENS, Parser, ParserError
+
+
+class RecursiveParser(Parser):
+    # Исходный разбор выражений рекурсивным спуском (expression → simple
+    # expression → term → factor) с проверкой токенов через match().
+    # Эталон поведения и база для сравнения производительности с разбором
+    # по приоритетам в Parser
+
+    def parse_expression(self) -> Expression:
+        start = self.current_token().offset
+        left = self.parse_simple_expression()
+
+        if self.match(
+            TokenType.EQUAL,
+            TokenType.NOT_EQUAL,
+            TokenType.LESS,
+            TokenType.LESS_EQUAL,
+            TokenType.GREATER,
+            TokenType.GREATER_EQUAL,
+        ):
+            operator = self.current_token().value
+            self.advance()
+            right = self.parse_simple_expression()
+            return self.located(self.nodes.BinaryOp(left, operator, right), start)
+
+        return left
+
+    def parse_simple_expression(self) -> Expression:
+        start = self.current_token().offset
+        sign = None
+        if self.match(TokenType.PLUS, TokenType.MINUS):
+            sign = self.current_token().value
+            self.advance()
+
+        left = self.parse_term()
+
+        if sign:
+            left = self.located(self.nodes.UnaryOp(sign, left), start)
+
+        while self.match(TokenType.PLUS, TokenType.MINUS, TokenType.OR, TokenType.XOR):
+            operator = self.current_token().value
+            self.advance()
+            right = self.parse_term()
+            left = self.located(self.nodes.BinaryOp(left, operator, right), start)
+
+        return left
+
+    def parse_term(self) -> Expression:
+        start = self.current_token().offset
+        left = self.parse_factor()
+
+        while self.match(
+            TokenType.MULTIPLY,
+            TokenType.DIVIDE,
+            TokenType.DIV,
+            TokenType.MOD,
+            TokenType.AND,
+        ):
+            operator = self.current_token().value
+            self.advance()
+            right = self.parse_factor()
+            left = self.located(self.nodes.BinaryOp(left, operator, right), start)
+
+        return left
+
+    def parse_factor(self) -> Expression:
+        token = self.current_token()
+        start = token.offset
+
+        if self.match(TokenType.NOT):
+            self.advance()
+            return self.located(self.nodes.UnaryOp("not", self.parse_factor()), start)
+
+        if self.match(TokenType.LPAREN):
+            self.advance()
+            expr = self.parse_expression()
+            self.expect(TokenType.RPAREN)
+            return expr
+
+        literal = self.literal_nodes.get(token.type)
+        if literal is not None:
+            self.advance()
+            return self.located(literal(token.value), start)
+
+        if self.match(TokenType.TRUE, TokenType.FALSE):
+            self.advance()
+            return self.located(self.nodes.BooleanLiteral(token.type is TokenType.TRUE), start)
+
+        if self.match(TokenType.IDENTIFIER) or token.type in FUNCTION_TOKENS:
+            self.advance()
+
+            # Индексация массива
+            if self.match(TokenType.LBRACKET):
+                indices = self.parse_indices()
+                return self.located(self.nodes.Variable(token.value, indices), start)
+
+            # Вызов функции
+            if self.match(TokenType.LPAREN):
+                arguments = self.parse_arguments()
+                return self.located(self.nodes.FunctionCall(token.value, arguments), start)
+
+            return self.located(self.nodes.Variable(token.value), start)
+
+        raise ParserError("Ожидается выражение", token)
+
+    def located(self, node, start: int):
+        if self.positions:
+            self.locate(node, start)
+        return node
+
+
+def main():
+    source = generate_program(2000)
+    tokens = Lexer(source).tokenize()
+
+    reference = RecursiveParser(tokens).parse()
+    program = Parser(tokens).parse()
+    assert program == reference, "Деревья различаются"
+    # Деревья не удерживаются во время замеров: сборщик мусора обходил бы
+    # их при каждой полной сборке
+    del program, reference
+
+    print(f"Токенов: {len(tokens)}")
+
+    results = {}
+    for name, parser_class in (("RecursiveParser", RecursiveParser), ("Parser", Parser)):
+        seconds = best_time(lambda: parser_class(tokens).parse(), repeat=5)
+        results[name] = seconds
+        print(f"  {name:<16} {seconds:7.3f} с  {len(tokens) / seconds / 1e6:6.2f} млн токенов/с")
+
+    print(f"Ускорение: {results['RecursiveParser'] / results['Parser']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Загрузка AST: повторный разбор исходного кода, pickle и двоичный формат
+src.serialization
+"""
+
+import pickle
+
+from benchmarks.common import best_time, generate_program
+from src.ast_nodes import InterningNodes
+from src.lexer import Lexer
+from src.parser import Parser
+from src.serialization import dumps, loads
+
+
+def main():
+    source = generate_program(2000)
+    program = Parser(Lexer(source).tokenize()).parse()
+    interned = Parser(Lexer(source).tokenize(), nodes=InterningNodes()).parse()
+    assert loads(dumps(program)) == program
+
+    reparse = best_time(lambda: Parser(Lexer(source).tokenize()).parse(), repeat=3)
+    print(f"Исходный код: {len(source.encode('utf-8')) / 2**20:.2f} МБ, "
+          f"повторный разбор {reparse:.3f} с")
+
+    for label, tree in (("дерево", program), ("с интернированием", interned)):
+        data = dumps(tree)
+        pickled = pickle.dumps(tree)
+        load = best_time(lambda: loads(data), repeat=3)
+        unpickle = best_time(lambda: pickle.loads(pickled), repeat=3)
+        print(f"{label}:")
+        print(f"  serialization  {len(data) / 2**20:6.2f} МБ  загрузка {load:.3f} с  "
+              f"({reparse / load:.1f}x быстрее разбора)")
+        print(f"  pickle         {len(pickled) / 2**20:6.2f} МБ  загрузка {unpickle:.3f} с")
+
+
+if __name__ == "__main__":
+    main()
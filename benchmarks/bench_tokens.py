@@ -0,0 +1,30 @@
+"""
+Сравнение памяти, занимаемой токенами: List[Token] против CompactTokens
+"""
+
+from benchmarks.common import generate_program, traced_size
+from src.lexer import Lexer
+from src.parser import Parser
+
+
+def main():
+    source = generate_program(2000)
+    source_size = len(source.encode("utf-8"))
+
+    tokens, list_size = traced_size(lambda: Lexer(source).tokenize())
+    compact, compact_size = traced_size(lambda: Lexer(source).tokenize_compact())
+    assert list(compact) == tokens, "Потоки токенов различаются"
+
+    count = len(tokens)
+    print(f"Токенов: {count}, исходный код: {source_size / 2**20:.2f} МБ")
+    print(f"  List[Token]    {list_size / 2**20:7.2f} МБ  "
+          f"{list_size / count:6.1f} байт/токен")
+    print(f"  CompactTokens  {compact_size / 2**20:7.2f} МБ  "
+          f"{compact_size / count:6.1f} байт/токен")
+    print(f"Сокращение: {list_size / compact_size:.1f}x")
+
+    assert Parser(compact).parse() == Parser(tokens).parse()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Общие функции для замеров: генерация больших программ на Pascal и
+трансляция с оптимизацией (-O)
+"""
+
+import gc
+import time
+import tracemalloc
+
+from src.codegen import CodeGenerator
+from src.cse import CommonSubexpressions
+from src.lexer import Lexer
+from src.licm import LoopInvariantMotion
+from src.optimizer import Optimizer
+from src.parser import Parser
+
+ROUTINE_TEMPLATE = """
+{{ Подпрограмма номер {n} }}
+function calc{n}(var a: array[1..100] of integer; size: integer): integer;
+var
+    i, j, total: integer;
+    ready: boolean;
+begin
+    total := 0;
+    ready := false;
+    for i := 1 to size - 1 do
+    begin
+        for j := 1 to size - i do
+            if a[j] > a[j + 1] then
+                total := total + a[j] * 2 - a[j + 1] div 3;
+        if (total mod 7 = 0) and not ready then
+            ready := true
+        else
+            total := total - 1;
+    end;
+    while total > 1000 do
+        total := total div 2;
+    writeln('calc{n}: ', total, ' ', 1.5e2);
+    calc{n} := total
+end;
+"""
+
+MAIN_TEMPLATE = """
+begin
+    n := 10;
+    for i := 1 to n do
+        arr[i] := n - i;
+{calls}
+end.
+"""
+
+
+def generate_program(routines: int) -> str:
+    # Программа из routines однотипных функций и вызывающего их main
+    parts = ["program Generated;\n\nvar\n    arr: array[1..100] of integer;\n    n, i, r: integer;\n"]
+    parts.extend(ROUTINE_TEMPLATE.format(n=n) for n in range(routines))
+    calls = "\n".join(f"    r := calc{n}(arr, n);" for n in range(routines))
+    parts.append(MAIN_TEMPLATE.format(calls=calls))
+    return "".join(parts)
+
+
+def translate_optimized(source: str) -> str:
+    # Те же проходы, что выполняет translate_file с -O
+    ast = Parser(Lexer(source).tokenize()).parse()
+    optimizer = Optimizer()
+    ast = optimizer.optimize(ast)
+    mover = LoopInvariantMotion()
+    ast = mover.hoist(ast, optimizer.semantics)
+    eliminator = CommonSubexpressions()
+    ast = eliminator.eliminate(ast, mover.semantics)
+    return CodeGenerator().generate(ast, eliminator.semantics)
+
+
+def best_time(func, repeat: int = 5) -> float:
+    # Лучшее время из нескольких запусков, в секундах
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def traced_size(build) -> tuple:
+    # Объем памяти, удерживаемый результатом build(), в байтах
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
@@ -11,24 +11,24 @@ int main() {
     int max;
 
     cout << "Введите 10 чисел:" << endl;
-    for (int i = 1; i <= 10; i++) {
+    if (int i = 1; i <= 10) do {
         {
             cout << "arr[" << i << "] = ";
             cin >> arr[(i - 1)];
         }
-    }
+    } while (i != 10 && (++i, true));
     sum = 0;
-    for (int i = 1; i <= 10; i++) {
-        sum = (sum + arr[(i - 1)]);
-    }
-    max = arr[(1 - 1)];
-    for (int i = 2; i <= 10; i++) {
-        if ((arr[(i - 1)] > max)) {
-            max = arr[(i - 1)];
+    if (int i = 0; i <= 9) do {
+        sum = (sum + arr[i]);
+    } while (i != 9 && (++i, true));
+    max = arr[0];
+    if (int i = 1; i <= 9) do {
+        if ((arr[i] > max)) {
+            max = arr[i];
         }
-    }
+    } while (i != 9 && (++i, true));
     cout << "Сумма элементов: " << sum << endl;
     cout << "Максимальный элемент: " << max << endl;
-    cout << "Среднее значение: " << (sum / 10) << endl;
+    cout << "Среднее значение: " << (static_cast<double>(sum) / 10) << endl;
     return 0;
 }
@@ -48,13 +48,13 @@ int fibIterative(int x) {
         {
             prev = 0;
             curr = 1;
-            for (int i = 2; i <= x; i++) {
+            if (int i = 2, i_end = x; i <= i_end) do {
                 {
                     temp = curr;
                     curr = (prev + curr);
                     prev = temp;
                 }
-            }
+            } while (i != i_end && (++i, true));
             fibIterative_result = curr;
         }
     }
@@ -46,10 +46,10 @@ int factorial(int n) {
 int power(int base, int exponent) {
     int power_result;
 
-    if ((exponent = 0)) {
+    if ((exponent == 0)) {
         power_result = 1;
     } else {
-        if ((exponent = 1)) {
+        if ((exponent == 1)) {
             power_result = base;
         } else {
             power_result = (base * power(base, (exponent - 1)));
@@ -72,7 +72,7 @@ int sum(int n) {
 int gcd(int a, int b) {
     int gcd_result;
 
-    if ((b = 0)) {
+    if ((b == 0)) {
         gcd_result = a;
     } else {
         gcd_result = gcd(b, (a % b));
@@ -89,7 +89,7 @@ bool isPalindrome(int n, int original) {
             if ((original < 10)) {
                 isPalindrome_result = true;
             } else {
-                if ((n = (original % 10))) {
+                if ((n == (original % 10))) {
                     isPalindrome_result = isPalindrome((original / 10), (original / 10));
                 } else {
                     isPalindrome_result = false;
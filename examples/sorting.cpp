@@ -24,12 +24,12 @@ int main() {
     } else {
         {
             cout << "Введите " << n << " элементов:" << endl;
-            for (int i = 1; i <= n; i++) {
+            if (int i = 1, i_end = n; i <= i_end) do {
                 {
                     cout << "arr[" << i << "] = ";
                     cin >> arr[(i - 1)];
                 }
-            }
+            } while (i != i_end && (++i, true));
             cout << "Исходный массив: ";
             printArray(arr, n);
             bubbleSort(arr, n);
@@ -53,10 +53,10 @@ void bubbleSort(int a[], int size) {
     int j;
     bool swapped;
 
-    for (int i = 1; i <= (size - 1); i++) {
+    if (int i = 1, i_end = (size - 1); i <= i_end) do {
         {
             swapped = false;
-            for (int j = 1; j <= (size - i); j++) {
+            if (int j = 1, j_end = (size - i); j <= j_end) do {
                 {
                     if ((a[(j - 1)] > a[((j + 1) - 1)])) {
                         {
@@ -65,19 +65,19 @@ void bubbleSort(int a[], int size) {
                         }
                     }
                 }
-            }
+            } while (j != j_end && (++j, true));
             if (!(swapped)) {
                 break;
             }
         }
-    }
+    } while (i != i_end && (++i, true));
 }
 
 void printArray(int a[], int size) {
     int i;
 
-    for (int i = 1; i <= size; i++) {
-        cout << a[(i - 1)] << ' ';
-    }
+    if (int i = 0, i_end = (size - 1); i <= i_end) do {
+        cout << a[i] << ' ';
+    } while (i != i_end && (++i, true));
     cout << endl;
 }
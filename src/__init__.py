@@ -8,10 +8,19 @@
     lexer - Лексический анализатор
     ast_nodes - Узлы абстрактного синтаксического дерева
     parser - Синтаксический анализатор
+    parallel - Параллельный разбор подпрограмм
+    serialization - Двоичная сериализация AST
+    visitor - Обход и преобразование AST
+    standard - Стандартные функции
+    semantic - Семантический анализ (области видимости и типы)
+    folding - Свертка констант
+    optimizer - Оптимизация по потоку данных
+    licm - Вынос инвариантов из циклов
+    cse - Устранение общих подвыражений
     codegen - Генератор кода C++
     translator - Главное приложение
 """
 
 __version__ = '1.0.0'
 __author__ = 'Антонов Г.А., Березницкий Д.А.'
-__all__ = ['lexer', 'ast_nodes', 'parser', 'codegen', 'translator']
\ No newline at end of file
+__all__ = ['lexer', 'ast_nodes', 'parser', 'parallel', 'serialization', 'visitor', 'standard', 'semantic', 'folding', 'optimizer', 'licm', 'cse', 'codegen', 'translator']
\ No newline at end of file
@@ -3,18 +3,85 @@
 Представляют структуру программы на Pascal
 """
 
-from dataclasses import dataclass
-from typing import List, Optional, Any
+from array import array
+from dataclasses import MISSING, dataclass, field, fields
+from operator import attrgetter
+from types import SimpleNamespace
+from typing import List, Optional, Any, Sequence
+
+
+# Общий неизменяемый пустой список индексов и аргументов: у простой
+# переменной и вызова без параметров нет собственного пустого списка
+EMPTY = ()
+
+
+def node_fields(cls) -> tuple:
+    # Поля структуры узла по порядку, без служебного поля position
+    return tuple(item for item in fields(cls) if item.name != "position")
+
+
+def child_fields(cls) -> tuple:
+    # Поля, в которых могут быть дочерние узлы (все, кроме имен и значений)
+    return tuple(item for item in node_fields(cls) if item.type not in _VALUE_TYPES)
+
+
+# Функции чтения полей по классам узлов для __reduce__
+_FIELD_GETTERS = {}
+
+
+def _field_getter(cls):
+    names = [item.name for item in node_fields(cls)]
+    if len(names) == 1:
+        name = names[0]
+        return lambda node: (getattr(node, name),)
+    if not names:
+        return lambda node: ()
+    return attrgetter(*names)
+
+
+def _restore(cls, values: tuple, position: int):
+    node = cls(*values)
+    node.position = position
+    return node
+
+
+def pack_span(start: int, end: int) -> int:
+    # Положение узла одним числом: целое, в отличие от кортежа, не
+    # отслеживается сборщиком мусора и не замедляет разбор
+    return start << 32 | end
 
 
 # Базовый класс для всех узлов AST
-@dataclass
+@dataclass(slots=True)
 class ASTNode:
-    pass
+    # Положение в исходном коде: смещения первого и последнего токена узла,
+    # упакованные pack_span (заполняется, если Parser создан с
+    # positions=True, иначе -1). Не участвует в сравнении узлов и в repr
+    position: int = field(default=-1, kw_only=True, compare=False, repr=False)
+
+    @property
+    def span(self) -> Optional[tuple]:
+        # (начало, конец) или None
+        position = self.position
+        if position < 0:
+            return None
+        return position >> 32, position & 0xFFFFFFFF
+
+    def __reduce__(self):
+        # Компактная сериализация (pickle) для передачи узлов между
+        # процессами: класс и кортеж значений полей (стандартная
+        # сериализация классов с __slots__ вызывает методы на Python)
+        cls = type(self)
+        getter = _FIELD_GETTERS.get(cls)
+        if getter is None:
+            getter = _FIELD_GETTERS[cls] = _field_getter(cls)
+        if self.position < 0:
+            return cls, getter(self)
+        return _restore, (cls, getter(self), self.position)
 
 
 # Программа
-@dataclass
+@dataclass(slots=True)
 class Program(ASTNode):
     name: str
     variables: List["VarDeclaration"]
@@ -23,31 +90,31 @@ class Program(ASTNode):
 
 
 # Объявление переменной
-@dataclass
+@dataclass(slots=True)
 class VarDeclaration(ASTNode):
     names: List[str]
     var_type: "Type"
 
 
 # Типы данных
-@dataclass
+@dataclass(slots=True)
 class Type(ASTNode):
     name: str
 
 
-@dataclass
+@dataclass(slots=True)
 class ArrayType(Type):
     element_type: Type
     dimensions: List[tuple]  # [(start, end), ...]
 
 
 # Подпрограммы
-@dataclass
+@dataclass(slots=True)
 class Subprogram(ASTNode):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class Procedure(Subprogram):
     name: str
     parameters: List["Parameter"]
@@ -55,7 +122,7 @@ class Procedure(Subprogram):
     body: "CompoundStatement"
 
 
-@dataclass
+@dataclass(slots=True)
 class Function(Subprogram):
     name: str
     parameters: List["Parameter"]
@@ -64,7 +131,7 @@ class Function(Subprogram):
     body: "CompoundStatement"
 
 
-@dataclass
+@dataclass(slots=True)
 class Parameter(ASTNode):
     names: List[str]
     param_type: Type
@@ -72,42 +139,42 @@ class Parameter(ASTNode):
 
 
 # Операторы
-@dataclass
+@dataclass(slots=True)
 class Statement(ASTNode):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class CompoundStatement(Statement):
     statements: List[Statement]
 
 
-@dataclass
+@dataclass(slots=True)
 class AssignmentStatement(Statement):
     variable: "Variable"
     expression: "Expression"
 
 
-@dataclass
+@dataclass(slots=True)
 class IfStatement(Statement):
     condition: "Expression"
     then_statement: Statement
     else_statement: Optional[Statement] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class WhileStatement(Statement):
     condition: "Expression"
     body: Statement
 
 
-@dataclass
+@dataclass(slots=True)
 class RepeatStatement(Statement):
     body: CompoundStatement
     condition: "Expression"
 
 
-@dataclass
+@dataclass(slots=True)
 class ForStatement(Statement):
     variable: str
     start_value: "Expression"
@@ -116,80 +183,457 @@ class ForStatement(Statement):
     downto: bool = False
 
 
-@dataclass
+@dataclass(slots=True)
 class CaseStatement(Statement):
     expression: "Expression"
     branches: List[tuple]  # [(values, statement), ...]
     else_statement: Optional[Statement] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class ProcedureCall(Statement):
     name: str
     arguments: List["Expression"]
 
 
 # Выражения
-@dataclass
+@dataclass(slots=True)
 class Expression(ASTNode):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class BinaryOp(Expression):
     left: Expression
     operator: str
     right: Expression
 
 
-@dataclass
+@dataclass(slots=True)
 class UnaryOp(Expression):
     operator: str
     operand: Expression
 
 
-@dataclass
+@dataclass(slots=True)
 class Variable(Expression):
     name: str
-    indices: List[Expression] = None
-
-    def __post_init__(self):
-        if self.indices is None:
-            self.indices = []
+    indices: Sequence[Expression] = EMPTY
 
 
-@dataclass
+@dataclass(slots=True)
 class IntegerLiteral(Expression):
     value: int
 
 
-@dataclass
+@dataclass(slots=True)
 class RealLiteral(Expression):
     value: float
 
 
-@dataclass
+@dataclass(slots=True)
 class StringLiteral(Expression):
     value: str
 
 
-@dataclass
+@dataclass(slots=True)
 class CharLiteral(Expression):
     value: str
 
 
-@dataclass
+@dataclass(slots=True)
 class BooleanLiteral(Expression):
     value: bool
 
 
-@dataclass
+@dataclass(slots=True)
 class FunctionCall(Expression):
     name: str
     arguments: List[Expression]
 
 
 # Пустой оператор
-@dataclass
+@dataclass(slots=True)
 class EmptyStatement(Statement):
     pass
+
+
+# Все классы узлов. Номер класса в кортеже — вид узла в ASTArena
+NODE_CLASSES = (
+    Program,
+    VarDeclaration,
+    Type,
+    ArrayType,
+    Procedure,
+    Function,
+    Parameter,
+    CompoundStatement,
+    AssignmentStatement,
+    IfStatement,
+    WhileStatement,
+    RepeatStatement,
+    ForStatement,
+    CaseStatement,
+    ProcedureCall,
+    BinaryOp,
+    UnaryOp,
+    Variable,
+    IntegerLiteral,
+    RealLiteral,
+    StringLiteral,
+    CharLiteral,
+    BooleanLiteral,
+    FunctionCall,
+    EmptyStatement,
+)
+
+NODE_KINDS = {cls: kind for kind, cls in enumerate(NODE_CLASSES)}
+
+def _locate(node: ASTNode, start: int, end: int):
+    node.position = start << 32 | end
+
+
+# Конструкторы узлов для Parser по умолчанию — сами классы узлов.
+# locate(node, start, end) записывает положение готового узла
+OBJECT_NODES = SimpleNamespace(
+    locate=_locate, **{cls.__name__: cls for cls in NODE_CLASSES}
+)
+
+
+# Поля с такими типами хранят значения (имена, операции, литералы),
+# остальные поля — узлы, списки и кортежи узлов или None
+_VALUE_TYPES = (str, int, float, bool, List[str])
+
+# Признак в младших битах закодированного поля арены
+_NODE_TAG = 0  # номер узла
+_VALUE_TAG = 1  # номер значения в пуле
+_LIST_TAG = 2  # смещение списка в items
+_TUPLE_TAG = 3  # смещение кортежа в items
+_TAG_BITS = 2
+_TAG_MASK = 3
+
+
+class ASTArena:
+    """
+    Плоское хранилище AST для очень больших программ. Узлы лежат в
+    параллельных типизированных массивах и обозначаются целыми номерами:
+
+        kinds[id]    — вид узла (номер класса в NODE_CLASSES)
+        offsets[id]  — начало полей узла в slots
+        slots        — поля узлов подряд, каждое закодировано одним числом
+        items        — списки и кортежи: длина, затем закодированные элементы
+        pool         — имена и значения литералов без повторов
+        positions    — положение узла в исходном коде (pack_span; -1 или
+                       за концом массива, если не записано)
+
+    Код поля — номер узла, значения в пуле или смещения последовательности
+    в items, сдвинутый на два бита, в которых записан вид кода. Арена
+    сериализуется pickle как несколько массивов и список значений.
+
+    Parser строит дерево прямо в арену через builder(). Для обхода view()
+    возвращает легкие представления узлов: это подклассы обычных классов
+    узлов, поэтому isinstance и чтение полей работают как с объектным
+    деревом, и CodeGenerator обходит арену без изменений. Представления
+    только для чтения и создаются заново при каждом обращении
+    """
+
+    def __init__(self):
+        self.kinds = array("B")
+        self.offsets = array("I")
+        self.slots = array("i")
+        self.items = array("i")
+        self.positions = array("q")
+        self.pool = []
+        self.pool_index = {}
+        self.root = -1  # номер последнего добавленного узла Program
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def nbytes(self) -> int:
+        # Размер массивов арены в байтах (без пула значений)
+        return sum(
+            len(values) * values.itemsize
+            for values in (
+                self.kinds,
+                self.offsets,
+                self.slots,
+                self.items,
+                self.positions,
+            )
+        )
+
+    def builder(self) -> SimpleNamespace:
+        # Конструкторы узлов для Parser(tokens, nodes=...): вместо объекта
+        # каждый возвращает номер нового узла в арене
+        return SimpleNamespace(
+            locate=self.locate,
+            **{cls.__name__: self._constructor(cls) for cls in NODE_CLASSES},
+        )
+
+    def _constructor(self, cls):
+        kind = NODE_KINDS[cls]
+        add = self.add
+        defaults = _FIELD_DEFAULTS[cls]
+        count = _FIELD_COUNTS[cls]
+
+        def build(*values):
+            missing = count - len(values)
+            if missing:
+                values += defaults[len(defaults) - missing :]
+            return add(kind, values)
+
+        return build
+
+    def add(self, kind: int, values: tuple) -> int:
+        slots = self.slots
+        node_id = len(self.kinds)
+        self.kinds.append(kind)
+        self.offsets.append(len(slots))
+        for value, is_value in zip(values, _VALUE_FIELDS[kind]):
+            if is_value or value.__class__ is not int:
+                value = self.encode(value, is_value)
+            else:
+                # Номер дочернего узла — самый частый случай
+                value <<= _TAG_BITS
+            slots.append(value)
+        if kind == _PROGRAM_KIND:
+            self.root = node_id
+        return node_id
+
+    def locate(self, node_id: int, start: int, end: int):
+        # Массив положений растет только при записи положений, поэтому
+        # арена без них не занимает лишней памяти
+        missing = node_id + 1 - len(self.positions)
+        if missing > 0:
+            self.positions.extend([-1] * missing)
+        self.positions[node_id] = start << 32 | end
+
+    def position(self, node_id: int) -> int:
+        if node_id >= len(self.positions):
+            return -1
+        return self.positions[node_id]
+
+    def encode(self, value, is_value: bool) -> int:
+        if isinstance(value, (list, tuple)):
+            codes = [self.encode(item, is_value) for item in value]
+            offset = len(self.items)
+            self.items.append(len(codes))
+            self.items.extend(codes)
+            tag = _LIST_TAG if isinstance(value, list) else _TUPLE_TAG
+            return offset << _TAG_BITS | tag
+
+        if is_value or value is None:
+            # Тип входит в ключ: иначе 1, 1.0 и True были бы одним значением
+            key = (value.__class__, value)
+            index = self.pool_index.get(key)
+            if index is None:
+                index = self.pool_index[key] = len(self.pool)
+                self.pool.append(value)
+            return index << _TAG_BITS | _VALUE_TAG
+
+        return value << _TAG_BITS | _NODE_TAG
+
+    def decode(self, code: int, node=None):
+        # node — преобразование номера узла в результат (по умолчанию view)
+        tag = code & _TAG_MASK
+        payload = code >> _TAG_BITS
+        if tag == _VALUE_TAG:
+            return self.pool[payload]
+        if node is None:
+            node = self.view
+        if tag == _NODE_TAG:
+            return node(payload)
+
+        count = self.items[payload]
+        values = [
+            self.decode(item, node)
+            for item in self.items[payload + 1 : payload + 1 + count]
+        ]
+        return values if tag == _LIST_TAG else tuple(values)
+
+    def kind(self, node_id: int) -> type:
+        return NODE_CLASSES[self.kinds[node_id]]
+
+    def field(self, node_id: int, index: int):
+        return self.decode(self.slots[self.offsets[node_id] + index])
+
+    def view(self, node_id: int) -> ASTNode:
+        return _VIEW_CLASSES[self.kinds[node_id]](self, node_id)
+
+    def program(self) -> Program:
+        return self.view(self.root)
+
+    def materialize(self, node_id: Optional[int] = None) -> ASTNode:
+        # Обычное объектное дерево из арены. Parser создает узлы снизу
+        # вверх, поэтому номера дочерних узлов меньше номера родителя, и
+        # узлы строятся подряд по возрастанию номеров, без рекурсии
+        if node_id is None:
+            node_id = self.root
+        nodes = []
+        resolve = nodes.__getitem__
+        kinds, offsets, slots = self.kinds, self.offsets, self.slots
+        for current in range(node_id + 1):
+            cls = NODE_CLASSES[kinds[current]]
+            start = offsets[current]
+            nodes.append(
+                cls(
+                    *[
+                        self.decode(code, resolve)
+                        for code in slots[start : start + _FIELD_COUNTS[cls]]
+                    ],
+                    position=self.position(current),
+                )
+            )
+        return nodes[node_id]
+
+
+_PROGRAM_KIND = NODE_KINDS[Program]
+
+_FIELD_COUNTS = {cls: len(node_fields(cls)) for cls in NODE_CLASSES}
+
+# Значения по умолчанию последних полей (их можно не передавать)
+_FIELD_DEFAULTS = {
+    cls: tuple(
+        item.default for item in node_fields(cls) if item.default is not MISSING
+    )
+    for cls in NODE_CLASSES
+}
+
+_VALUE_FIELDS = [
+    tuple(item.type in _VALUE_TYPES for item in node_fields(cls))
+    for cls in NODE_CLASSES
+]
+
+
+def _make_view_class(cls):
+    # Представление узла арены: подкласс cls, поля которого читаются из
+    # массивов арены свойствами, перекрывающими слоты cls
+    def __init__(self, arena, node_id):
+        self.arena = arena
+        self.node_id = node_id
+
+    def __reduce__(self):
+        return ASTArena.view, (self.arena, self.node_id)
+
+    namespace = {
+        "__slots__": ("arena", "node_id"),
+        "__module__": cls.__module__,
+        "__qualname__": cls.__qualname__,
+        "__init__": __init__,
+        "__reduce__": __reduce__,
+    }
+    for index, item in enumerate(node_fields(cls)):
+        namespace[item.name] = property(_field_reader(index))
+    namespace["position"] = property(lambda self: self.arena.position(self.node_id))
+    return type(cls.__name__, (cls,), namespace)
+
+
+def _field_reader(index: int):
+    def read(self):
+        arena = self.arena
+        code = arena.slots[arena.offsets[self.node_id] + index]
+        if code & _TAG_MASK == _NODE_TAG:
+            node_id = code >> _TAG_BITS
+            return _VIEW_CLASSES[arena.kinds[node_id]](arena, node_id)
+        return arena.decode(code)
+
+    return read
+
+
+_VIEW_CLASSES = [_make_view_class(cls) for cls in NODE_CLASSES]
+_VIEW_TYPES = frozenset(_VIEW_CLASSES)
+
+
+def node_key(node) -> int:
+    # Ключ узла в таблицах проходов: id объекта, а у представления
+    # ASTArena (оно создается заново при каждом обращении) — номер узла
+    if type(node) in _VIEW_TYPES:
+        return node.node_id
+    return id(node)
+
+
+# Неизменяемые выражения, которые InterningNodes разделяет между
+# одинаковыми вхождениями
+INTERNED_NODES = (
+    BinaryOp,
+    UnaryOp,
+    Variable,
+    FunctionCall,
+    IntegerLiteral,
+    RealLiteral,
+    StringLiteral,
+    CharLiteral,
+    BooleanLiteral,
+)
+
+
+def _intern_key(value):
+    # Дочерние узлы уже разделены, поэтому их равенство — тождество
+    if isinstance(value, ASTNode):
+        return id(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(map(_intern_key, value))
+    return value
+
+
+def _shared_key(node):
+    # Номер узла арены — сам ключ; объект узла жив, пока жива таблица
+    return node if node.__class__ is int else id(node)
+
+
+class InterningNodes:
+    """
+    Конструкторы узлов с хеш-консингом: структурно одинаковые выражения
+    (литералы, переменные, a[j + 1], i - 1 ...) создаются один раз, и все
+    вхождения ссылаются на общий узел. Для таких узлов равенство сводится
+    к проверке тождества (is).
+
+    Подключается явно: Parser(tokens, nodes=InterningNodes()). Работает
+    поверх любых конструкторов, в том числе ASTArena.builder(). Общие узлы
+    нельзя изменять на месте: проходы, преобразующие дерево, должны
+    строить новые узлы
+    """
+
+    def __init__(self, nodes=OBJECT_NODES):
+        self.table = {}  # (класс, ключи полей) -> общий узел
+        self.shared = set()  # общие узлы (id объекта или номер в арене)
+        self.hits = 0  # сколько раз вместо нового узла возвращен общий
+        self.base_locate = nodes.locate
+        for name, constructor in vars(nodes).items():
+            setattr(self, name, constructor)
+        self.locate = self._locate
+        for cls in INTERNED_NODES:
+            setattr(self, cls.__name__, self._interning(cls, getattr(nodes, cls.__name__)))
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def _locate(self, node, start: int, end: int):
+        # У общего узла несколько вхождений, поэтому положение не
+        # записывается: оно есть только у операторов и необщих узлов
+        if _shared_key(node) not in self.shared:
+            self.base_locate(node, start, end)
+
+    def _interning(self, cls, constructor):
+        table = self.table
+        shared = self.shared
+        defaults = _FIELD_DEFAULTS[cls]
+        count = _FIELD_COUNTS[cls]
+
+        def build(*values):
+            # Недостающие поля дополняются значениями по умолчанию, чтобы
+            # Variable(x) и Variable(x, EMPTY) давали один узел
+            missing = count - len(values)
+            if missing:
+                values += defaults[len(defaults) - missing :]
+            key = (cls, *map(_intern_key, values))
+            node = table.get(key)
+            if node is None:
+                node = table[key] = constructor(*values)
+                shared.add(_shared_key(node))
+            else:
+                self.hits += 1
+            return node
+
+        return build
@@ -4,6 +4,8 @@
 """
 
 from src.ast_nodes import (
+    ASTNode,
+    node_key,
     Program,
     VarDeclaration,
     Type,
@@ -33,29 +35,145 @@ from src.ast_nodes import (
     BooleanLiteral,
     FunctionCall,
 )
-from typing import List
-
-
-class CodeGenerator:
-    def __init__(self):
+from src.folding import LITERAL_CLASSES, array_bounds, constant_value
+from src.semantic import SemanticInfo, analyze
+from src.standard import BUILTIN_FUNCTIONS
+from src.visitor import NodeVisitor, iter_child_nodes, walk
+from typing import List, Optional
+
+
+# Типы Pascal и соответствующие типы C++
+TYPE_MAP = {
+    "integer": "int",
+    "real": "double",
+    "boolean": "bool",
+    "char": "char",
+    "string": "string",
+}
+
+# Операции Pascal, которые записываются в C++ иначе
+OPERATOR_MAP = {
+    "div": "/",
+    "mod": "%",
+    "and": "&&",
+    "or": "||",
+    "xor": "^",
+    "=": "==",
+    "<>": "!=",
+    "not": "!",
+}
+
+# and, or и not над integer в Pascal — поразрядные операции
+INTEGER_OPERATOR_MAP = {
+    "and": "&",
+    "or": "|",
+    "not": "~",
+}
+
+# Типы, для которых "+" означает сцепление строк
+STRING_TYPES = ("string", "char")
+
+# Отступ не растет глубже этого уровня: иначе при тысячах вложенных
+# блоков размер вывода рос бы квадратично
+MAX_INDENT_LEVEL = 64
+
+
+def _merge_offset(first: Optional[int], second: Optional[int]) -> Optional[int]:
+    # Общее начало измерений двух поддеревьев (0 — начала различаются)
+    if first is None:
+        return second
+    if second is None or first == second:
+        return first
+    return 0
+
+
+class CodeGenerator(NodeVisitor):
+    def __init__(self, line_index=None, source_name: str = "", line_directives: bool = False,
+                 rebase_arrays: bool = True):
         self.indent_level = 0
         self.output = []
-        self.array_info = {}  # Информация о массивах для корректировки индексов
+        # Циклы for по индексам C++ вместо сдвига индекса массива при
+        # каждом обращении
+        self.rebase_arrays = rebase_arrays
+        # Переменные циклов for, которые идут по индексам C++: имя ->
+        # начало диапазона измерений, которые они индексируют
+        self.offsets = {}
+        # Циклы for тела, которое генерируется сейчас (ключ узла) -> начало
+        # диапазона, если переменная цикла идет по индексам C++
+        self.loop_offsets = {}
+        # Области видимости -> есть ли в них массивы, индекс которых
+        # сдвигается при обращении (только для таких циклы переписываются)
+        self.shifted_arrays = {}
+        # Стандартные функции, определения которых нужны в заголовке
+        # программы (Builtin.runtime)
+        self.runtime_functions = set()
+        # Результат семантического анализа и область видимости, в которой
+        # генерируется текущий код (границы массивов, типы выражений)
+        self.semantics = None
+        self.scope = None
+
+        # Привязка к исходному коду (нужен AST, разобранный с
+        # positions=True, и LineIndex того же текста): карта source_map из
+        # (строка C++, строка Pascal, столбец Pascal) и, по желанию,
+        # директивы #line, чтобы профилировщики и отладчики показывали
+        # строки программы на Pascal
+        self.line_index = line_index
+        self.source_name = source_name
+        self.line_directives = line_directives
+        self.source_map = []
+        self.location = None  # (строка, столбец) текущего оператора
+        self.mapped = None  # положение последней записи source_map
+        self.directive_line = None  # строка, которую компилятор припишет следующей
 
     def indent(self) -> str:
-        return "    " * self.indent_level
+        return "    " * min(self.indent_level, MAX_INDENT_LEVEL)
 
     def emit(self, code: str):
+        if self.location is not None:
+            self.map_line()
         self.output.append(self.indent() + code)
 
     def emit_line(self, code: str = ""):
+        if self.location is not None:
+            self.map_line()
         if code:
             self.output.append(self.indent() + code)
         else:
             self.output.append("")
 
-    def generate(self, program: Program) -> str:
+    def mark(self, node: ASTNode):
+        # Следующие строки вывода относятся к узлу node
+        if self.line_index is not None:
+            span = node.span
+            if span is not None:
+                self.location = self.line_index.position(span[0])
+
+    def map_line(self):
+        # Вызывается перед каждой строкой вывода, пока известно положение
+        location = self.location
+        if location != self.mapped:
+            line = location[0]
+            if self.line_directives and self.directive_line != line:
+                name = self.source_name.replace("\\", "\\\\").replace('"', '\\"')
+                self.output.append(f'#line {line} "{name}"')
+                self.directive_line = line
+            self.source_map.append((len(self.output) + 1, line, location[1]))
+            self.mapped = location
+        if self.directive_line is not None:
+            self.directive_line += 1
+
+    def generate(self, program: Program, semantics: SemanticInfo = None) -> str:
+        # semantics — результат analyze(program); без него анализ
+        # выполняется здесь же, а его ошибки не мешают генерации
+        self.semantics = semantics if semantics is not None else analyze(program)
+        self.scope = self.semantics.scope()
         self.output = []
+        self.source_map = []
+        self.location = self.mapped = self.directive_line = None
+        self.offsets = {}
+        self.loop_offsets = {}
+        self.shifted_arrays = {}
+        self.runtime_functions = set()
 
         # Заголовочные файлы
         self.emit_line("#include <iostream>")
@@ -64,6 +182,7 @@ class CodeGenerator:
         self.emit_line()
         self.emit_line("using namespace std;")
         self.emit_line()
+        runtime_line = len(self.output)
 
         # Объявление подпрограмм
         for subprogram in program.subprograms:
@@ -71,6 +190,7 @@ class CodeGenerator:
             self.emit_line()
 
         # Главная функция
+        self.mark(program.body)
         self.emit_line("int main() {")
         self.indent_level += 1
 
@@ -82,6 +202,7 @@ class CodeGenerator:
             self.emit_line()
 
         # Тело программы
+        self.loop_offsets = self.collect_loop_offsets(program.body)
         self.generate_compound_statement(program.body, skip_braces=True)
 
         self.emit_line("return 0;")
@@ -94,6 +215,18 @@ class CodeGenerator:
             self.generate_subprogram_implementation(subprogram)
             self.emit_line()
 
+        # Определения стандартных функций, которые понадобились при генерации
+        if self.runtime_functions:
+            header = []
+            for builtin in BUILTIN_FUNCTIONS.values():
+                if builtin.name in self.runtime_functions:
+                    header.extend(builtin.runtime.splitlines())
+                    header.append("")
+            self.output[runtime_line:runtime_line] = header
+            self.source_map = [
+                (line + len(header), *location) for line, *location in self.source_map
+            ]
+
         return "\n".join(self.output)
 
     def generate_subprogram_declaration(self, subprogram: Subprogram):
@@ -106,17 +239,14 @@ class CodeGenerator:
             self.emit_line(f"{return_type} {subprogram.name}({params});")
 
     def generate_subprogram_implementation(self, subprogram: Subprogram):
+        self.mark(subprogram)
+        self.scope = self.semantics.scope(subprogram)
+        self.loop_offsets = self.collect_loop_offsets(subprogram.body)
         if isinstance(subprogram, Procedure):
             params = self.generate_parameters(subprogram.parameters)
             self.emit_line(f"void {subprogram.name}({params}) {{")
             self.indent_level += 1
 
-            # Регистрируем информацию об массивах-параметрах
-            for param in subprogram.parameters:
-                if isinstance(param.param_type, ArrayType):
-                    for name in param.names:
-                        self.array_info[name] = param.param_type.dimensions
-
             for var_decl in subprogram.variables:
                 self.generate_var_declaration(var_decl)
 
@@ -134,12 +264,6 @@ class CodeGenerator:
             self.emit_line(f"{return_type} {subprogram.name}({params}) {{")
             self.indent_level += 1
 
-            # Регистрируем информацию об массивах-параметрах
-            for param in subprogram.parameters:
-                if isinstance(param.param_type, ArrayType):
-                    for name in param.names:
-                        self.array_info[name] = param.param_type.dimensions
-
             # Переменная для возврата значения
             self.emit_line(f"{return_type} {subprogram.name}_result;")
 
@@ -179,149 +303,275 @@ class CodeGenerator:
 
         if isinstance(var_decl.var_type, ArrayType):
             for name in var_decl.names:
-                self.array_info[name] = var_decl.var_type.dimensions
                 self.emit_line(self.generate_array_declaration(name, var_decl.var_type))
         else:
             for name in var_decl.names:
                 self.emit_line(f"{cpp_type} {name};")
 
     def generate_array_declaration(self, name: str, array_type: ArrayType) -> str:
+        # Размер каждого измерения (и измерений массивов массивов) — по
+        # границам, вычисленным сверткой констант
         sizes = []
-        for start_expr, end_expr in array_type.dimensions:
-            # Вычисляем размер
-            if isinstance(start_expr, IntegerLiteral) and isinstance(
-                end_expr, IntegerLiteral):
-                size = end_expr.value - start_expr.value + 1
-                sizes.append(str(size))
+        for start, end in array_bounds(array_type):
+            if start is not None and end is not None:
+                sizes.append(str(end - start + 1))
             else:
-                sizes.append("100")  # Заглушка для динамических размеров
+                sizes.append("100")  # Заглушка: границы неизвестны при трансляции
 
         element_type = self.convert_type(array_type.element_type)
         dimensions = "".join(f"[{size}]" for size in sizes)
         return f"{element_type} {name}{dimensions};"
 
     def convert_type(self, pascal_type: Type) -> str:
-        type_map = {
-            "integer": "int",
-            "real": "double",
-            "boolean": "bool",
-            "char": "char",
-            "string": "string",
-        }
-
         if isinstance(pascal_type, ArrayType):
             return self.convert_type(pascal_type.element_type)
 
-        return type_map.get(pascal_type.name, pascal_type.name)
+        return TYPE_MAP.get(pascal_type.name, pascal_type.name)
 
     def generate_compound_statement(
         self, stmt: CompoundStatement, skip_braces=False, function_name=None
     ):
-        if not skip_braces:
-            self.emit_line("{")
-            self.indent_level += 1
-
-        for statement in stmt.statements:
-            self.generate_statement(statement, function_name)
-
-        if not skip_braces:
-            self.indent_level -= 1
-            self.emit_line("}")
+        if skip_braces:
+            self.generate_statements(stmt.statements, function_name)
+        else:
+            self.generate_statements([stmt], function_name)
 
     def generate_statement(self, stmt: Statement, function_name=None):
-        if isinstance(stmt, CompoundStatement):
-            self.generate_compound_statement(stmt, function_name=function_name)
-
-        elif isinstance(stmt, AssignmentStatement):
-            var_code = self.generate_variable(stmt.variable)
-            expr_code = self.generate_expression(stmt.expression)
-
-            # Проверка на присваивание результата функции
-            if function_name and stmt.variable.name == function_name:
-                self.emit_line(f"{function_name}_result = {expr_code};")
+        self.generate_statements([stmt], function_name)
+
+    def generate_statements(self, statements: List[Statement], function_name=None):
+        # Обход без рекурсии по стеку действий: оператор раскладывается на
+        # готовые строки (str), изменения отступа (int) и вложенные операторы,
+        # которые кладутся на стек в обратном порядке. Оператор обрабатывает
+        # метод visit_<класс>, выбранный по таблице диспетчеризации
+        table = self._dispatch_table
+        work = list(reversed(statements))
+
+        while work:
+            item = work.pop()
+            item_type = type(item)
+
+            if item_type is str:
+                self.emit_line(item)
+            elif item_type is int:
+                self.indent_level += item
+            elif item_type is dict:
+                # Конец тела цикла по индексам C++: прежние смещения
+                self.offsets = item
             else:
-                self.emit_line(f"{var_code} = {expr_code};")
-
-        elif isinstance(stmt, IfStatement):
-            condition = self.generate_expression(stmt.condition)
-            self.emit_line(f"if ({condition}) {{")
-            self.indent_level += 1
-            self.generate_statement(stmt.then_statement, function_name)
-            self.indent_level -= 1
-
-            if stmt.else_statement:
-                self.emit_line("} else {")
-                self.indent_level += 1
-                self.generate_statement(stmt.else_statement, function_name)
-                self.indent_level -= 1
-
-            self.emit_line("}")
-
-        elif isinstance(stmt, WhileStatement):
-            condition = self.generate_expression(stmt.condition)
-            self.emit_line(f"while ({condition}) {{")
-            self.indent_level += 1
-            self.generate_statement(stmt.body, function_name)
-            self.indent_level -= 1
-            self.emit_line("}")
-
-        elif isinstance(stmt, RepeatStatement):
-            condition = self.generate_expression(stmt.condition)
-            self.emit_line("do {")
-            self.indent_level += 1
-            self.generate_compound_statement(
-                stmt.body, skip_braces=True, function_name=function_name
-            )
-            self.indent_level -= 1
-            self.emit_line(f"}} while (!({condition}));")
-
-        elif isinstance(stmt, ForStatement):
-            start = self.generate_expression(stmt.start_value)
-            end = self.generate_expression(stmt.end_value)
+                if self.line_index is not None:
+                    self.mark(item)
+                visit = table.get(item_type) or self.dispatch(item_type)
+                visit(self, item, work, function_name)
+
+    def visit_CompoundStatement(self, stmt: CompoundStatement, work: list, function_name):
+        work.append("}")
+        work.append(-1)
+        work.extend(reversed(stmt.statements))
+        work.append(1)
+        work.append("{")
+
+    def visit_AssignmentStatement(
+        self, stmt: AssignmentStatement, work: list, function_name
+    ):
+        var_code = self.generate_variable(stmt.variable)
+        expr_code = self.generate_expression(stmt.expression)
 
-            if stmt.downto:
-                self.emit_line(
-                    f"for (int {stmt.variable} = {start}; {stmt.variable} >= {end}; {stmt.variable}--) {{"
-                )
+        # Проверка на присваивание результата функции
+        if function_name and stmt.variable.name == function_name:
+            self.emit_line(f"{function_name}_result = {expr_code};")
+        else:
+            self.emit_line(f"{var_code} = {expr_code};")
+
+    def visit_IfStatement(self, stmt: IfStatement, work: list, function_name):
+        condition = self.generate_expression(stmt.condition)
+        self.emit_line(f"if ({condition}) {{")
+
+        work.append("}")
+        if stmt.else_statement:
+            work.extend((-1, stmt.else_statement, 1, "} else {"))
+        work.extend((-1, stmt.then_statement, 1))
+
+    def visit_WhileStatement(self, stmt: WhileStatement, work: list, function_name):
+        condition = self.generate_expression(stmt.condition)
+        self.emit_line(f"while ({condition}) {{")
+        work.extend(("}", -1, stmt.body, 1))
+
+    def visit_RepeatStatement(self, stmt: RepeatStatement, work: list, function_name):
+        condition = self.generate_expression(stmt.condition)
+        self.emit_line("do {")
+        work.append(f"}} while (!({condition}));")
+        work.append(-1)
+        work.extend(reversed(stmt.body.statements))
+        work.append(1)
+
+    def visit_ForStatement(self, stmt: ForStatement, work: list, function_name):
+        # Границы, как в Pascal, вычисляются один раз: конец (если это не
+        # литерал) — в скрытую переменную <переменная>_end, объявленную,
+        # как и переменная цикла, в if с инициализацией (C++17). Начало, в
+        # котором есть сама переменная цикла, тоже вычисляется заранее:
+        # в "int i = i + 1" справа была бы уже новая переменная
+        var = stmt.variable
+        start = self.generate_expression(stmt.start_value)
+        end = self.generate_expression(stmt.end_value)
+        symbol = self.scope.symbol(stmt)
+        loop_type = "char" if symbol is not None and symbol.type_name == "char" else "int"
+
+        # Переменная, которая в теле только индексирует массивы, идет сразу
+        # по индексам C++: границы сдвигаются один раз, а не индекс при
+        # каждом обращении
+        offset = self.loop_offsets.get(node_key(stmt), 0) if loop_type == "int" else 0
+        if offset:
+            start = self.shifted(stmt.start_value, start, offset)
+            end = self.shifted(stmt.end_value, end, offset)
+
+        declarations = []
+        hoisted = any(
+            isinstance(node, Variable) and node.name == var
+            for expr in (stmt.start_value, stmt.end_value) for node in walk(expr)
+        )
+        if hoisted:
+            hidden_start = self.hidden_name(f"{var}_start")
+            declarations.append(f"{hidden_start} = {start}")
+            start = hidden_start
+        if not isinstance(stmt.end_value, (IntegerLiteral, CharLiteral)):
+            hidden_end = self.hidden_name(f"{var}_end")
+            declarations.append(f"{hidden_end} = {end}")
+            end = hidden_end
+        # Переменная цикла объявляется после скрытых, если они ее читают
+        declarations.insert(len(declarations) if hoisted else 0, f"{var} = {start}")
+
+        # Диапазон проверяется один раз, а перед шагом — не последнее ли это
+        # значение: "i <= i_end; i++" при конце, равном наибольшему значению
+        # типа (или наименьшему для downto), переполнил бы переменную.
+        # continue переходит к той же проверке
+        comparison, step = (">=", "--") if stmt.downto else ("<=", "++")
+        self.emit_line(
+            f"if ({loop_type} {', '.join(declarations)}; "
+            f"{var} {comparison} {end}) do {{"
+        )
+        closing = f"}} while ({var} != {end} && ({step}{var}, true));"
+        if offset:
+            work.extend((closing, self.offsets, -1, stmt.body, 1))
+            self.offsets = {**self.offsets, var: offset}
+        else:
+            work.extend((closing, -1, stmt.body, 1))
+
+    def collect_loop_offsets(self, body: CompoundStatement) -> dict:
+        # Начала диапазонов циклов for (ключ узла -> начало, не 0), если все
+        # обращения к переменной цикла в теле — индексы измерений массивов с
+        # одним и тем же началом. Один проход снизу вверх по явному стеку:
+        # для каждого узла собирается, как в его поддереве используются
+        # переменные, поэтому вложенные циклы не просматриваются заново
+        offsets = {}
+        if not self.rebase_arrays or not self.has_shifted_arrays(self.scope):
+            return offsets
+        results = []
+        work = [body]
+        while work:
+            item = work.pop()
+            if item.__class__ is tuple:
+                node, count = item
+                start = len(results) - count
+                summaries = results[start:]
+                del results[start:]
+                results.append(self.variable_uses(node, summaries, offsets))
             else:
-                self.emit_line(
-                    f"for (int {stmt.variable} = {start}; {stmt.variable} <= {end}; {stmt.variable}++) {{"
-                )
-
-            self.indent_level += 1
-            self.generate_statement(stmt.body, function_name)
-            self.indent_level -= 1
-            self.emit_line("}")
-
-        elif isinstance(stmt, CaseStatement):
-            expr = self.generate_expression(stmt.expression)
-            self.emit_line(f"switch ({expr}) {{")
-            self.indent_level += 1
-
-            for values, branch_stmt in stmt.branches:
-                for value in values:
-                    value_code = self.generate_expression(value)
-                    self.emit_line(f"case {value_code}:")
-
-                self.indent_level += 1
-                self.generate_statement(branch_stmt, function_name)
-                self.emit_line("break;")
-                self.indent_level -= 1
-
-            if stmt.else_statement:
-                self.emit_line("default:")
-                self.indent_level += 1
-                self.generate_statement(stmt.else_statement, function_name)
-                self.indent_level -= 1
-
-            self.indent_level -= 1
-            self.emit_line("}")
-
-        elif isinstance(stmt, ProcedureCall):
-            self.generate_procedure_call(stmt)
-
-        elif isinstance(stmt, EmptyStatement):
-            pass
+                children = list(iter_child_nodes(item))
+                work.append((item, len(children)))
+                work.extend(reversed(children))
+        return offsets
+
+    def variable_uses(self, node: ASTNode, summaries: list, offsets: dict) -> dict:
+        # Использование переменных в поддереве node: имя -> [обращений,
+        # из них индексов массивов, начало измерений (None — еще не
+        # известно, 0 — разные или нулевые начала)]. summaries — то же для
+        # дочерних узлов; меньшие таблицы сливаются в самую большую
+        if isinstance(node, ForStatement):
+            # Тело — последний дочерний узел
+            count, indices, offset = summaries[-1].get(node.variable, (0, 0, None))
+            if indices and indices == count and offset:
+                offsets[node_key(node)] = offset
+        uses = max(summaries, key=len) if summaries else {}
+        for summary in summaries:
+            if summary is uses:
+                continue
+            for name, (count, indices, offset) in summary.items():
+                entry = uses.get(name)
+                if entry is None:
+                    uses[name] = [count, indices, offset]
+                else:
+                    entry[0] += count
+                    entry[1] += indices
+                    entry[2] = _merge_offset(entry[2], offset)
+
+        if isinstance(node, ForStatement):
+            # Внешний цикл по той же переменной не переписывается
+            entry = uses.setdefault(node.variable, [0, 0, None])
+            entry[2] = 0
+        elif isinstance(node, Variable):
+            entry = uses.setdefault(node.name, [0, 0, None])
+            entry[0] += 1
+            if node.indices:
+                symbol = self.scope.symbol(node)
+                bounds = symbol.bounds if symbol is not None else ()
+                for i, index_expr in enumerate(node.indices):
+                    if isinstance(index_expr, Variable) and not index_expr.indices:
+                        start = bounds[i][0] if i < len(bounds) else None
+                        entry = uses.setdefault(index_expr.name, [0, 0, None])
+                        entry[1] += 1
+                        entry[2] = _merge_offset(entry[2], start) if start else 0
+        return uses
+
+    def has_shifted_arrays(self, scope) -> bool:
+        # Без таких массивов тела циклов не просматриваются
+        found = self.shifted_arrays.get(scope)
+        if found is None:
+            found = self.shifted_arrays[scope] = any(
+                start for symbol in scope.symbols.values() for start, _ in symbol.bounds
+            ) or (scope.parent is not None and self.has_shifted_arrays(scope.parent))
+        return found
+
+    def shifted(self, expr: Expression, code: str, offset: int) -> str:
+        # Граница цикла, сдвинутая к индексам C++
+        value = constant_value(expr)
+        if value.__class__ is int:
+            return str(value - offset)
+        if offset > 0:
+            return f"({code} - {offset})"
+        return f"({code} + {-offset})"
+
+    def hidden_name(self, name: str) -> str:
+        # Имя скрытой переменной, не совпадающее с именами программы
+        base = name
+        number = 1
+        while self.scope.lookup(name) is not None:
+            number += 1
+            name = f"{base}{number}"
+        return name
+
+    def visit_CaseStatement(self, stmt: CaseStatement, work: list, function_name):
+        expr = self.generate_expression(stmt.expression)
+        self.emit_line(f"switch ({expr}) {{")
+
+        actions = [1]
+        for values, branch_stmt in stmt.branches:
+            for value in values:
+                value_code = self.generate_expression(value)
+                actions.append(f"case {value_code}:")
+            actions.extend((1, branch_stmt, "break;", -1))
+
+        if stmt.else_statement:
+            actions.extend(("default:", 1, stmt.else_statement, -1))
+
+        actions.extend((-1, "}"))
+        work.extend(reversed(actions))
+
+    def visit_ProcedureCall(self, stmt: ProcedureCall, work: list, function_name):
+        self.generate_procedure_call(stmt)
+
+    def visit_EmptyStatement(self, stmt: EmptyStatement, work: list, function_name):
+        pass
 
     def generate_procedure_call(self, call: ProcedureCall):
         # Стандартные процедуры
@@ -351,97 +601,162 @@ class CodeGenerator:
             self.emit_line(f"{call.name}({args});")
 
     def generate_expression(self, expr: Expression) -> str:
-        if isinstance(expr, BinaryOp):
-            left = self.generate_expression(expr.left)
-            right = self.generate_expression(expr.right)
-
-            op_map = {
-                "div": "/",
-                "mod": "%",
-                "and": "&&",
-                "or": "||",
-                "xor": "^",
-                "<>": "!=",
-            }
-
-            operator = op_map.get(expr.operator, expr.operator)
-            return f"({left} {operator} {right})"
-
-        elif isinstance(expr, UnaryOp):
-            operand = self.generate_expression(expr.operand)
-
-            op_map = {
-                "not": "!",
-            }
-
-            operator = op_map.get(expr.operator, expr.operator)
-            return f"{operator}({operand})"
-
-        elif isinstance(expr, Variable):
-            return self.generate_variable(expr)
-
-        elif isinstance(expr, IntegerLiteral):
-            return str(expr.value)
+        # Обход без рекурсии: узел раскладывается на фрагменты текста и
+        # дочерние узлы, которые кладутся на стек в обратном порядке.
+        # Фрагменты собираются в список и склеиваются один раз, поэтому
+        # время линейно и для очень длинных цепочек операций
+        table = self._dispatch_table
+        parts = []
+        work = [expr]
+
+        while work:
+            item = work.pop()
+            item_type = type(item)
+
+            if item_type is str:
+                parts.append(item)
+            else:
+                visit = table.get(item_type) or self.dispatch(item_type)
+                visit(self, item, parts, work)
+
+        return "".join(parts)
+
+    def visit_BinaryOp(self, expr: BinaryOp, parts: list, work: list):
+        operator = OPERATOR_MAP.get(expr.operator, expr.operator)
+        if expr.operator in INTEGER_OPERATOR_MAP:
+            scope = self.scope
+            if scope.type_of(expr.left) == "integer" and scope.type_of(expr.right) == "integer":
+                operator = INTEGER_OPERATOR_MAP[expr.operator]
+        conversion = None
+        if operator == "/" or operator == "+":
+            conversion = self.left_conversion(expr)
+        if conversion is None:
+            work.extend((")", expr.right, f" {operator} ", expr.left, "("))
+        else:
+            work.extend((")", expr.right, f" {operator} ", ")", expr.left, f"({conversion}"))
+
+    def left_conversion(self, expr: BinaryOp):
+        # Начало преобразования левого операнда (закрывается скобкой) там,
+        # где C++ понял бы операцию иначе, чем Pascal: "/" над целыми в
+        # Pascal — вещественное деление, а "+" над символами и строковыми
+        # литералами без переменной типа string — сцепление строк
+        scope = self.scope
+        left = scope.type_of(expr.left)
+        right = scope.type_of(expr.right)
+        if expr.operator == "/":
+            if left == "integer" and right == "integer":
+                return "static_cast<double>("
+        elif left in STRING_TYPES and right in STRING_TYPES:
+            if not (
+                left == "string" and not isinstance(expr.left, StringLiteral)
+                or right == "string" and not isinstance(expr.right, StringLiteral)
+            ):
+                return "string(1, " if left == "char" else "string("
+        return None
+
+    def visit_UnaryOp(self, expr: UnaryOp, parts: list, work: list):
+        operator = OPERATOR_MAP.get(expr.operator, expr.operator)
+        if expr.operator == "not" and self.scope.type_of(expr.operand) == "integer":
+            operator = INTEGER_OPERATOR_MAP["not"]
+        work.extend((")", expr.operand, f"{operator}("))
+
+    def visit_Variable(self, expr: Variable, parts: list, work: list):
+        if expr.indices:
+            work.extend(reversed(self.variable_parts(expr)))
+        else:
+            parts.append(expr.name)
 
-        elif isinstance(expr, RealLiteral):
-            return str(expr.value)
+    def visit_IntegerLiteral(self, expr: IntegerLiteral, parts: list, work: list):
+        parts.append(str(expr.value))
 
-        elif isinstance(expr, StringLiteral):
-            return f'"{expr.value}"'
+    def visit_RealLiteral(self, expr: RealLiteral, parts: list, work: list):
+        parts.append(str(expr.value))
 
-        elif isinstance(expr, CharLiteral):
-            return f"'{expr.value}'"
+    def visit_StringLiteral(self, expr: StringLiteral, parts: list, work: list):
+        parts.append(f'"{expr.value}"')
 
-        elif isinstance(expr, BooleanLiteral):
-            return "true" if expr.value else "false"
+    def visit_CharLiteral(self, expr: CharLiteral, parts: list, work: list):
+        parts.append(f"'{expr.value}'")
 
-        elif isinstance(expr, FunctionCall):
-            return self.generate_function_call(expr)
+    def visit_BooleanLiteral(self, expr: BooleanLiteral, parts: list, work: list):
+        parts.append("true" if expr.value else "false")
 
-        return ""
+    def visit_FunctionCall(self, expr: FunctionCall, parts: list, work: list):
+        work.extend(reversed(self.function_call_parts(expr)))
 
     def generate_variable(self, var: Variable) -> str:
         if not var.indices:
             return var.name
+        return self.generate_expression(var)
 
-        # Корректировка индексов для массивов
-        indices_code = []
-        if var.name in self.array_info:
-            dimensions = self.array_info[var.name]
-            for i, index_expr in enumerate(var.indices):
-                index_code = self.generate_expression(index_expr)
-                if i < len(dimensions):
-                    start_expr, _ = dimensions[i]
-                    if isinstance(start_expr, IntegerLiteral) and start_expr.value != 0:
-                        index_code = f"({index_code} - {start_expr.value})"
-                indices_code.append(index_code)
-        else:
-            indices_code = [self.generate_expression(idx) for idx in var.indices]
+    def variable_parts(self, var: Variable) -> list:
+        # Фрагменты обращения к переменной для generate_expression
+        if not var.indices:
+            return [var.name]
+
+        # Корректировка индексов для массивов: индекс-литерал пересчитывается
+        # сразу, к остальным добавляется вычитание начала диапазона (кроме
+        # переменной цикла, которая уже идет по индексам C++)
+        symbol = self.scope.symbol(var)
+        bounds = symbol.bounds if symbol is not None else ()
+        parts = [f"{var.name}["]
+        for i, index_expr in enumerate(var.indices):
+            if i:
+                parts.append("][")
+            start = bounds[i][0] if i < len(bounds) else None
+            if not start or self.offset_index(index_expr) == start:
+                parts.append(index_expr)
+            elif isinstance(index_expr, IntegerLiteral):
+                parts.append(str(index_expr.value - start))
+            elif start > 0:
+                parts.extend(("(", index_expr, f" - {start})"))
+            else:
+                parts.extend(("(", index_expr, f" + {-start})"))
+        parts.append("]")
+        return parts
 
-        indices_str = "][".join(indices_code)
-        return f"{var.name}[{indices_str}]"
+    def offset_index(self, index_expr: Expression) -> Optional[int]:
+        # Начало диапазона, по индексам которого идет переменная цикла
+        # index_expr, или None
+        if isinstance(index_expr, Variable) and not index_expr.indices:
+            return self.offsets.get(index_expr.name)
+        return None
 
     def generate_function_call(self, call: FunctionCall) -> str:
-        # Стандартные функции
-        func_map = {
-            "abs": "abs",
-            "sqr": lambda x: f"({x} * {x})",
-            "sqrt": "sqrt",
-            "sin": "sin",
-            "cos": "cos",
-            "ln": "log",
-            "exp": "exp",
-            "length": lambda x: f"{x}.length()",
-        }
-
-        if call.name in func_map:
-            args = [self.generate_expression(arg) for arg in call.arguments]
-
-            if callable(func_map[call.name]):
-                return func_map[call.name](args[0] if args else "")
-            else:
-                return f"{func_map[call.name]}({', '.join(args)})"
-
-        # Пользовательские функции
-        args = ", ".join(self.generate_expression(arg) for arg in call.arguments)
-        return f"{call.name}({args})"
+        return self.generate_expression(call)
+
+    def function_call_parts(self, call: FunctionCall) -> list:
+        # Фрагменты вызова функции для generate_expression
+        builtin = BUILTIN_FUNCTIONS.get(call.name)
+        target = builtin.cpp if builtin is not None else call.name
+
+        # Шаблон, повторяющий аргумент, подставляется только для переменной
+        # или литерала; сложный аргумент передается функции из заголовка
+        # программы и вычисляется один раз
+        if (builtin is not None and builtin.repeats_argument and call.arguments
+                and not is_simple_argument(call.arguments[0])):
+            self.runtime_functions.add(builtin.name)
+            target = builtin.name
+
+        if "{0}" in target:
+            argument = call.arguments[0] if call.arguments else ""
+            pieces = target.split("{0}")
+            parts = [pieces[0]]
+            for piece in pieces[1:]:
+                parts.extend((argument, piece))
+            return parts
+
+        # Пользовательские функции и стандартные, переименованные в C++
+        parts = [f"{target}("]
+        for i, arg in enumerate(call.arguments):
+            if i:
+                parts.append(", ")
+            parts.append(arg)
+        parts.append(")")
+        return parts
+
+
+def is_simple_argument(expr: Expression) -> bool:
+    # Аргумент, который можно повторить в шаблоне стандартной функции:
+    # его вычисление ничего не стоит и не имеет побочных эффектов
+    return isinstance(expr, LITERAL_CLASSES) or isinstance(expr, Variable) and not expr.indices
@@ -0,0 +1,456 @@
+"""
+Устранение общих подвыражений
+Одинаковые выражения линейного участка программы вычисляются один раз
+во временную переменную
+"""
+
+from typing import Dict, List, Optional
+
+from src.ast_nodes import (
+    Program,
+    Statement,
+    CompoundStatement,
+    AssignmentStatement,
+    IfStatement,
+    WhileStatement,
+    RepeatStatement,
+    ForStatement,
+    CaseStatement,
+    ProcedureCall,
+    Expression,
+    BinaryOp,
+    Variable,
+    node_key,
+)
+from src.optimizer import reference_parameters, statement_children
+from src.semantic import SemanticInfo
+from src.standard import IO_PROCEDURES, JUMP_PROCEDURES, READ_PROCEDURES
+from src.temporaries import (
+    ALIASED,
+    NO_WRITES,
+    Replacement,
+    TemporaryPass,
+    expression_children,
+    expression_nodes,
+    expression_shape,
+    expression_text,
+    with_children,
+)
+from src.visitor import NodeTransformer
+
+# Префикс имен временных переменных: cse1, cse2 ...
+TEMPORARY_PREFIX = "cse"
+
+
+class Occurrence:
+    # Вхождение выражения в участок: ветвь (0 — сам участок, иначе номер
+    # ветви if или case, которой он заканчивается), номер оператора в ней,
+    # вычисляется ли оно при каждом выполнении оператора, и ближайшее
+    # объемлющее вхождение того же выражения-кандидата
+    __slots__ = ("node", "group", "part", "number", "certain", "parent")
+
+    def __init__(self, node: Expression, group: tuple, part: int, number: int,
+                 certain: bool, parent: Optional["Occurrence"]):
+        self.node = node
+        self.group = group
+        self.part = part
+        self.number = number
+        self.certain = certain
+        self.parent = parent
+
+
+class CommonSubexpressions(TemporaryPass):
+    """
+    Вычисляет одинаковые по структуре чистые выражения (операции, вызовы
+    стандартных и чистых пользовательских функций, обращения к элементам
+    массивов) один раз во временную переменную cse<N>.
+
+    Участок — последовательность присваиваний и вызовов процедур вместе с
+    условием if, выражением case или границами for, которыми она
+    заканчивается; для if и case к нему добавляется начало каждой ветви.
+    Запись в переменную выражения (присваивание, read, var-аргумент,
+    массив-аргумент, глобальные переменные вызванной подпрограммы,
+    псевдонимы var-параметров) завершает его общую часть: следующие
+    вхождения вычисляются заново. Операторы, вызывающие функции с
+    побочными эффектами, не изменяются.
+
+    Индексы аргументов read и readln не заменяются: оператор записывает
+    аргументы по очереди, и следующий индекс может читать только что
+    прочитанную переменную.
+
+    Выражение заменяется, если на каком-либо пути через участок оно
+    вычислялось бы не меньше двух раз; вложенное общее выражение
+    вычисляется и в определении объемлющей переменной. Переменная
+    вычисляется перед оператором, в котором выражение встретилось первым;
+    выражение, которое может прервать программу (деление, индекс массива,
+    вызов пользовательской функции), заменяется, только если это первое
+    вхождение вычисляется всегда, а не в правом операнде and/or.
+
+    eliminated — список замен (область, выражение, переменная, число
+    вхождений); после eliminate() semantics — результат анализа итогового
+    дерева
+    """
+
+    prefix = TEMPORARY_PREFIX
+
+    def __init__(self):
+        super().__init__()
+        self.eliminated: List[tuple] = []
+
+    def eliminate(self, program: Program, semantics: Optional[SemanticInfo] = None) -> Program:
+        return self.run(program, semantics)
+
+    def process_body(self, body: CompoundStatement) -> Statement:
+        self.keys: Dict[tuple, int] = {}  # структура выражения -> номер
+        self.names: List[frozenset] = []  # номер -> переменные выражения
+        self.sizes: List[int] = []  # номер -> число узлов выражения
+        # номер -> (чистое ли, может ли прервать программу, кандидат ли)
+        self.kinds: List[tuple] = []
+        return self.rewrite(body)
+
+    def rewrite(self, root: Statement) -> Statement:
+        # Обработка сверху вниз: участки списка операторов заменяются до
+        # обработки вложенных операторов (ветви if получают переменные
+        # объемлющего участка), затем операторы собираются снизу вверх.
+        # Признак listed — оператор уже обработан в списке составного
+        results = []
+        work = [(root, False)]
+        while work:
+            item = work.pop()
+            if item.__class__ is list:
+                stmt, count = item
+                start = len(results) - count
+                children = results[start:]
+                del results[start:]
+                results.append(with_children(stmt, children))
+                continue
+            stmt, listed = item
+            if stmt is None:
+                results.append(None)
+                continue
+            if isinstance(stmt, CompoundStatement):
+                statements = self.eliminate_list(stmt.statements)
+                if statements is not stmt.statements:
+                    stmt = NodeTransformer.rebuild(stmt, {"statements": statements})
+            elif not listed:
+                statements = self.eliminate_list([stmt])
+                if len(statements) > 1:
+                    stmt = CompoundStatement(statements, position=stmt.position)
+                else:
+                    stmt = statements[0]
+            children = statement_children(stmt)
+            listed = isinstance(stmt, CompoundStatement)
+            work.append([stmt, len(children)])
+            work.extend((child, listed) for child in reversed(children))
+        return results[0]
+
+    # Участки
+
+    def eliminate_list(self, statements: list) -> list:
+        # Список операторов с общими выражениями, вычисленными заранее;
+        # если ничего не заменено — тот же список
+        result = []
+        changed = False
+        start = 0
+        for number, stmt in enumerate(statements):
+            if is_simple(stmt):
+                continue
+            block = self.eliminate_block(statements[start:number], stmt)
+            changed = changed or block is not None
+            result.extend(block or statements[start:number + 1])
+            start = number + 1
+        if start < len(statements):
+            block = self.eliminate_block(statements[start:], None)
+            changed = changed or block is not None
+            result.extend(block or statements[start:])
+        return result if changed else statements
+
+    def eliminate_block(self, block: list, last: Optional[Statement]) -> Optional[list]:
+        # Операторы участка (block и last) после замены или None
+        self.windows: Dict[int, int] = {}  # номер выражения -> номер общей части
+        self.readers: Dict[str, set] = {}  # переменная -> номера читающих ее выражений
+        self.occurrences: List[Occurrence] = []
+
+        statements = list(block)
+        if last is not None:
+            statements.append(last)
+        for number, stmt in enumerate(statements):
+            self.scan(stmt, 0, number, stmt is not last or has_heads(last))
+        branches = []
+        if isinstance(last, (IfStatement, CaseStatement)):
+            branches = [child for child in statement_children(last) if child is not None]
+        windows = self.windows
+        for part, branch in enumerate(branches, 1):
+            self.windows = dict(windows)
+            for number, stmt in enumerate(leading_statements(branch)):
+                self.scan(stmt, part, number, True)
+
+        selected = self.select()
+        if not selected:
+            return None
+
+        # Присваивания переменным — перед оператором первого вхождения,
+        # вложенные выражения раньше объемлющих
+        assignments: Dict[int, list] = {}
+        for group in sorted(selected, key=lambda group: selected[group][2]):
+            name, definition, _ = selected[group]
+            inner = {
+                node_key(item.node): Variable(selected[item.group][0], position=item.node.position)
+                for item in self.occurrences
+                if item.part == 0 and item.number == definition.number
+                and item.group in selected and item.group != group
+                and self.inside(item, definition)
+            }
+            expr = definition.node
+            if inner:
+                expr = Replacement(self, inner).transform(expr)
+            assignments.setdefault(definition.number, []).append(AssignmentStatement(
+                Variable(name, position=expr.position), expr, position=expr.position))
+
+        replaced = self.replaced(selected)
+        result = []
+        for number, stmt in enumerate(statements):
+            result.extend(assignments.get(number, ()))
+            new = self.replace_heads(stmt, replaced.get((0, number)))
+            if stmt is last and branches:
+                # Отсутствующая ветвь else — последняя, нумерация не сбивается
+                new = with_children(new, [
+                    self.replace_branch(child, part, replaced) if child is not None else None
+                    for part, child in enumerate(statement_children(last), 1)
+                ])
+            result.append(new)
+        return result
+
+    def scan(self, stmt: Statement, part: int, number: int, evaluated: bool):
+        # Вхождения выражений оператора; после них — записи оператора.
+        # Оператор, который вызывает функцию с побочными эффектами (или
+        # функцию без скобок, как переменную), не просматривается: она
+        # может изменить переменные посреди вычисления выражений
+        heads = self.heads(stmt) if evaluated else []
+        analyzed = [self.analyze_structure(expr) for expr in heads]
+        opaque = any(not self.kinds[ids[node_key(expr)]][0] for expr, ids in zip(heads, analyzed))
+        if not opaque:
+            for expr, ids in zip(heads, analyzed):
+                self.record(expr, ids, part, number)
+        writes = set()
+        self.own_writes(stmt, writes, calls=opaque)
+        self.kill(writes)
+
+    def heads(self, stmt: Statement) -> list:
+        # read и readln записывают аргументы по очереди: индекс следующего
+        # аргумента может читать переменную, только что прочитанную, а
+        # временная переменная вычислялась бы до всего оператора. Их
+        # выражения не заменяются, записи учитываются как обычно
+        if isinstance(stmt, ProcedureCall) and stmt.name in READ_PROCEDURES:
+            return []
+        return super().heads(stmt)
+
+    def analyze_structure(self, expr: Expression) -> dict:
+        # Номера структур узлов выражения — снизу вверх
+        ids = {}
+        for node in reversed(list(expression_nodes(expr))):
+            ids[node_key(node)] = self.structure(
+                node, [ids[node_key(child)] for child in expression_children(node)])
+        return ids
+
+    def record(self, expr: Expression, ids: dict, part: int, number: int):
+        # Вхождения кандидатов — сверху вниз, с объемлющим вхождением
+        work = [(expr, True, None)]
+        while work:
+            node, certain, parent = work.pop()
+            number_id = ids[node_key(node)]
+            _, traps, candidate = self.kinds[number_id]
+            if candidate:
+                if number_id not in self.windows:
+                    self.windows[number_id] = 0
+                    for name in self.names[number_id]:
+                        self.readers.setdefault(name, set()).add(number_id)
+                parent = Occurrence(node, (number_id, self.windows[number_id]), part, number,
+                                    certain or not traps, parent)
+                self.occurrences.append(parent)
+            if isinstance(node, BinaryOp):
+                work.append((node.right, certain and node.operator not in ("and", "or"), parent))
+                work.append((node.left, certain, parent))
+            else:
+                work.extend((child, certain, parent) for child in reversed(expression_children(node)))
+
+    def structure(self, node: Expression, children: list) -> int:
+        # Номер выражения: одинаковые по структуре выражения получают
+        # один номер. Переменные выражения, размер и разбор узла зависят
+        # только от структуры и вычисляются для нее один раз
+        shape = expression_shape(node, children)
+        number_id = self.keys.get(shape)
+        if number_id is None:
+            number_id = self.keys[shape] = len(self.keys)
+            # Переменные, которые читает выражение
+            names = set()
+            for child in children:
+                names.update(self.names[child])
+            if isinstance(node, Variable):
+                names.add(node.name)
+            self.names.append(frozenset(names))
+            self.sizes.append(1 + sum(self.sizes[child] for child in children))
+            info = {node_key(child): self.kinds[child_id]
+                    for child, child_id in zip(expression_children(node), children)}
+            pure, traps = self.classify(node, NO_WRITES, info)
+            self.kinds.append((pure, traps, pure and self.worth(node)))
+        return number_id
+
+    def kill(self, writes: set):
+        # Записи оператора завершают общую часть выражений, читающих
+        # измененные переменные
+        if not writes:
+            return
+        aliased = ALIASED in writes
+        for name, readers in self.readers.items():
+            if name in writes or aliased and name in self.aliased:
+                for number_id in readers:
+                    if number_id in self.windows:
+                        self.windows[number_id] += 1
+
+    # Выбор заменяемых выражений
+
+    def select(self) -> dict:
+        # Группа (номер выражения, общая часть) -> (переменная, вхождение-
+        # определение, размер выражения). Группы просматриваются от
+        # больших выражений к меньшим: вхождения внутри замененного
+        # выражения не вычисляются, кроме вхождений в его определении
+        groups: Dict[tuple, list] = {}
+        for item in self.occurrences:
+            groups.setdefault(item.group, []).append(item)
+        selected = {}
+        definitions = set()  # id вхождений-определений
+        for group in sorted(groups, key=lambda group: -self.sizes[group[0]]):
+            main = []
+            branches: Dict[int, int] = {}
+            for item in groups[group]:
+                ancestor = item.parent
+                while ancestor is not None and ancestor.group not in selected:
+                    ancestor = ancestor.parent
+                if ancestor is not None and id(ancestor) not in definitions:
+                    continue
+                if item.part == 0:
+                    main.append(item)
+                else:
+                    branches[item.part] = branches.get(item.part, 0) + 1
+            if not main or len(main) + max(branches.values(), default=0) < 2:
+                continue
+            definition = main[0]
+            if not definition.certain:
+                continue
+            name = self.temporary(self.type_of(definition.node))
+            selected[group] = (name, definition, self.sizes[group[0]])
+            definitions.add(id(definition))
+            self.eliminated.append((
+                self.scope.name, expression_text(definition.node), name,
+                len(main) + sum(branches.values()),
+            ))
+        return selected
+
+    def inside(self, item: Occurrence, definition: Occurrence) -> bool:
+        ancestor = item.parent
+        while ancestor is not None:
+            if ancestor is definition:
+                return True
+            ancestor = ancestor.parent
+        return False
+
+    def replaced(self, selected: dict) -> dict:
+        # (ветвь, номер оператора) -> замены в выражениях оператора
+        replacements: Dict[tuple, dict] = {}
+        for item in self.occurrences:
+            if item.group in selected:
+                name = selected[item.group][0]
+                replacements.setdefault((item.part, item.number), {})[node_key(item.node)] = (
+                    Variable(name, position=item.node.position))
+        return replacements
+
+    # Перестройка операторов
+
+    def replace_branch(self, branch: Statement, part: int, replaced: dict) -> Statement:
+        # Ветвь, в начальных операторах которой выражения заменены
+        if not isinstance(branch, CompoundStatement):
+            return self.replace_heads(branch, replaced.get((part, 0)))
+        statements = list(branch.statements)
+        for number, stmt in enumerate(leading_statements(branch)):
+            statements[number] = self.replace_heads(stmt, replaced.get((part, number)))
+        return with_children(branch, statements)
+
+    def replace_heads(self, stmt: Statement, replacements: Optional[dict]) -> Statement:
+        # Оператор, в выражениях heads(stmt) которого заменены вхождения;
+        # переменные-приемники и var-аргументы остаются на месте
+        if not replacements:
+            return stmt
+        transformer = Replacement(self, replacements)
+
+        def replace(expr: Expression) -> Expression:
+            return transformer.transform(expr)
+
+        def replace_indices(var: Variable) -> Variable:
+            indices = [replace(index) for index in var.indices]
+            if all(new is old for new, old in zip(indices, var.indices)):
+                return var
+            return NodeTransformer.rebuild(var, {"indices": indices})
+
+        if isinstance(stmt, AssignmentStatement):
+            return NodeTransformer.rebuild(stmt, {
+                "variable": replace_indices(stmt.variable),
+                "expression": replace(stmt.expression),
+            })
+        if isinstance(stmt, ProcedureCall):
+            if stmt.name in READ_PROCEDURES:
+                arguments = [replace_indices(arg) if isinstance(arg, Variable) else arg
+                             for arg in stmt.arguments]
+            elif stmt.name in IO_PROCEDURES:
+                arguments = [replace(arg) for arg in stmt.arguments]
+            else:
+                symbol = self.lookup(stmt.name)
+                arguments = [
+                    replace_indices(arg) if by_reference and isinstance(arg, Variable)
+                    else replace(arg)
+                    for arg, by_reference in zip(stmt.arguments, reference_parameters(symbol))
+                ]
+            return NodeTransformer.rebuild(stmt, {"arguments": arguments})
+        if isinstance(stmt, (IfStatement, WhileStatement, RepeatStatement)):
+            return NodeTransformer.rebuild(stmt, {"condition": replace(stmt.condition)})
+        if isinstance(stmt, ForStatement):
+            return NodeTransformer.rebuild(stmt, {
+                "start_value": replace(stmt.start_value),
+                "end_value": replace(stmt.end_value),
+            })
+        if isinstance(stmt, CaseStatement):
+            return NodeTransformer.rebuild(stmt, {"expression": replace(stmt.expression)})
+        return stmt
+
+
+def is_simple(stmt: Statement) -> bool:
+    # Оператор внутри участка: не передает управление и не содержит
+    # других операторов
+    if isinstance(stmt, ProcedureCall):
+        return stmt.name not in JUMP_PROCEDURES
+    return isinstance(stmt, AssignmentStatement)
+
+
+def has_heads(stmt: Statement) -> bool:
+    # Вычисляет ли оператор, завершающий участок, свои выражения один раз
+    # перед вложенными операторами
+    return isinstance(stmt, (IfStatement, CaseStatement, ForStatement))
+
+
+def leading_statements(branch: Statement) -> list:
+    # Начало ветви, которое входит в участок: простые операторы и
+    # следующий за ними if, case или for (только его выражения)
+    statements = branch.statements if isinstance(branch, CompoundStatement) else [branch]
+    leading = []
+    for stmt in statements:
+        if is_simple(stmt):
+            leading.append(stmt)
+            continue
+        if has_heads(stmt):
+            leading.append(stmt)
+        break
+    return leading
+
+
+def eliminate_common_subexpressions(program: Program) -> Program:
+    return CommonSubexpressions().eliminate(program)
@@ -0,0 +1,244 @@
+"""
+Свертка констант
+Вычисление выражений над литералами во время трансляции по правилам Pascal
+"""
+
+import math
+from typing import List, Optional
+
+from src.ast_nodes import (
+    ASTNode,
+    ArrayType,
+    Expression,
+    BinaryOp,
+    UnaryOp,
+    IntegerLiteral,
+    RealLiteral,
+    StringLiteral,
+    CharLiteral,
+    BooleanLiteral,
+    FunctionCall,
+)
+from src.visitor import NodeTransformer
+
+# Диапазон integer (32 бита, как int в C++). Результат за его пределами не
+# сворачивается: в C++ такое выражение переполнилось бы, и свертка
+# изменила бы поведение программы
+INTEGER_MIN = -(2**31)
+INTEGER_MAX = 2**31 - 1
+
+# Значение выражения, которое нельзя вычислить при трансляции (0 и False —
+# обычные значения, поэтому нужен отдельный маркер)
+NOT_CONSTANT = object()
+
+LITERAL_CLASSES = (IntegerLiteral, RealLiteral, StringLiteral, CharLiteral, BooleanLiteral)
+
+_RELATIONS = {
+    "=": lambda a, b: a == b,
+    "<>": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    ">": lambda a, b: a > b,
+    "<=": lambda a, b: a <= b,
+    ">=": lambda a, b: a >= b,
+}
+
+# Стандартные функции вещественного аргумента с вещественным результатом
+_REAL_FUNCTIONS = {
+    "sqrt": math.sqrt,
+    "sin": math.sin,
+    "cos": math.cos,
+    "ln": math.log,
+    "exp": math.exp,
+}
+
+
+def _category(value) -> Optional[str]:
+    # Вид значения литерала: числа, логические значения и символы
+    # сравниваются только внутри своего вида
+    if value.__class__ is bool:
+        return "boolean"
+    if value.__class__ is int or value.__class__ is float:
+        return "number"
+    if value.__class__ is str and len(value) == 1 and value.isascii():
+        return "char"
+    return None
+
+
+def _checked(value):
+    # Результат свертки или NOT_CONSTANT, если он непредставим в C++
+    if value.__class__ is int:
+        return value if INTEGER_MIN <= value <= INTEGER_MAX else NOT_CONSTANT
+    if value.__class__ is float and not math.isfinite(value):
+        return NOT_CONSTANT
+    return value
+
+
+def _pascal_div(a: int, b: int) -> int:
+    # div в Pascal (и / над int в C++) отбрасывает дробную часть, а не
+    # округляет вниз, как // в Python
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+def evaluate_binary(operator: str, left, right):
+    category = _category(left)
+    if category is None or category != _category(right):
+        return NOT_CONSTANT
+
+    relation = _RELATIONS.get(operator)
+    if relation is not None:
+        return relation(left, right)
+
+    if category == "boolean":
+        if operator == "and":
+            return left and right
+        if operator == "or":
+            return left or right
+        if operator == "xor":
+            return left != right
+        return NOT_CONSTANT
+
+    if category != "number":
+        return NOT_CONSTANT
+
+    integers = left.__class__ is int and right.__class__ is int
+    if operator == "+":
+        return _checked(left + right)
+    if operator == "-":
+        return _checked(left - right)
+    if operator == "*":
+        return _checked(left * right)
+    if operator == "/":
+        return _checked(left / right) if right else NOT_CONSTANT
+    if not integers:
+        return NOT_CONSTANT
+    if operator == "div":
+        return _checked(_pascal_div(left, right)) if right else NOT_CONSTANT
+    if operator == "mod":
+        # Знак остатка — как у делимого (так же в C++)
+        return left - right * _pascal_div(left, right) if right else NOT_CONSTANT
+    # and, or, xor над целыми — поразрядные операции
+    if operator == "and":
+        return left & right
+    if operator == "or":
+        return left | right
+    if operator == "xor":
+        return left ^ right
+    return NOT_CONSTANT
+
+
+def evaluate_unary(operator: str, operand):
+    category = _category(operand)
+    if operator == "not":
+        if category == "boolean":
+            return not operand
+        if operand.__class__ is int:
+            return ~operand
+        return NOT_CONSTANT
+    if category != "number":
+        return NOT_CONSTANT
+    return _checked(-operand if operator == "-" else operand)
+
+
+def evaluate_function(name: str, arguments: list):
+    if len(arguments) != 1:
+        return NOT_CONSTANT
+    value = arguments[0]
+
+    if name == "length":
+        return len(value) if value.__class__ is str else NOT_CONSTANT
+    if _category(value) != "number":
+        return NOT_CONSTANT
+    if name == "abs":
+        return _checked(abs(value))
+    if name == "sqr":
+        return _checked(value * value)
+    function = _REAL_FUNCTIONS.get(name)
+    if function is None:
+        return NOT_CONSTANT
+    try:
+        return _checked(function(value))
+    except (ValueError, OverflowError):
+        return NOT_CONSTANT
+
+
+def literal(value, like: Optional[ASTNode] = None) -> Expression:
+    # Узел литерала для значения; положение берется у заменяемого узла
+    position = like.position if like is not None else -1
+    if value.__class__ is bool:
+        return BooleanLiteral(value, position=position)
+    if value.__class__ is int:
+        return IntegerLiteral(value, position=position)
+    if value.__class__ is float:
+        return RealLiteral(value, position=position)
+    if len(value) == 1:
+        return CharLiteral(value, position=position)
+    return StringLiteral(value, position=position)
+
+
+class ConstantFolder(NodeTransformer):
+    """
+    Заменяет операции, все операнды которых — литералы, литералом с их
+    значением: арифметика integer и real, div и mod с усечением к нулю,
+    and/or/xor/not (логические над boolean, поразрядные над integer),
+    сравнения чисел, логических значений и символов, стандартные функции
+    abs, sqr, sqrt, sin, cos, ln, exp и length строкового литерала.
+    Деление на ноль, переполнение integer и нечисловые результаты не
+    сворачиваются — такое выражение остается в программе как есть
+    """
+
+    def __init__(self):
+        self.folded = 0  # число свернутых операций
+
+    def fold(self, node: ASTNode, value) -> ASTNode:
+        if value is NOT_CONSTANT:
+            return node
+        self.folded += 1
+        return literal(value, node)
+
+    def visit_BinaryOp(self, expr: BinaryOp) -> Expression:
+        left = expr.left
+        right = expr.right
+        if isinstance(left, LITERAL_CLASSES) and isinstance(right, LITERAL_CLASSES):
+            return self.fold(expr, evaluate_binary(expr.operator, left.value, right.value))
+        return expr
+
+    def visit_UnaryOp(self, expr: UnaryOp) -> Expression:
+        if isinstance(expr.operand, LITERAL_CLASSES):
+            return self.fold(expr, evaluate_unary(expr.operator, expr.operand.value))
+        return expr
+
+    def visit_FunctionCall(self, expr: FunctionCall) -> Expression:
+        if all(isinstance(arg, LITERAL_CLASSES) for arg in expr.arguments):
+            values = [arg.value for arg in expr.arguments]
+            return self.fold(expr, evaluate_function(expr.name, values))
+        return expr
+
+
+def fold_constants(node: ASTNode) -> ASTNode:
+    # Дерево со свернутыми константами; исходное дерево не изменяется
+    return ConstantFolder().transform(node)
+
+
+def constant_value(expr: Expression):
+    # Значение выражения, если оно известно при трансляции, иначе NOT_CONSTANT
+    if not isinstance(expr, LITERAL_CLASSES):
+        expr = fold_constants(expr)
+        if not isinstance(expr, LITERAL_CLASSES):
+            return NOT_CONSTANT
+    return expr.value
+
+
+def array_bounds(array_type: ArrayType) -> List[tuple]:
+    # Границы всех измерений массива (включая массивы массивов) как пары
+    # целых; неизвестная при трансляции граница — None
+    bounds = []
+    while isinstance(array_type, ArrayType):
+        for start_expr, end_expr in array_type.dimensions:
+            pair = []
+            for expr in (start_expr, end_expr):
+                value = constant_value(expr)
+                pair.append(value if value.__class__ is int else None)
+            bounds.append(tuple(pair))
+        array_type = array_type.element_type
+    return bounds
@@ -3,10 +3,13 @@
 Разбивает исходный код на последовательность токенов
 """
 
+import mmap
 import re
+from array import array
+from bisect import bisect_right
 from enum import Enum
-from dataclasses import dataclass
-from typing import List, Optional
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional
 
 
 class TokenType(Enum):
@@ -99,16 +102,65 @@ class TokenType(Enum):
     EOF = "EOF"
     NEWLINE = "NEWLINE"
 
+    # Члены перечисления уникальны и сравниваются по идентичности, поэтому
+    # хеш по адресу согласован с равенством; стандартный Enum.__hash__
+    # написан на Python и заметно замедляет таблицы разбора по типу токена
+    __hash__ = object.__hash__
 
-@dataclass
+
+class LineIndex:
+    # Таблица смещений начал строк исходного кода (str или байты UTF-8).
+    # Строится одним проходом при первом запросе позиции, поэтому лексеру
+    # не нужно отслеживать строку и столбец для каждого символа
+    def __init__(self, source):
+        self.source = source
+        self.line_starts = None
+
+    def reset(self, source):
+        # Новый текст после правки; таблица перестроится при первом запросе
+        self.source = source
+        self.line_starts = None
+
+    def build(self) -> List[int]:
+        if self.line_starts is None:
+            newline = "\n" if isinstance(self.source, str) else b"\n"
+            self.line_starts = [0]
+            self.line_starts.extend(
+                m.end() for m in re.finditer(newline, self.source)
+            )
+        return self.line_starts
+
+    def position(self, offset: int) -> tuple:
+        # (строка, столбец) по смещению; столбец считается в символах
+        line_starts = self.build()
+        line = bisect_right(line_starts, offset)
+        line_start = line_starts[line - 1]
+        if isinstance(self.source, str):
+            return line, offset - line_start + 1
+        segment = self.source[line_start:offset]
+        if segment.isascii():
+            return line, len(segment) + 1
+        return line, len(segment.decode("utf-8")) + 1
+
+
+@dataclass(slots=True)
 class Token:
     type: TokenType
     value: any
-    line: int
-    column: int
+    offset: int
+    index: LineIndex = field(default=None, repr=False, compare=False)
+
+    @property
+    def line(self) -> int:
+        return self.index.position(self.offset)[0]
+
+    @property
+    def column(self) -> int:
+        return self.index.position(self.offset)[1]
 
     def __repr__(self):
-        return f"Token({self.type.name}, {self.value!r}, {self.line}:{self.column})"
+        line, column = self.index.position(self.offset)
+        return f"Token({self.type.name}, {self.value!r}, {line}:{column})"
 
 
 class LexerError(Exception):
@@ -167,12 +219,16 @@ class Lexer:
         "length",
     }
 
-    def __init__(self, source: str):
+    def __init__(self, source: str, recover: bool = False):
         self.source = source
+        self.index = LineIndex(source)
         self.pos = 0
         self.line = 1
         self.column = 1
         self.tokens: List[Token] = []
+        # С восстановлением ошибки не прерывают разбор, а собираются в
+        # errors; ошибочный фрагмент пропускается
+        self.errors: Optional[List[LexerError]] = [] if recover else None
 
     def current_char(self) -> Optional[str]:
         if self.pos >= len(self.source):
@@ -228,8 +284,7 @@ class Lexer:
                 self.advance()
 
     def read_number(self) -> Token:
-        start_line = self.line
-        start_column = self.column
+        start = self.pos
         num_str = ""
 
         while self.current_char() and self.current_char().isdigit():
@@ -268,14 +323,13 @@ class Lexer:
                     self.advance()
 
             return Token(
-                TokenType.REAL_LITERAL, float(num_str), start_line, start_column
+                TokenType.REAL_LITERAL, float(num_str), start, self.index
             )
 
-        return Token(TokenType.INT_LITERAL, int(num_str), start_line, start_column)
+        return Token(TokenType.INT_LITERAL, int(num_str), start, self.index)
 
     def read_string(self) -> Token:
-        start_line = self.line
-        start_column = self.column
+        start = self.pos
         quote = self.current_char()
         self.advance()
 
@@ -296,15 +350,14 @@ class Lexer:
         if quote == "'":
             if len(string_val) == 1:
                 return Token(
-                    TokenType.CHAR_LITERAL, string_val, start_line, start_column
+                    TokenType.CHAR_LITERAL, string_val, start, self.index
                 )
-            return Token(TokenType.STRING_LITERAL, string_val, start_line, start_column)
+            return Token(TokenType.STRING_LITERAL, string_val, start, self.index)
         else:
-            return Token(TokenType.STRING_LITERAL, string_val, start_line, start_column)
+            return Token(TokenType.STRING_LITERAL, string_val, start, self.index)
 
     def read_identifier(self) -> Token:
-        start_line = self.line
-        start_column = self.column
+        start = self.pos
         ident = ""
 
         while self.current_char() and (
@@ -317,11 +370,202 @@ class Lexer:
 
         if ident_lower in self.KEYWORDS:
             token_type = TokenType[ident_lower.upper()]
-            return Token(token_type, ident_lower, start_line, start_column)
+            return Token(token_type, ident_lower, start, self.index)
 
-        return Token(TokenType.IDENTIFIER, ident, start_line, start_column)
+        return Token(TokenType.IDENTIFIER, ident, start, self.index)
 
     def tokenize(self) -> List[Token]:
+        self.tokens.extend(self.iter_tokens())
+        return self.tokens
+
+    def tokenize_compact(self) -> "CompactTokens":
+        tokens = CompactTokens(self.source, self.index)
+        for token_type, _, start, end in self.scan():
+            tokens.append(token_type, start, end)
+        return tokens
+
+    def iter_tokens(self) -> Iterator[Token]:
+        # Токены выдаются по одному, список целиком не строится
+        index = self.index
+        for token_type, value, start, _ in self.scan():
+            yield Token(token_type, value, start, index)
+
+    def scan(self, pos: int = 0) -> Iterator[tuple]:
+        # Однопроходный разбор по мастер-шаблону, начиная со смещения pos:
+        # каждый токен вместе с предшествующими пробелами и комментариями
+        # распознается одним совпадением. Выдает кортежи (тип, значение,
+        # начало, конец); строка и столбец вычисляются по смещению
+        # только при необходимости
+        source = self.source
+        restart = True
+
+        while restart:
+            restart = False
+            for m in _TOKEN_PATTERN.finditer(source, pos):
+                kind = m.lastgroup
+                start = m.start(kind)
+                end = pos = m.end()
+
+                if kind == "IDENTIFIER":
+                    text = m.group(kind)
+                    first = text[0]
+                    if first >= "\x80" and not (first.isalpha() or first == "_"):
+                        # Символ Unicode, который шаблон считает началом слова,
+                        # а посимвольный лексер — нет
+                        if not first.isdigit():
+                            self._report(f"Недопустимый символ '{first}'", start)
+                            pos = start + 1
+                            restart = True
+                            break
+                        token, pos = self._read_number_at(start)
+                        if token is not None:
+                            yield token.type, token.value, start, pos
+                        restart = True
+                        break
+                    lowered = text.lower()
+                    token_type = _KEYWORD_TYPES.get(lowered)
+                    if token_type is None:
+                        yield TokenType.IDENTIFIER, text, start, end
+                    else:
+                        yield token_type, lowered, start, end
+
+                elif kind == "OPERATOR":
+                    text = m.group(kind)
+                    yield _OPERATOR_TYPES[text], text, start, end
+
+                elif kind == "COMMENT":
+                    continue
+
+                elif kind in _NUMBER_KINDS and not source[end : end + 2].isascii():
+                    # Рядом с числом символы Unicode: классы цифр шаблона
+                    # и str.isdigit() расходятся, поэтому число читается посимвольно
+                    token, pos = self._read_number_at(start)
+                    if token is not None:
+                        yield token.type, token.value, start, pos
+                    restart = True
+                    break
+
+                elif kind == "INTEGER":
+                    yield TokenType.INT_LITERAL, int(m.group(kind)), start, end
+
+                elif kind == "REAL":
+                    yield TokenType.REAL_LITERAL, float(m.group(kind)), start, end
+
+                elif kind == "STRING":
+                    value = source[start + 1 : end - 1]
+                    if source[start] == "'" and len(value) == 1:
+                        yield TokenType.CHAR_LITERAL, value, start, end
+                    else:
+                        yield TokenType.STRING_LITERAL, value, start, end
+
+                elif kind == "END":
+                    break
+
+                elif kind == "BAD_EXPONENT":
+                    self._report("Неверный формат экспоненты", end)
+
+                elif kind == "BAD_STRING":
+                    newline = source.find("\n", start)
+                    error_pos = len(source) if newline == -1 else newline
+                    self._report("Незавершенный строковый литерал", error_pos)
+                    # Литерал отбрасывается до конца строки
+                    pos = error_pos
+                    restart = True
+                    break
+
+                elif kind == "BAD_COMMENT":
+                    # Комментарий поглощает весь остаток файла
+                    self._report("Незавершенный комментарий", len(source))
+                    break
+
+                else:
+                    self._report(f"Недопустимый символ '{m.group(kind)}'", start)
+
+        yield TokenType.EOF, None, len(source), len(source)
+
+    def _read_number_at(self, pos: int) -> tuple:
+        # Посимвольное чтение числа; позиция нужна для сообщений об ошибках.
+        # При восстановлении ошибочное число пропускается (токен None)
+        self.pos = pos
+        self.line, self.column = self.index.position(pos)
+        try:
+            token = self.read_number()
+        except LexerError as error:
+            if self.errors is None:
+                raise
+            self.errors.append(error)
+            return None, max(self.pos, pos + 1)
+        return token, self.pos
+
+    def _error(self, message: str, pos: int) -> LexerError:
+        return LexerError(message, *self.index.position(pos))
+
+    def _report(self, message: str, pos: int):
+        # Без восстановления ошибка прерывает разбор, иначе запоминается
+        error = self._error(message, pos)
+        if self.errors is None:
+            raise error
+        self.errors.append(error)
+
+
+# Таблицы для Lexer.iter_tokens, вычисляемые один раз при загрузке модуля
+_KEYWORD_TYPES = {name: TokenType[name.upper()] for name in Lexer.KEYWORDS}
+
+_OPERATOR_TYPES = {
+    ":=": TokenType.ASSIGN,
+    "<>": TokenType.NOT_EQUAL,
+    "<=": TokenType.LESS_EQUAL,
+    ">=": TokenType.GREATER_EQUAL,
+    "..": TokenType.RANGE,
+    "+": TokenType.PLUS,
+    "-": TokenType.MINUS,
+    "*": TokenType.MULTIPLY,
+    "/": TokenType.DIVIDE,
+    "=": TokenType.EQUAL,
+    "<": TokenType.LESS,
+    ">": TokenType.GREATER,
+    ".": TokenType.DOT,
+    ",": TokenType.COMMA,
+    ";": TokenType.SEMICOLON,
+    ":": TokenType.COLON,
+    "(": TokenType.LPAREN,
+    ")": TokenType.RPAREN,
+    "[": TokenType.LBRACKET,
+    "]": TokenType.RBRACKET,
+}
+
+_NUMBER_KINDS = frozenset(("INTEGER", "REAL", "BAD_EXPONENT"))
+
+# Мастер-шаблон: пробелы перед лексемой и одна альтернатива именованных
+# групп на каждый вид лексемы. Альтернативы с общим первым символом идут
+# в порядке проверок посимвольного лексера (комментарии раньше операторов),
+# группы BAD_* ловят незавершенные конструкции для точных сообщений об ошибках
+_TOKEN_PATTERN = re.compile(
+    r"""
+    [ \t\r\n]*+
+    (?:
+        (?P<IDENTIFIER>[^\W\d]\w*)
+      | (?P<COMMENT>\{[^}]*\}|\(\*.*?\*\)|//[^\n]*)
+      | (?P<BAD_COMMENT>\{|\(\*)
+      | (?P<BAD_EXPONENT>\d+\.\d+[eE][+-]?+(?!\d))
+      | (?P<REAL>\d+\.\d+(?:[eE][+-]?\d+)?)
+      | (?P<INTEGER>\d+)
+      | (?P<STRING>'[^'\n]*'|"[^"\n]*")
+      | (?P<BAD_STRING>['"])
+      | (?P<OPERATOR>:=|<>|<=|>=|\.\.|[-+*/=<>.,;:()\[\]])
+      | (?P<END>\Z)
+      | (?P<ERROR>.)
+    )
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+class CharLexer(Lexer):
+    # Исходный посимвольный лексер. Сохранен как эталон поведения
+    # и как база для сравнения производительности с Lexer
+
+    def iter_tokens(self) -> Iterator[Token]:
         while self.current_char():
             self.skip_whitespace()
 
@@ -337,64 +581,53 @@ class Lexer:
                 self.skip_comment()
                 continue
 
-            start_line = self.line
-            start_column = self.column
+            start = self.pos
             char = self.current_char()
 
             # Числа
             if char.isdigit():
-                self.tokens.append(self.read_number())
+                yield self.read_number()
                 continue
 
             # Строки
             if char in ("'", '"'):
-                self.tokens.append(self.read_string())
+                yield self.read_string()
                 continue
 
             # Идентификаторы и ключевые слова
             if char.isalpha() or char == "_":
-                self.tokens.append(self.read_identifier())
+                yield self.read_identifier()
                 continue
 
             # Двухсимвольные операторы
             if char == ":" and self.peek_char() == "=":
                 self.advance()
                 self.advance()
-                self.tokens.append(
-                    Token(TokenType.ASSIGN, ":=", start_line, start_column)
-                )
+                yield Token(TokenType.ASSIGN, ":=", start, self.index)
                 continue
 
             if char == "<" and self.peek_char() == ">":
                 self.advance()
                 self.advance()
-                self.tokens.append(
-                    Token(TokenType.NOT_EQUAL, "<>", start_line, start_column)
-                )
+                yield Token(TokenType.NOT_EQUAL, "<>", start, self.index)
                 continue
 
             if char == "<" and self.peek_char() == "=":
                 self.advance()
                 self.advance()
-                self.tokens.append(
-                    Token(TokenType.LESS_EQUAL, "<=", start_line, start_column)
-                )
+                yield Token(TokenType.LESS_EQUAL, "<=", start, self.index)
                 continue
 
             if char == ">" and self.peek_char() == "=":
                 self.advance()
                 self.advance()
-                self.tokens.append(
-                    Token(TokenType.GREATER_EQUAL, ">=", start_line, start_column)
-                )
+                yield Token(TokenType.GREATER_EQUAL, ">=", start, self.index)
                 continue
 
             if char == "." and self.peek_char() == ".":
                 self.advance()
                 self.advance()
-                self.tokens.append(
-                    Token(TokenType.RANGE, "..", start_line, start_column)
-                )
+                yield Token(TokenType.RANGE, "..", start, self.index)
                 continue
 
             # Односимвольные операторы и разделители
@@ -418,12 +651,296 @@ class Lexer:
 
             if char in single_char_tokens:
                 self.advance()
-                self.tokens.append(
-                    Token(single_char_tokens[char], char, start_line, start_column)
-                )
+                yield Token(single_char_tokens[char], char, start, self.index)
                 continue
 
             raise LexerError(f"Недопустимый символ '{char}'", self.line, self.column)
 
-        self.tokens.append(Token(TokenType.EOF, None, self.line, self.column))
-        return self.tokens
+        yield Token(TokenType.EOF, None, self.pos, self.index)
+
+
+_BYTE_OPERATORS = {
+    text.encode(): (token_type, text) for text, token_type in _OPERATOR_TYPES.items()
+}
+
+# Байтовый вариант мастер-шаблона. Байты вне ASCII в коде программы
+# допустимы только внутри идентификаторов, строк и комментариев
+_BYTE_TOKEN_PATTERN = re.compile(
+    rb"""
+    [ \t\r\n]*+
+    (?:
+        (?P<IDENTIFIER>[A-Za-z_\x80-\xff][A-Za-z0-9_\x80-\xff]*)
+      | (?P<COMMENT>\{[^}]*\}|\(\*.*?\*\)|//[^\n]*)
+      | (?P<BAD_COMMENT>\{|\(\*)
+      | (?P<BAD_EXPONENT>[0-9]+\.[0-9]+[eE][+-]?+(?![0-9]))
+      | (?P<REAL>[0-9]+\.[0-9]+(?:[eE][+-]?[0-9]+)?)
+      | (?P<INTEGER>[0-9]+)
+      | (?P<STRING>'[^'\n]*'|"[^"\n]*")
+      | (?P<BAD_STRING>['"])
+      | (?P<OPERATOR>:=|<>|<=|>=|\.\.|[-+*/=<>.,;:()\[\]])
+      | (?P<END>\Z)
+      | (?P<ERROR>.)
+    )
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# Правило идентификатора Lexer для проверки раскодированного текста
+_WORD_PATTERN = re.compile(r"[^\W\d]\w*")
+
+
+class ByteLexer(Lexer):
+    # Лексер над байтами UTF-8 (bytes или mmap) без построения str для всего
+    # файла: раскодируются только идентификаторы и строковые литералы.
+    # Смещения токенов задаются в байтах, строки и столбцы — в символах,
+    # как у Lexer. Символы вне ASCII допустимы в идентификаторах, строках
+    # и комментариях; цифры Unicode, в отличие от Lexer, не распознаются
+
+    def __init__(self, source, recover: bool = False):
+        super().__init__(source, recover)
+        self.file = None
+
+    @classmethod
+    def from_file(cls, path) -> "ByteLexer":
+        # Отображает файл в память; закрывается через close() или with
+        file = open(path, "rb")
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Пустой файл нельзя отобразить в память
+            data = b""
+        lexer = cls(data)
+        lexer.file = file
+        return lexer
+
+    def close(self):
+        if isinstance(self.source, mmap.mmap):
+            self.source.close()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self) -> "ByteLexer":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def scan(self, pos: int = 0) -> Iterator[tuple]:
+        source = self.source
+        restart = True
+
+        while restart:
+            restart = False
+            for m in _BYTE_TOKEN_PATTERN.finditer(source, pos):
+                kind = m.lastgroup
+                start = m.start(kind)
+                end = pos = m.end()
+
+                if kind == "IDENTIFIER":
+                    raw = m.group(kind)
+                    text = raw.decode("utf-8")
+                    if not raw.isascii():
+                        word = _WORD_PATTERN.match(text)
+                        if word is None or not (text[0].isalpha() or text[0] == "_"):
+                            self._report(f"Недопустимый символ '{text[0]}'", start)
+                            pos = start + len(text[0].encode("utf-8"))
+                            restart = True
+                            break
+                        if word.end() < len(text):
+                            # Идентификатор обрывается на символе, который
+                            # не может входить в слово: дальше разбор с него
+                            text = word.group()
+                            end = pos = start + len(text.encode("utf-8"))
+                            restart = True
+                    lowered = text.lower()
+                    token_type = _KEYWORD_TYPES.get(lowered)
+                    if token_type is None:
+                        yield TokenType.IDENTIFIER, text, start, end
+                    else:
+                        yield token_type, lowered, start, end
+                    if restart:
+                        break
+
+                elif kind == "OPERATOR":
+                    token_type, text = _BYTE_OPERATORS[m.group(kind)]
+                    yield token_type, text, start, end
+
+                elif kind == "COMMENT":
+                    continue
+
+                elif kind == "INTEGER":
+                    yield TokenType.INT_LITERAL, int(m.group(kind)), start, end
+
+                elif kind == "REAL":
+                    yield TokenType.REAL_LITERAL, float(m.group(kind)), start, end
+
+                elif kind == "STRING":
+                    value = source[start + 1 : end - 1].decode("utf-8")
+                    if source[start] == ord("'") and len(value) == 1:
+                        yield TokenType.CHAR_LITERAL, value, start, end
+                    else:
+                        yield TokenType.STRING_LITERAL, value, start, end
+
+                elif kind == "END":
+                    break
+
+                elif kind == "BAD_EXPONENT":
+                    self._report("Неверный формат экспоненты", end)
+
+                elif kind == "BAD_STRING":
+                    newline = source.find(b"\n", start)
+                    error_pos = len(source) if newline == -1 else newline
+                    self._report("Незавершенный строковый литерал", error_pos)
+                    # Литерал отбрасывается до конца строки
+                    pos = error_pos
+                    restart = True
+                    break
+
+                elif kind == "BAD_COMMENT":
+                    # Комментарий поглощает весь остаток файла
+                    self._report("Незавершенный комментарий", len(source))
+                    break
+
+                else:
+                    # Сюда попадают только байты ASCII
+                    char = chr(source[start])
+                    self._report(f"Недопустимый символ '{char}'", start)
+
+        yield TokenType.EOF, None, len(source), len(source)
+
+
+class IncrementalLexer:
+    # Список токенов редактируемого буфера, который обновляется правками
+    # вместо полного повторного разбора. Лексер не имеет состояния между
+    # токенами и заглядывает вперед не более чем на два символа, поэтому
+    # разбор можно начать с начала токена, стоящего за два токена до правки
+    # (это покрывает и правки внутри многострочных комментариев, которые
+    # всегда лежат между токенами). Разбор останавливается, как только
+    # новый токен начинается там же, где прежний токен за правкой: дальше
+    # исходный код совпадает, и остаток потока лишь сдвигается
+    RESTART_BACKOFF = 2
+
+    def __init__(self, source: str):
+        self.source = source
+        self.index = LineIndex(source)
+        lexer = Lexer(source)
+        lexer.index = self.index
+        self.tokens = lexer.tokenize()
+
+    def edit(self, offset: int, removed: int, inserted: str) -> tuple:
+        # Заменяет removed символов начиная с offset на inserted.
+        # Возвращает (first, old_count, new_count): токены tokens[first :
+        # first + old_count] заменены на new_count новых токенов.
+        # При ошибке LexerError состояние не изменяется
+        if offset < 0 or removed < 0 or offset + removed > len(self.source):
+            raise ValueError("Правка выходит за границы исходного кода")
+
+        tokens = self.tokens
+        source = self.source[:offset] + inserted + self.source[offset + removed :]
+        delta = len(inserted) - removed
+        edit_end = offset + len(inserted)
+
+        # Последний токен, начинающийся не позже правки, и отступ назад от него
+        first = bisect_right(tokens, offset, key=lambda token: token.offset) - 1
+        first -= self.RESTART_BACKOFF
+        if first < 0:
+            first = restart = 0
+        else:
+            restart = tokens[first].offset
+
+        lexer = Lexer(source)
+        lexer.index = LineIndex(source)
+        new_tokens = []
+        old = first
+        for token_type, value, start, _ in lexer.scan(restart):
+            if start >= edit_end:
+                # Поиск прежнего токена с тем же (сдвинутым) началом
+                while old < len(tokens) and tokens[old].offset + delta < start:
+                    old += 1
+                if old < len(tokens) and tokens[old].offset + delta == start:
+                    break
+            new_tokens.append(Token(token_type, value, start, self.index))
+
+        for token in tokens[old:]:
+            token.offset += delta
+        tokens[first:old] = new_tokens
+        self.source = source
+        self.index.reset(source)
+        return first, old - first, len(new_tokens)
+
+
+# Коды типов токенов для компактного хранения
+_TOKEN_TYPES = list(TokenType)
+_TOKEN_TYPE_CODES = {token_type: code for code, token_type in enumerate(_TOKEN_TYPES)}
+
+# Типы, значение которых нельзя восстановить по самому типу
+_TEXT_VALUE_TYPES = frozenset(
+    (
+        TokenType.IDENTIFIER,
+        TokenType.INT_LITERAL,
+        TokenType.REAL_LITERAL,
+        TokenType.STRING_LITERAL,
+        TokenType.CHAR_LITERAL,
+    )
+)
+
+
+class CompactTokens:
+    # Последовательность токенов в виде столбцов array вместо списка
+    # объектов Token: код типа и смещения начала и конца. Значения
+    # идентификаторов и литералов не хранятся, а извлекаются из исходного
+    # кода при обращении; строки интернируются в общей таблице.
+    # Индексация возвращает обычный Token, поэтому Parser принимает
+    # CompactTokens вместо List[Token] без изменений. Источником может быть
+    # и байтовый буфер ByteLexer, пока он не закрыт
+
+    def __init__(self, source, index: LineIndex = None):
+        self.source = source
+        self.index = index if index is not None else LineIndex(source)
+        self.types = array("B")
+        self.starts = array("I")
+        self.ends = array("I")
+        self.strings = {}
+        self.cached_index = -1
+        self.cached_token = None
+
+    def append(self, token_type: TokenType, start: int, end: int):
+        self.types.append(_TOKEN_TYPE_CODES[token_type])
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, index: int) -> Token:
+        if index < 0:
+            index += len(self.types)
+        # Парсер многократно запрашивает текущий токен подряд
+        if index == self.cached_index:
+            return self.cached_token
+        token_type = _TOKEN_TYPES[self.types[index]]
+        token = Token(token_type, self.value(index), self.starts[index], self.index)
+        self.cached_index = index
+        self.cached_token = token
+        return token
+
+    def __iter__(self) -> Iterator[Token]:
+        for index in range(len(self.types)):
+            yield self[index]
+
+    def value(self, index: int):
+        token_type = _TOKEN_TYPES[self.types[index]]
+        if token_type not in _TEXT_VALUE_TYPES:
+            # Ключевые слова и операторы совпадают со значением типа
+            return None if token_type == TokenType.EOF else token_type.value
+        text = self.source[self.starts[index] : self.ends[index]]
+        if not isinstance(text, str):
+            text = text.decode("utf-8")
+        if token_type == TokenType.INT_LITERAL:
+            return int(text)
+        if token_type == TokenType.REAL_LITERAL:
+            return float(text)
+        if token_type != TokenType.IDENTIFIER:
+            text = text[1:-1]
+        return self.strings.setdefault(text, text)
@@ -0,0 +1,385 @@
+"""
+Вынос инвариантов из циклов
+Выражения, значение которых не меняется при выполнении цикла while,
+repeat или for, вычисляются один раз перед циклом во временную переменную
+"""
+
+from typing import Dict, List, Optional
+
+from src.ast_nodes import (
+    Program,
+    Statement,
+    CompoundStatement,
+    AssignmentStatement,
+    IfStatement,
+    WhileStatement,
+    RepeatStatement,
+    ForStatement,
+    CaseStatement,
+    ProcedureCall,
+    Expression,
+    BinaryOp,
+    UnaryOp,
+    Variable,
+    FunctionCall,
+    node_key,
+)
+from src.optimizer import literal_value, statement_children
+from src.semantic import SemanticInfo
+from src.standard import is_pure_builtin
+from src.temporaries import (
+    ALIASED,
+    NO_WRITES,
+    Replacement,
+    TemporaryPass,
+    expression_children,
+    expression_nodes,
+    expression_shape,
+    expression_text,
+    with_children,
+)
+from src.visitor import NodeTransformer, walk
+
+# Префикс имен временных переменных: inv1, inv2 ...
+TEMPORARY_PREFIX = "inv"
+
+
+class LoopInvariantMotion(TemporaryPass):
+    """
+    Выносит из циклов while, repeat и for инвариантные подвыражения:
+    операции, вызовы стандартных функций и чистых пользовательских функций
+    (pure_subprograms, только параметры-значения скалярных типов) и
+    обращения к элементам массивов, если ни одна переменная выражения не
+    изменяется в цикле. Выражение вычисляется перед циклом во временную
+    переменную inv<N>, которая объявляется в той же области видимости.
+
+    Выражение, вычисление которого может прервать программу (div и mod на
+    переменную, индекс массива, вызов пользовательской функции), выносится,
+    только если оно и так вычислялось бы при входе в цикл до какого-либо
+    видимого действия: в условии while, в начале тела repeat или цикла
+    for с известным непустым диапазоном. Остальные инвариантные выражения
+    выносятся из любого места тела. Временные переменные внутренних
+    циклов переносятся и за внешний цикл, если он их не изменяет.
+    Одинаковые по структуре выражения вычисляются в одну переменную: в
+    пределах цикла и в следующих циклах того же списка операторов, пока
+    переменные выражения не изменяются.
+
+    Циклы обрабатываются снизу вверх по явному стеку. hoisted — список
+    вынесенных выражений (область, цикл, выражение, переменная), по одной
+    записи на временную переменную; после hoist() semantics — результат анализа итогового дерева
+    """
+
+    prefix = TEMPORARY_PREFIX
+
+    def __init__(self):
+        super().__init__()
+        self.hoisted: List[tuple] = []
+
+    def hoist(self, program: Program, semantics: Optional[SemanticInfo] = None) -> Program:
+        program = self.run(program, semantics)
+        # Записи удаленных временных переменных (drop) не входят в отчет
+        self.hoisted = [record for record in self.hoisted if record is not None]
+        return program
+
+    def process_body(self, body: CompoundStatement) -> Statement:
+        self.records: Dict[str, int] = {}  # имя -> номер записи в hoisted
+        # Ключ оператора -> (оператор, записи) и ключ группы "присваивания +
+        # цикл" -> группа. Узлы хранятся в таблицах: перестроенный оператор
+        # может выпасть из дерева, и без ссылки на него его id достался бы
+        # новому оператору
+        self.writes: Dict[int, tuple] = {}
+        self.groups: Dict[int, CompoundStatement] = {}
+        self.keys: Dict[tuple, int] = {}  # структура выражения -> номер
+        return self.rewrite(body)
+
+    def rewrite(self, root: Statement) -> Statement:
+        # Перестройка операторов снизу вверх: метод visit_<класс> получает
+        # исходный оператор и перестроенные дочерние операторы
+        results = []
+        work = [root]
+        while work:
+            item = work.pop()
+            if item.__class__ is tuple:
+                stmt, children = item
+                start = len(results) - len(children)
+                rewritten = results[start:]
+                del results[start:]
+                results.append(self.visit(stmt, rewritten))
+            elif item is None:
+                results.append(None)
+            else:
+                children = statement_children(item)
+                work.append((item, children))
+                work.extend(reversed(children))
+        return results[0]
+
+    def statement_writes(self, stmt: Statement, children: list) -> frozenset:
+        writes = set()
+        for child in children:
+            if child is not None:
+                writes.update(self.writes_of(child, NO_WRITES))
+        self.own_writes(stmt, writes)
+        return frozenset(writes)
+
+    def set_writes(self, stmt: Statement, writes: frozenset):
+        self.writes[node_key(stmt)] = (stmt, writes)
+
+    def writes_of(self, stmt: Statement, default=None) -> Optional[frozenset]:
+        entry = self.writes.get(node_key(stmt))
+        return default if entry is None else entry[1]
+
+    # Перестройка операторов: метод возвращает новый оператор и запоминает
+    # его записи
+
+    def generic_visit(self, stmt: Statement, children: list) -> Statement:
+        self.set_writes(stmt, self.statement_writes(stmt, children))
+        return stmt
+
+    def visit_CompoundStatement(self, stmt: CompoundStatement, children: list) -> Statement:
+        statements = []
+        changed = False
+        for child, old in zip(children, stmt.statements):
+            if child is not old:
+                changed = True
+            if self.groups.get(node_key(child)) is child and child is not old:
+                # Группа "присваивания + цикл" встраивается в список
+                statements.extend(child.statements)
+            else:
+                statements.append(child)
+        if changed:
+            statements = self.reuse(statements)
+        new = NodeTransformer.rebuild(stmt, {"statements": statements}) if changed else stmt
+        self.set_writes(new, self.statement_writes(stmt, children))
+        return new
+
+    def visit_IfStatement(self, stmt: IfStatement, children: list) -> Statement:
+        new = with_children(stmt, children)
+        self.set_writes(new, self.statement_writes(stmt, children))
+        return new
+
+    def visit_CaseStatement(self, stmt: CaseStatement, children: list) -> Statement:
+        new = with_children(stmt, children)
+        self.set_writes(new, self.statement_writes(stmt, children))
+        return new
+
+    def visit_WhileStatement(self, stmt: WhileStatement, children: list) -> Statement:
+        return self.hoist_loop(stmt, children, "while")
+
+    def visit_RepeatStatement(self, stmt: RepeatStatement, children: list) -> Statement:
+        return self.hoist_loop(stmt, children, "repeat")
+
+    def visit_ForStatement(self, stmt: ForStatement, children: list) -> Statement:
+        return self.hoist_loop(stmt, children, "for")
+
+    # Вынос инвариантов
+
+    def hoist_loop(self, stmt: Statement, children: list, keyword: str) -> Statement:
+        body = children[0]
+        writes = set(self.statement_writes(stmt, children))
+        loop = with_children(stmt, children)
+
+        replacements = {}  # ключ выражения -> временная переменная
+        shared = {}  # номер структуры -> временная переменная
+        moved = []  # присваивания временным переменным, перенесенные за цикл
+        removed = set()
+        for item, guaranteed in self.candidates(loop, body):
+            if isinstance(item, AssignmentStatement):
+                # Временная переменная внутреннего цикла
+                name = item.variable.name
+                if self.movable(item.expression, writes - {name}, guaranteed):
+                    writes.discard(name)
+                    moved.append(item)
+                    removed.add(node_key(item))
+                    # В отчете — самый внешний цикл, из которого она вынесена
+                    number = self.records[name]
+                    scope_name, _, text, _ = self.hoisted[number]
+                    self.hoisted[number] = (scope_name, keyword, text, name)
+                continue
+            for expr in self.hoistable(item, writes, guaranteed):
+                key = node_key(expr)
+                if key in replacements:
+                    continue
+                # Одинаковые выражения цикла вычисляются в одну переменную
+                number = self.structure(expr)
+                if number in shared:
+                    replacements[key] = Variable(shared[number], position=expr.position)
+                    continue
+                name = shared[number] = self.temporary(self.type_of(expr))
+                replacements[key] = Variable(name, position=expr.position)
+                moved.append(AssignmentStatement(
+                    Variable(name, position=expr.position), expr, position=expr.position))
+                self.records[name] = len(self.hoisted)
+                self.hoisted.append((self.scope.name, keyword, expression_text(expr), name))
+
+        if not moved:
+            self.set_writes(loop, frozenset(writes))
+            return loop
+        loop = Replacement(self, replacements, removed).transform(loop)
+        self.set_writes(loop, frozenset(writes))
+        group = CompoundStatement(moved + [loop], position=stmt.position)
+        group_writes = set(writes)
+        for assignment in moved:
+            group_writes.add(assignment.variable.name)
+        self.set_writes(group, frozenset(group_writes))
+        self.groups[node_key(group)] = group
+        return group
+
+    def reuse(self, statements: list) -> list:
+        # Присваивание временной переменной выражения, которое уже вычислено
+        # в одну из предыдущих в списке, удаляется вместе с переменной, если
+        # переменные выражения с тех пор не изменялись; следующие операторы
+        # читают прежнюю переменную
+        available = {}  # номер структуры -> (временная переменная, переменные выражения)
+        renames = {}  # удаленная временная переменная -> прежняя
+        result = []
+        for stmt in statements:
+            if renames:
+                stmt = self.rename(stmt, renames)
+            number = None
+            if isinstance(stmt, AssignmentStatement) and stmt.variable.name in self.records:
+                number = self.structure(stmt.expression)
+                if number in available:
+                    self.drop(stmt.variable.name, available[number][0])
+                    renames[stmt.variable.name] = available[number][0]
+                    continue
+            writes = self.writes_of(stmt)
+            if writes is None:
+                writes = set()
+                self.own_writes(stmt, writes)
+            if writes:
+                aliased = ALIASED in writes
+                available = {
+                    key: (name, names) for key, (name, names) in available.items()
+                    if name not in writes and not any(
+                        variable in writes or aliased and variable in self.aliased
+                        for variable in names)
+                }
+            if number is not None:
+                names = {node.name for node in expression_nodes(stmt.expression)
+                         if isinstance(node, Variable)}
+                available[number] = (stmt.variable.name, names)
+            result.append(stmt)
+        return result
+
+    def rename(self, stmt: Statement, renames: dict) -> Statement:
+        replacements = {
+            node_key(node): Variable(renames[node.name], position=node.position)
+            for node in walk(stmt)
+            if isinstance(node, Variable) and node.name in renames
+        }
+        if not replacements:
+            return stmt
+        new = Replacement(self, replacements).transform(stmt)
+        self.set_writes(new, self.writes_of(stmt, NO_WRITES))
+        return new
+
+    def drop(self, name: str, target: str):
+        # Временная переменная name больше не нужна: ее значение в target,
+        # и выражение уже записано в hoisted под target
+        del self.temporaries[name]
+        self.declarations = [
+            declaration for declaration in self.declarations if declaration.names != [name]
+        ]
+        self.hoisted[self.records.pop(name)] = None
+
+    def structure(self, expr: Expression) -> int:
+        # Номер выражения: одинаковые по структуре выражения получают один
+        # номер
+        numbers = {}
+        for node in reversed(list(expression_nodes(expr))):
+            children = [numbers[node_key(child)] for child in expression_children(node)]
+            shape = expression_shape(node, children)
+            numbers[node_key(node)] = self.keys.setdefault(shape, len(self.keys))
+        return numbers[node_key(expr)]
+
+    def candidates(self, loop: Statement, body: Statement) -> list:
+        # Выражения и присваивания временным переменным, которые могут
+        # быть вынесены, в порядке выполнения, с признаком "вычисляется при
+        # каждом входе в цикл до видимых действий". Тела вложенных циклов
+        # не просматриваются: их инварианты уже вынесены к ним в начало
+        items = []
+        guaranteed = self.body_guaranteed(loop)
+        if isinstance(loop, WhileStatement):
+            items.append((loop.condition, True))
+        statements = body.statements if isinstance(body, CompoundStatement) else [body]
+        for stmt in statements:
+            work = [stmt]
+            while work:
+                item = work.pop()
+                heads = self.heads(item)
+                # Условие repeat вычисляется после тела
+                certain = (guaranteed and item is stmt
+                           and not isinstance(item, RepeatStatement))
+                items.extend((expr, certain) for expr in heads)
+                if not isinstance(item, (WhileStatement, RepeatStatement, ForStatement)):
+                    work.extend(reversed([
+                        child for child in statement_children(item) if child is not None
+                    ]))
+            if guaranteed and self.interrupts(stmt):
+                guaranteed = False
+        if isinstance(loop, RepeatStatement):
+            items.append((loop.condition, guaranteed))
+        return items
+
+    def body_guaranteed(self, loop: Statement) -> bool:
+        # Выполняется ли тело цикла хотя бы раз
+        if isinstance(loop, RepeatStatement):
+            return True
+        if isinstance(loop, WhileStatement):
+            return literal_value(loop.condition) is True
+        start = literal_value(loop.start_value)
+        end = literal_value(loop.end_value)
+        if start.__class__ is not int or end.__class__ is not int:
+            return False
+        return start >= end if loop.downto else start <= end
+
+    def heads(self, stmt: Statement) -> list:
+        # Присваивание временной переменной переносится целиком
+        if isinstance(stmt, AssignmentStatement) and stmt.variable.name in self.temporaries:
+            return [stmt]
+        return super().heads(stmt)
+
+    def interrupts(self, stmt: Statement) -> bool:
+        # Может ли оператор выполнить видимое действие или передать
+        # управление: ввод-вывод, вызов процедуры, break/continue, вызов
+        # функции с побочными эффектами, вложенный цикл
+        for node in walk(stmt):
+            if isinstance(node, (ProcedureCall, WhileStatement, RepeatStatement, ForStatement)):
+                return True
+            if (isinstance(node, FunctionCall) and not is_pure_builtin(node.name)
+                    and node.name not in self.functions):
+                return True
+        return False
+
+    def movable(self, expr: Expression, writes: set, guaranteed: bool) -> bool:
+        # Можно ли вычислить все выражение перед циклом
+        invariant, traps = self.analyze(expr, writes)[node_key(expr)]
+        return invariant and (guaranteed or not traps)
+
+    def hoistable(self, expr: Expression, writes: set, guaranteed: bool) -> list:
+        # Наибольшие подвыражения expr, которые выносятся из цикла. Поиск
+        # сверху вниз; правый операнд and/or в C++ вычисляется не всегда,
+        # поэтому его вычисление не гарантировано
+        info = self.analyze(expr, writes)
+        hoisted = []
+        work = [(expr, guaranteed)]
+        while work:
+            node, certain = work.pop()
+            invariant, traps = info[node_key(node)]
+            if invariant and (certain or not traps) and self.worth(node):
+                hoisted.append(node)
+                continue
+            if isinstance(node, BinaryOp):
+                work.append((node.right, certain and node.operator not in ("and", "or")))
+                work.append((node.left, certain))
+            elif isinstance(node, UnaryOp):
+                work.append((node.operand, certain))
+            elif isinstance(node, Variable):
+                work.extend((index, certain) for index in reversed(node.indices))
+            elif isinstance(node, FunctionCall):
+                work.extend((argument, certain) for argument in reversed(node.arguments))
+        return hoisted
+
+
+def hoist_invariants(program: Program) -> Program:
+    return LoopInvariantMotion().hoist(program)
@@ -0,0 +1,1047 @@
+"""
+Оптимизация программы по потоку данных
+Распространение констант через скалярные переменные и удаление мертвого
+кода: недостижимых операторов, ветвей и циклов с известным условием и
+присваиваний, значение которых никогда не читается
+"""
+
+import heapq
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from src.ast_nodes import (
+    ASTNode,
+    ArrayType,
+    Program,
+    Statement,
+    CompoundStatement,
+    AssignmentStatement,
+    IfStatement,
+    WhileStatement,
+    RepeatStatement,
+    ForStatement,
+    CaseStatement,
+    ProcedureCall,
+    EmptyStatement,
+    Expression,
+    BinaryOp,
+    UnaryOp,
+    Variable,
+    BooleanLiteral,
+    FunctionCall,
+    node_key,
+)
+from src.folding import LITERAL_CLASSES, NOT_CONSTANT, ConstantFolder, literal
+from src.semantic import Scope, SemanticInfo, Symbol, analyze
+from src.standard import BUILTIN_FUNCTIONS, JUMP_PROCEDURES, READ_PROCEDURES
+from src.visitor import NodeTransformer, NodeVisitor
+
+# Наибольшее число раундов анализа и перестройки дерева. Раунд использует
+# результаты предыдущего (x := 1; y := x + 1; z := y * 2 сворачивается
+# за несколько раундов); оптимизация останавливается, когда раунд ничего
+# не изменил
+MAX_ROUNDS = 8
+
+# Типы переменных, значения которых подставляются вместо обращений к ним,
+# и допустимые классы значений (строки не подставляются: копия литерала
+# не дешевле переменной)
+_CONSTANT_TYPES = {
+    "integer": (int,),
+    "real": (int, float),
+    "boolean": (bool,),
+    "char": (str,),
+}
+
+def _bits(mask: int):
+    # Номера установленных битов маски
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _same(a, b) -> bool:
+    # Равенство значений с учетом класса (в Python 1 == 1.0 == True)
+    return a is b or (a.__class__ is b.__class__ and a == b)
+
+
+def literal_value(expr: Expression):
+    return expr.value if isinstance(expr, LITERAL_CLASSES) else NOT_CONSTANT
+
+
+def empty_range(stmt: ForStatement) -> bool:
+    # Цикл for с известными границами, тело которого не выполнится ни разу
+    start = literal_value(stmt.start_value)
+    end = literal_value(stmt.end_value)
+    if start is NOT_CONSTANT or end is NOT_CONSTANT or start.__class__ is not end.__class__:
+        return False
+    if start.__class__ is not int and start.__class__ is not str:
+        return False
+    return start < end if stmt.downto else start > end
+
+
+def selected_branch(expression: Expression, branches: list) -> Optional[int]:
+    # Номер ветви case при известном значении выражения (len(branches) —
+    # ни одна метка не подошла), None — если ветвь неизвестна
+    value = literal_value(expression)
+    if value is NOT_CONSTANT:
+        return None
+    for number, (values, _) in enumerate(branches):
+        for label in values:
+            label_value = literal_value(label)
+            if label_value is NOT_CONSTANT:
+                return None
+            if _same(label_value, value):
+                return number
+    return len(branches)
+
+
+def has_loop_jump(stmt: Statement) -> bool:
+    # Есть ли в операторе break или continue, относящийся к внешнему циклу
+    work = [stmt]
+    while work:
+        stmt = work.pop()
+        if isinstance(stmt, ProcedureCall):
+            if stmt.name in JUMP_PROCEDURES:
+                return True
+        elif isinstance(stmt, CompoundStatement):
+            work.extend(stmt.statements)
+        elif isinstance(stmt, IfStatement):
+            work.append(stmt.then_statement)
+            if stmt.else_statement is not None:
+                work.append(stmt.else_statement)
+        elif isinstance(stmt, CaseStatement):
+            work.extend(branch_stmt for _, branch_stmt in stmt.branches)
+            if stmt.else_statement is not None:
+                work.append(stmt.else_statement)
+    return False
+
+
+def is_subprogram_call(node: ASTNode, scope: Scope) -> bool:
+    symbol = scope.symbol(node)
+    return symbol is not None and symbol.kind in ("function", "procedure")
+
+
+def has_side_effects(node: ASTNode, scope: Scope) -> bool:
+    # Вызов пользовательской подпрограммы или стандартной функции, которая
+    # не отмечена в реестре как чистая
+    if is_subprogram_call(node, scope):
+        return True
+    builtin = BUILTIN_FUNCTIONS.get(node.name) if isinstance(node, FunctionCall) else None
+    return builtin is not None and not builtin.pure
+
+
+def calls_subprogram(expr: Expression, scope: Scope) -> bool:
+    # Вызывает ли выражение пользовательскую функцию или стандартную
+    # функцию с побочными эффектами
+    work = [expr]
+    while work:
+        expr = work.pop()
+        if isinstance(expr, BinaryOp):
+            work.append(expr.left)
+            work.append(expr.right)
+        elif isinstance(expr, UnaryOp):
+            work.append(expr.operand)
+        elif isinstance(expr, Variable):
+            work.extend(expr.indices)
+        elif isinstance(expr, FunctionCall):
+            if has_side_effects(expr, scope):
+                return True
+            work.extend(expr.arguments)
+    return False
+
+
+def global_effects(program: Program, semantics: SemanticInfo) -> Dict[str, set]:
+    # Глобальные переменные, к которым обращается каждая подпрограмма, в
+    # том числе через вызовы других подпрограмм: имя -> {Symbol}
+    program_scope = semantics.program_scope
+    effects = {}
+    calls = {}
+    for subprogram in program.subprograms:
+        variables = set()
+        called = set()
+        for symbol in semantics.scope(subprogram).references.values():
+            if symbol.scope is program_scope:
+                if symbol.kind == "variable":
+                    variables.add(symbol)
+                else:
+                    called.add(symbol.name)
+        effects[subprogram.name] = variables
+        calls[subprogram.name] = called
+
+    changed = True
+    while changed:
+        changed = False
+        for name, called in calls.items():
+            variables = effects[name]
+            count = len(variables)
+            for callee in called:
+                variables |= effects.get(callee, set())
+            if len(variables) != count:
+                changed = True
+    return effects
+
+
+def reference_parameters(symbol: Symbol) -> List[bool]:
+    # Признак передачи по ссылке для каждого аргумента подпрограммы
+    flags = []
+    for param in symbol.declaration.parameters:
+        flags.extend([param.by_reference] * len(param.names))
+    return flags
+
+
+@dataclass(slots=True, eq=False)
+class Step:
+    # Действие внутри базового блока: присваивание, вызов процедуры или
+    # вычисление условия (заголовка) составного оператора statement.
+    # Множества переменных — битовые маски номеров отслеживаемых символов
+    statement: Statement
+    uses: int = 0  # читаемые переменные
+    substitutable: int = 0  # из них те, вместо которых можно подставить значение
+    kills: int = 0  # переменные, которым шаг точно присваивает значение
+    definitions: List[int] = field(default_factory=list)  # номера определений
+    target: int = 0  # бит переменной присваивания, которое можно удалить;
+                     # -1 — шаг с побочным эффектом
+
+
+@dataclass(slots=True, eq=False)
+class Block:
+    # Базовый блок: шаги выполняются подряд, затем переход в successors
+    number: int
+    steps: List[Step] = field(default_factory=list)
+    successors: List["Block"] = field(default_factory=list)
+
+
+class FlowGraph(NodeVisitor):
+    """
+    Граф потока управления тела программы или подпрограммы и анализ потока
+    данных на нем. Отслеживаются скалярные переменные и параметры-значения
+    самой области видимости: другие подпрограммы изменяют их только через
+    var-аргументы. В основной программе это глобальные переменные; для них
+    передается effects (global_effects), и вызов подпрограммы считается
+    чтением и возможной записью глобальных переменных, к которым она
+    обращается.
+
+    Достигающие определения и живые переменные вычисляются над битовыми
+    масками (int) по списку работ: блок обрабатывается снова, только если
+    изменился результат соседнего. Результат:
+        reached — ключи операторов (node_key), которые могут выполниться;
+        dead — ключи присваиваний, значение которых никогда не читается;
+        constants — для ключа оператора значения переменных, одинаковые на
+            всех путях к нему: {Symbol: значение или NOT_CONSTANT}
+
+    break и continue передают управление по правилам Pascal. Граф строится
+    по явному стеку, поэтому глубина вложенности операторов не ограничена
+    """
+
+    def __init__(self, scope: Scope, effects: Optional[Dict[str, set]] = None):
+        self.scope = scope
+        self.effects = effects
+        self.effect_masks: Dict[str, int] = {}
+        self.symbols: List[Symbol] = [
+            symbol for symbol in scope.symbols.values()
+            if (symbol.kind == "variable"
+                or symbol.kind == "parameter" and not symbol.by_reference)
+            and not isinstance(symbol.type, ArrayType)
+        ]
+        self.tracked: Dict[Symbol, int] = {
+            symbol: index for index, symbol in enumerate(self.symbols)
+        }
+        # Определения: номер переменной и присвоенное значение
+        self.definition_symbols: List[int] = []
+        self.definition_values: list = []
+        self.blocks: List[Block] = []
+        self.loops: List[tuple] = []  # (блок continue, блок выхода)
+        self.reached = set()
+        self.dead = set()
+        self.constants: Dict[int, dict] = {}
+
+    # Построение графа
+
+    def build(self, body: CompoundStatement):
+        self.entry = self.current = self.new_block()
+        work = [body]
+        while work:
+            item = work.pop()
+            if item.__class__ is tuple:
+                item[0](*item[1:])
+            else:
+                self.visit(item, work)
+        self.analyze()
+
+    def new_block(self) -> Block:
+        block = Block(len(self.blocks))
+        self.blocks.append(block)
+        return block
+
+    def start(self, block: Block):
+        self.current = block
+
+    def jump(self, target: Block):
+        self.current.successors.append(target)
+
+    def finish_loop(self, continue_block: Block, exit_block: Block):
+        self.current.successors.append(continue_block)
+        self.loops.pop()
+        self.current = exit_block
+
+    def index(self, var: Variable) -> Optional[int]:
+        # Номер отслеживаемой переменной (обращение без индексов) или None
+        if var.indices:
+            return None
+        symbol = self.scope.symbol(var)
+        return self.tracked.get(symbol) if symbol is not None else None
+
+    def define(self, step: Step, index: int, value, kills: bool):
+        # Определение переменной: kills — точное присваивание, иначе
+        # возможное (var-аргумент, вызов подпрограммы, переменная цикла)
+        allowed = _CONSTANT_TYPES.get(self.symbols[index].type_name, ())
+        if value.__class__ not in allowed or (value.__class__ is str and len(value) != 1):
+            value = NOT_CONSTANT
+        elif value.__class__ is int and allowed[-1] is float:
+            value = float(value)
+        step.definitions.append(len(self.definition_symbols))
+        self.definition_symbols.append(index)
+        self.definition_values.append(value)
+        if kills:
+            step.kills |= 1 << index
+
+    def step(self, statement: Statement, expressions=(), uses: int = 0) -> Step:
+        # Шаг в текущем блоке: вычисление выражений expressions; uses —
+        # переменные, которые шаг читает помимо выражений
+        step = Step(statement)
+        read = 0
+        changed = 0  # переменные, которые могут измениться при вызовах
+        work = list(expressions)
+        while work:
+            expr = work.pop()
+            if isinstance(expr, Variable):
+                index = self.index(expr)
+                if index is not None:
+                    read |= 1 << index
+                work.extend(expr.indices)
+            elif isinstance(expr, BinaryOp):
+                work.append(expr.left)
+                work.append(expr.right)
+            elif isinstance(expr, UnaryOp):
+                work.append(expr.operand)
+            elif isinstance(expr, FunctionCall):
+                changed |= self.call(step, expr, expr.arguments)
+                work.extend(expr.arguments)
+        step.uses |= read | uses
+        step.substitutable = read & ~changed
+        self.current.steps.append(step)
+        return step
+
+    def call(self, step: Step, node: ASTNode, arguments) -> int:
+        # Вызов пользовательской подпрограммы: возможная запись в var-
+        # аргументы, а в основной программе — чтение и запись глобальных
+        # переменных подпрограммы. Возвращает маску изменяемых переменных.
+        # Присваивание с вызовом функции с побочными эффектами не удаляется
+        if not is_subprogram_call(node, self.scope):
+            if has_side_effects(node, self.scope):
+                step.target = -1
+            return 0
+        symbol = self.scope.symbol(node)
+        step.target = -1
+        changed = 0
+        if self.effects is not None:
+            changed = self.effect_masks.get(symbol.name)
+            if changed is None:
+                changed = 0
+                for variable in self.effects.get(symbol.name, ()):
+                    index = self.tracked.get(variable)
+                    if index is not None:
+                        changed |= 1 << index
+                self.effect_masks[symbol.name] = changed
+            step.uses |= changed
+        flags = reference_parameters(symbol)
+        for argument, by_reference in zip(arguments, flags):
+            if by_reference and isinstance(argument, Variable):
+                index = self.index(argument)
+                if index is not None:
+                    changed |= 1 << index
+        for index in _bits(changed):
+            self.define(step, index, NOT_CONSTANT, False)
+        return changed
+
+    def visit_CompoundStatement(self, stmt: CompoundStatement, work: list):
+        work.extend(reversed(stmt.statements))
+
+    def visit_EmptyStatement(self, stmt: EmptyStatement, work: list):
+        pass
+
+    def visit_AssignmentStatement(self, stmt: AssignmentStatement, work: list):
+        target = stmt.variable
+        expression = stmt.expression
+        step = self.step(stmt, (expression, *target.indices))
+        index = self.index(target)
+        if index is not None:
+            self.define(step, index, literal_value(expression), True)
+            if step.target == 0:
+                step.target = 1 << index
+        else:
+            step.target = -1
+
+    def visit_ProcedureCall(self, stmt: ProcedureCall, work: list):
+        if stmt.name in JUMP_PROCEDURES and self.loops:
+            self.step(stmt)
+            continue_block, exit_block = self.loops[-1]
+            self.jump(exit_block if stmt.name == "break" else continue_block)
+            self.current = self.new_block()  # сюда переходов нет
+            return
+
+        if stmt.name in READ_PROCEDURES:
+            # Аргументы read — переменные, которым присваивается значение
+            variables = [arg for arg in stmt.arguments if isinstance(arg, Variable)]
+            step = self.step(stmt, [index for var in variables for index in var.indices])
+            step.target = -1
+            for var in variables:
+                index = self.index(var)
+                if index is not None:
+                    self.define(step, index, NOT_CONSTANT, True)
+                    step.substitutable &= ~(1 << index)
+            return
+
+        step = self.step(stmt, stmt.arguments)
+        step.target = -1
+        step.substitutable &= ~self.call(step, stmt, stmt.arguments)
+
+    def visit_IfStatement(self, stmt: IfStatement, work: list):
+        condition = literal_value(stmt.condition)
+        self.step(stmt, (stmt.condition,))
+        branch = self.current
+        then_block = self.new_block()
+        join = self.new_block()
+        if condition is not False:
+            branch.successors.append(then_block)
+
+        work.append((self.start, join))
+        if stmt.else_statement is not None:
+            else_block = self.new_block()
+            if condition is not True:
+                branch.successors.append(else_block)
+            work.append((self.jump, join))
+            work.append(stmt.else_statement)
+            work.append((self.start, else_block))
+        elif condition is not True:
+            branch.successors.append(join)
+        work.append((self.jump, join))
+        work.append(stmt.then_statement)
+        work.append((self.start, then_block))
+
+    def visit_WhileStatement(self, stmt: WhileStatement, work: list):
+        condition = literal_value(stmt.condition)
+        header = self.new_block()
+        self.jump(header)
+        self.current = header
+        self.step(stmt, (stmt.condition,))
+        body = self.new_block()
+        exit_block = self.new_block()
+        if condition is not False:
+            header.successors.append(body)
+        if condition is not True:
+            header.successors.append(exit_block)
+
+        self.loops.append((header, exit_block))
+        work.append((self.finish_loop, header, exit_block))
+        work.append(stmt.body)
+        work.append((self.start, body))
+
+    def visit_RepeatStatement(self, stmt: RepeatStatement, work: list):
+        body = self.new_block()
+        self.jump(body)
+        self.current = body
+        self.step(stmt)  # достижимость тела, даже если условие недостижимо
+        condition = self.new_block()
+        exit_block = self.new_block()
+
+        self.loops.append((condition, exit_block))
+        work.append((self.finish_repeat, stmt, body, condition, exit_block))
+        work.extend(reversed(stmt.body.statements))
+
+    def finish_repeat(self, stmt: RepeatStatement, body: Block, condition: Block,
+                      exit_block: Block):
+        value = literal_value(stmt.condition)
+        self.jump(condition)
+        self.current = condition
+        self.step(stmt, (stmt.condition,))
+        if value is not True:
+            condition.successors.append(body)
+        if value is not False:
+            condition.successors.append(exit_block)
+        self.loops.pop()
+        self.current = exit_block
+
+    def visit_ForStatement(self, stmt: ForStatement, work: list):
+        # Границы вычисляются один раз перед циклом (CodeGenerator хранит
+        # конец в скрытой переменной). У цикла в C++ своя переменная,
+        # поэтому ее определения — возможные, а не точные
+        symbol = self.scope.symbol(stmt)
+        index = self.tracked.get(symbol) if symbol is not None else None
+        bit = 1 << index if index is not None else 0
+
+        init = self.step(stmt, (stmt.start_value, stmt.end_value))
+        if index is not None:
+            self.define(init, index, NOT_CONSTANT, False)
+        header = self.new_block()
+        self.jump(header)
+        self.current = header
+        self.step(stmt, (), bit)
+
+        body = self.new_block()
+        increment = self.new_block()
+        exit_block = self.new_block()
+        if not empty_range(stmt):
+            header.successors.append(body)
+        header.successors.append(exit_block)
+
+        self.loops.append((increment, exit_block))
+        work.append((self.finish_for, stmt, index, increment, header, exit_block))
+        work.append(stmt.body)
+        work.append((self.start, body))
+
+    def finish_for(self, stmt: ForStatement, index: Optional[int], increment: Block,
+                   header: Block, exit_block: Block):
+        self.jump(increment)
+        self.current = increment
+        if index is not None:
+            step = self.step(stmt, (), 1 << index)
+            self.define(step, index, NOT_CONSTANT, False)
+        self.finish_loop(header, exit_block)
+
+    def visit_CaseStatement(self, stmt: CaseStatement, work: list):
+        branches = stmt.branches
+        selected = selected_branch(stmt.expression, branches)
+        self.step(stmt, (stmt.expression,))
+        branch = self.current
+        join = self.new_block()
+        otherwise = selected is None or selected == len(branches)
+
+        work.append((self.start, join))
+        if stmt.else_statement is not None:
+            else_block = self.new_block()
+            if otherwise:
+                branch.successors.append(else_block)
+            work.append((self.jump, join))
+            work.append(stmt.else_statement)
+            work.append((self.start, else_block))
+        elif otherwise:
+            branch.successors.append(join)
+
+        for number in range(len(branches) - 1, -1, -1):
+            block = self.new_block()
+            if selected is None or selected == number:
+                branch.successors.append(block)
+            work.append((self.jump, join))
+            work.append(branches[number][1])
+            work.append((self.start, block))
+
+    # Анализ потока данных
+
+    def analyze(self):
+        order = self.reverse_postorder()
+        for block in order:
+            for step in block.steps:
+                self.reached.add(node_key(step.statement))
+        self.reaching_definitions(order)
+        self.liveness(order)
+
+    def reverse_postorder(self) -> List[Block]:
+        # Достижимые из входа блоки в обратном порядке обхода в глубину
+        visited = [False] * len(self.blocks)
+        visited[self.entry.number] = True
+        order = []
+        stack = [(self.entry, iter(self.entry.successors))]
+        while stack:
+            block, successors = stack[-1]
+            for successor in successors:
+                if not visited[successor.number]:
+                    visited[successor.number] = True
+                    stack.append((successor, iter(successor.successors)))
+                    break
+            else:
+                stack.pop()
+                order.append(block)
+        order.reverse()
+        return order
+
+    def reaching_definitions(self, order: List[Block]):
+        count = len(self.blocks)
+        # На входе значения всех переменных неизвестны: по одному
+        # определению на переменную
+        entry = 0
+        for index in range(len(self.symbols)):
+            entry |= 1 << len(self.definition_symbols)
+            self.definition_symbols.append(index)
+            self.definition_values.append(NOT_CONSTANT)
+        masks = [0] * len(self.symbols)  # определения каждой переменной
+        for number, index in enumerate(self.definition_symbols):
+            masks[index] |= 1 << number
+
+        predecessors = [[] for _ in range(count)]
+        gen = [0] * count
+        kill = [0] * count
+        for block in order:
+            for successor in block.successors:
+                predecessors[successor.number].append(block.number)
+            generated = killed = 0
+            for step in block.steps:
+                for index in _bits(step.kills):
+                    generated &= ~masks[index]
+                    killed |= masks[index]
+                for number in step.definitions:
+                    generated |= 1 << number
+            gen[block.number] = generated
+            kill[block.number] = killed
+
+        # Список работ — позиции блоков в order, первым берется самый ранний.
+        # Повторно обрабатываются только преемники блоков, у которых
+        # изменился reach_out
+        position = {block.number: i for i, block in enumerate(order)}
+        reach_in = [0] * count
+        reach_out = [0] * count
+        work = list(range(len(order)))
+        queued = [True] * len(order)
+        while work:
+            i = heapq.heappop(work)
+            queued[i] = False
+            block = order[i]
+            number = block.number
+            incoming = entry if block is self.entry else 0
+            for predecessor in predecessors[number]:
+                incoming |= reach_out[predecessor]
+            reach_in[number] = incoming
+            outgoing = gen[number] | (incoming & ~kill[number])
+            if outgoing != reach_out[number]:
+                reach_out[number] = outgoing
+                for successor in block.successors:
+                    j = position[successor.number]
+                    if not queued[j]:
+                        queued[j] = True
+                        heapq.heappush(work, j)
+
+        # Значение переменной в шаге известно, если все достигающие его
+        # определения присваивают одно и то же значение. В операторе с
+        # несколькими шагами (заголовок for) значения должны совпасть во всех
+        values = self.definition_values
+        for block in order:
+            reach = reach_in[block.number]
+            for step in block.steps:
+                if step.uses:
+                    known = self.constants.setdefault(node_key(step.statement), {})
+                    for index in _bits(step.uses):
+                        value = NOT_CONSTANT
+                        if step.substitutable >> index & 1:
+                            for number in _bits(reach & masks[index]):
+                                current = values[number]
+                                if current is NOT_CONSTANT or (
+                                    value is not NOT_CONSTANT and not _same(value, current)
+                                ):
+                                    value = NOT_CONSTANT
+                                    break
+                                value = current
+                        symbol = self.symbols[index]
+                        if symbol in known and not _same(known[symbol], value):
+                            value = NOT_CONSTANT
+                        known[symbol] = value
+                for index in _bits(step.kills):
+                    reach &= ~masks[index]
+                for number in step.definitions:
+                    reach |= 1 << number
+
+    def liveness(self, order: List[Block]):
+        # Живые переменные; присваивание мертвой переменной считается
+        # удаленным и не делает живыми переменные своего выражения, поэтому
+        # цепочки присваиваний (x := 1; y := x) удаляются за один раунд
+        # Список работ в обратном порядке: при изменении live_in блока
+        # повторно обрабатываются только его предшественники
+        backward = order[::-1]
+        position = {block.number: i for i, block in enumerate(backward)}
+        predecessors = [[] for _ in range(len(self.blocks))]
+        for block in order:
+            for successor in block.successors:
+                predecessors[successor.number].append(position[block.number])
+        live_in = [0] * len(self.blocks)
+        work = list(range(len(backward)))
+        queued = [True] * len(backward)
+        while work:
+            i = heapq.heappop(work)
+            queued[i] = False
+            block = backward[i]
+            live = 0
+            for successor in block.successors:
+                live |= live_in[successor.number]
+            for step in reversed(block.steps):
+                if step.target > 0 and not live & step.target:
+                    continue
+                live = (live & ~step.kills) | step.uses
+            if live != live_in[block.number]:
+                live_in[block.number] = live
+                for j in predecessors[block.number]:
+                    if not queued[j]:
+                        queued[j] = True
+                        heapq.heappush(work, j)
+
+        for block in order:
+            live = 0
+            for successor in block.successors:
+                live |= live_in[successor.number]
+            for step in reversed(block.steps):
+                if step.target > 0 and not live & step.target:
+                    self.dead.add(node_key(step.statement))
+                    continue
+                live = (live & ~step.kills) | step.uses
+
+
+class Substitution(NodeTransformer):
+    # Заменяет обращения к переменным с известным значением литералами
+    def __init__(self, scope: Scope, constants: dict):
+        self.scope = scope
+        self.constants = constants
+        self.count = 0
+
+    def visit_Variable(self, expr: Variable) -> Expression:
+        if expr.indices:
+            return expr
+        value = self.constants.get(self.scope.symbol(expr), NOT_CONSTANT)
+        if value is NOT_CONSTANT:
+            return expr
+        self.count += 1
+        return literal(value, expr)
+
+
+class Optimizer(NodeVisitor):
+    """
+    Оптимизация программы раундами: свертка констант, затем в каждом раунде
+    семантический анализ, построение FlowGraph для основной программы и
+    каждой подпрограммы и перестройка их тел:
+        - вместо переменной с известным значением подставляется литерал,
+          выражение сворачивается (ConstantFolder);
+        - if, case, while, repeat и for с известным условием или пустым
+          диапазоном заменяются выполняемой ветвью или удаляются;
+        - удаляются недостижимые операторы (после break, continue,
+          бесконечного цикла) и присваивания, значение которых не читается.
+
+    Присваивания и условия с вызовами пользовательских функций не
+    удаляются. Если в программе есть семантические ошибки, она не
+    изменяется. После optimize() semantics — результат анализа итогового
+    дерева (или None, если раунды исчерпаны на изменениях)
+    """
+
+    def __init__(self):
+        self.folder = ConstantFolder()
+        self.propagated = 0  # подставленные значения переменных
+        self.pruned = 0  # ветви и циклы с известным условием
+        self.unreachable = 0  # удаленные недостижимые операторы
+        self.removed = 0  # удаленные мертвые присваивания и пустые операторы
+        self.semantics: Optional[SemanticInfo] = None
+
+    @property
+    def changes(self) -> int:
+        return self.propagated + self.pruned + self.unreachable + self.removed
+
+    def optimize(self, program: Program) -> Program:
+        program = self.folder.transform(program)
+        dirty = None  # подпрограммы, измененные в прошлом раунде (None — все)
+        for _ in range(MAX_ROUNDS):
+            self.semantics = analyze(program)
+            if self.semantics.errors:
+                return program
+            changes = self.changes
+            optimized, dirty = self.optimize_program(program, dirty)
+            if self.changes == changes:
+                return program
+            program = optimized
+        self.semantics = None
+        return program
+
+    def optimize_program(self, program: Program, dirty: Optional[set]) -> tuple:
+        # Анализ тела подпрограммы зависит только от него самого, поэтому
+        # тело, не изменившееся в прошлом раунде, повторно не обрабатывается.
+        # Возвращает новую программу и номера измененных тел
+        changed = set()
+        subprograms = []
+        for number, subprogram in enumerate(program.subprograms):
+            if dirty is not None and number not in dirty:
+                subprograms.append(subprogram)
+                continue
+            changes = self.changes
+            body = self.optimize_body(subprogram.body, self.semantics.scope(subprogram))
+            if self.changes != changes:
+                changed.add(number)
+                subprogram = NodeTransformer.rebuild(subprogram, {"body": body})
+            subprograms.append(subprogram)
+
+        body = program.body
+        if dirty is None or dirty:
+            # Тело программы (номер -1) зависит еще и от обращений
+            # подпрограмм к глобальным переменным
+            changes = self.changes
+            effects = global_effects(program, self.semantics)
+            body = self.optimize_body(body, self.semantics.scope(), effects)
+            if self.changes != changes:
+                changed.add(-1)
+        optimized = NodeTransformer.rebuild(
+            program, {"subprograms": subprograms, "body": body})
+        return optimized, changed
+
+    def optimize_body(self, body: CompoundStatement, scope: Scope,
+                      effects: Optional[Dict[str, set]] = None) -> CompoundStatement:
+        self.scope = scope
+        self.graph = FlowGraph(scope, effects)
+        self.graph.build(body)
+        result = self.rewrite(body)
+        if result is None:
+            result = CompoundStatement([], position=body.position)
+        return result
+
+    def rewrite(self, root: Statement) -> Optional[Statement]:
+        # Перестройка операторов снизу вверх по явному стеку: метод
+        # visit_<класс> получает оператор, перестроенные дочерние операторы
+        # (None — удаленный) и признак их изменения
+        results = []
+        work = [root]
+        while work:
+            item = work.pop()
+            if item.__class__ is tuple:
+                stmt, children = item
+                start = len(results) - len(children)
+                rewritten = results[start:]
+                del results[start:]
+                changed = False
+                for new, old in zip(rewritten, children):
+                    if new is not old:
+                        changed = True
+                        break
+                results.append(self.visit(stmt, rewritten, changed))
+            elif item is None:
+                results.append(None)
+            else:
+                children = statement_children(item)
+                work.append((item, children))
+                work.extend(reversed(children))
+        return results[0]
+
+    def reached(self, stmt: Statement) -> bool:
+        if node_key(stmt) in self.graph.reached:
+            return True
+        self.unreachable += 1
+        return False
+
+    def constants(self, stmt: Statement) -> dict:
+        known = self.graph.constants.get(node_key(stmt))
+        if not known:
+            return {}
+        return {symbol: value for symbol, value in known.items() if value is not NOT_CONSTANT}
+
+    def substitute(self, expr: Expression, constants: dict) -> Expression:
+        if not constants:
+            return expr
+        substitution = Substitution(self.scope, constants)
+        result = substitution.transform(expr)
+        if substitution.count:
+            self.propagated += substitution.count
+            result = self.folder.transform(result)
+        return result
+
+    def substitute_indices(self, var: Variable, constants: dict) -> Variable:
+        # Подстановка только в индексы: сама переменная остается
+        # (присваивание, read, var-аргумент)
+        indices = var.indices
+        if not indices or not constants:
+            return var
+        rewritten = [self.substitute(index, constants) for index in indices]
+        for new, old in zip(rewritten, indices):
+            if new is not old:
+                if isinstance(indices, tuple):
+                    rewritten = tuple(rewritten)
+                return NodeTransformer.rebuild(var, {"indices": rewritten})
+        return var
+
+    def generic_visit(self, stmt: Statement, children: list, changed: bool):
+        return stmt if self.reached(stmt) else None
+
+    def visit_EmptyStatement(self, stmt: EmptyStatement, children: list, changed: bool):
+        return stmt
+
+    def visit_CompoundStatement(self, stmt: CompoundStatement, children: list,
+                                changed: bool):
+        if not changed:
+            return stmt
+        statements = [child for child in children if child is not None]
+        if not statements:
+            return None
+        return NodeTransformer.rebuild(stmt, {"statements": statements})
+
+    def visit_AssignmentStatement(self, stmt: AssignmentStatement, children: list,
+                                  changed: bool):
+        if not self.reached(stmt):
+            return None
+        if node_key(stmt) in self.graph.dead:
+            self.removed += 1
+            return None
+        constants = self.constants(stmt)
+        if not constants:
+            return stmt
+        variable = stmt.variable
+        expression = stmt.expression
+        new_variable = self.substitute_indices(variable, constants)
+        new_expression = self.substitute(expression, constants)
+        if new_variable is variable and new_expression is expression:
+            return stmt
+        return NodeTransformer.rebuild(
+            stmt, {"variable": new_variable, "expression": new_expression})
+
+    def visit_ProcedureCall(self, stmt: ProcedureCall, children: list, changed: bool):
+        if not self.reached(stmt):
+            return None
+        constants = self.constants(stmt)
+        if not constants:
+            return stmt
+
+        arguments = stmt.arguments
+        if stmt.name in READ_PROCEDURES:
+            flags = [True] * len(arguments)
+        elif is_subprogram_call(stmt, self.scope):
+            flags = reference_parameters(self.scope.symbol(stmt))
+        else:
+            flags = ()
+        rewritten = []
+        for number, argument in enumerate(arguments):
+            if number < len(flags) and flags[number] and isinstance(argument, Variable):
+                rewritten.append(self.substitute_indices(argument, constants))
+            else:
+                rewritten.append(self.substitute(argument, constants))
+        for new, old in zip(rewritten, arguments):
+            if new is not old:
+                return NodeTransformer.rebuild(stmt, {"arguments": rewritten})
+        return stmt
+
+    def visit_IfStatement(self, stmt: IfStatement, children: list, changed: bool):
+        if not self.reached(stmt):
+            return None
+        then_stmt, else_stmt = children
+        condition = stmt.condition
+        new_condition = self.substitute(condition, self.constants(stmt))
+        if isinstance(new_condition, BooleanLiteral):
+            self.pruned += 1
+            return then_stmt if new_condition.value else else_stmt
+        # Вызовы ищутся в исходном условии: у перестроенных узлов нет
+        # записей в таблицах семантического анализа
+        if then_stmt is None and else_stmt is None and not calls_subprogram(
+            condition, self.scope
+        ):
+            self.removed += 1
+            return None
+        if new_condition is condition and not changed:
+            return stmt
+        return NodeTransformer.rebuild(stmt, {
+            "condition": new_condition,
+            "then_statement": then_stmt if then_stmt is not None else EmptyStatement(),
+            "else_statement": else_stmt,
+        })
+
+    def visit_WhileStatement(self, stmt: WhileStatement, children: list, changed: bool):
+        if not self.reached(stmt):
+            return None
+        condition = stmt.condition
+        new_condition = self.substitute(condition, self.constants(stmt))
+        if isinstance(new_condition, BooleanLiteral) and not new_condition.value:
+            self.pruned += 1
+            return None
+        if new_condition is condition and not changed:
+            return stmt
+        body = children[0]
+        return NodeTransformer.rebuild(stmt, {
+            "condition": new_condition,
+            "body": body if body is not None else EmptyStatement(),
+        })
+
+    def visit_RepeatStatement(self, stmt: RepeatStatement, children: list, changed: bool):
+        if not self.reached(stmt):
+            return None
+        body = children[0]
+        if body is None:
+            body = CompoundStatement([], position=stmt.body.position)
+        condition = stmt.condition
+        new_condition = self.substitute(condition, self.constants(stmt))
+        if (isinstance(new_condition, BooleanLiteral) and new_condition.value
+                and not has_loop_jump(body)):
+            # Тело выполняется ровно один раз
+            self.pruned += 1
+            return body if body.statements else None
+        if new_condition is condition and not changed:
+            return stmt
+        return NodeTransformer.rebuild(stmt, {"condition": new_condition, "body": body})
+
+    def visit_ForStatement(self, stmt: ForStatement, children: list, changed: bool):
+        if not self.reached(stmt):
+            return None
+        constants = self.constants(stmt)
+        start_value = stmt.start_value
+        end_value = stmt.end_value
+        new_start = self.substitute(start_value, constants)
+        new_end = self.substitute(end_value, constants)
+        if new_start is start_value and new_end is end_value and not changed:
+            if not empty_range(stmt):
+                return stmt
+        body = children[0]
+        new = NodeTransformer.rebuild(stmt, {
+            "start_value": new_start,
+            "end_value": new_end,
+            "body": body if body is not None else EmptyStatement(),
+        })
+        if empty_range(new):
+            self.pruned += 1
+            return None
+        return new
+
+    def visit_CaseStatement(self, stmt: CaseStatement, children: list, changed: bool):
+        if not self.reached(stmt):
+            return None
+        branches = stmt.branches
+        expression = stmt.expression
+        new_expression = self.substitute(expression, self.constants(stmt))
+        selected = selected_branch(new_expression, branches)
+        if selected is not None:
+            # Ветвь с break в C++ выходила бы из switch, а не из цикла,
+            # поэтому такой case остается
+            chosen = children[selected] if selected < len(children) else None
+            original = (branches[selected][1] if selected < len(branches)
+                        else stmt.else_statement)
+            if original is None or not has_loop_jump(original):
+                self.pruned += 1
+                return chosen
+        if new_expression is expression and not changed:
+            return stmt
+        new_branches = [
+            (values, child if child is not None else EmptyStatement())
+            for (values, _), child in zip(branches, children)
+        ]
+        else_stmt = children[-1] if stmt.else_statement is not None else None
+        return NodeTransformer.rebuild(stmt, {
+            "expression": new_expression,
+            "branches": new_branches,
+            "else_statement": else_stmt,
+        })
+
+
+def statement_children(stmt: Statement) -> list:
+    # Дочерние операторы в порядке полей; отсутствующая ветвь else — None
+    if isinstance(stmt, CompoundStatement):
+        return list(stmt.statements)
+    if isinstance(stmt, IfStatement):
+        return [stmt.then_statement, stmt.else_statement]
+    if isinstance(stmt, (WhileStatement, RepeatStatement, ForStatement)):
+        return [stmt.body]
+    if isinstance(stmt, CaseStatement):
+        children = [branch_stmt for _, branch_stmt in stmt.branches]
+        if stmt.else_statement is not None:
+            children.append(stmt.else_statement)
+        return children
+    return []
+
+
+def optimize(program: Program) -> Program:
+    return Optimizer().optimize(program)
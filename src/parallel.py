@@ -0,0 +1,163 @@
+"""
+Параллельный синтаксический анализ
+Подпрограммы разбираются одновременно в пуле процессов
+"""
+
+import math
+import os
+import pickle
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+
+from src.ast_nodes import Program, Subprogram
+from src.lexer import Lexer, LexerError, Token, TokenType
+from src.parser import Parser, ParserError
+
+# Меньше подпрограмм разбирается последовательно: запуск пула дороже
+MIN_PARALLEL_SUBPROGRAMS = 16
+
+# Число порций на процесс: мелкие порции выравнивают загрузку
+CHUNKS_PER_WORKER = 4
+
+# Ключевые слова, задающие границы подпрограмм и блоков. Комментарии и
+# строки распознаются так же, как в Lexer, и пропускаются целиком
+_STRUCTURE_PATTERN = re.compile(
+    r"""
+        \{[^}]*\}|\(\*.*?\*\)|//[^\n]*
+      | '[^'\n]*'|"[^"\n]*"
+      | (?<!\w)(?P<KEYWORD>begin|case|end|procedure|function)(?!\w)
+    """,
+    re.VERBOSE | re.DOTALL | re.IGNORECASE,
+)
+
+
+def find_subprogram_spans(source: str) -> Optional[tuple]:
+    """
+    Дешевый предварительный просмотр без лексического анализа: по ключевым
+    словам begin/case/end/procedure/function находит начала подпрограмм и
+    основного блока программы
+
+    Returns:
+        (starts, main_start) — смещения заголовков подпрограмм и begin
+        основного блока, или None, если структуру определить не удалось
+    """
+    starts = []
+    depth = 0
+    in_subprogram = False
+
+    for m in _STRUCTURE_PATTERN.finditer(source):
+        keyword = m.group("KEYWORD")
+        if keyword is None:
+            continue
+        keyword = keyword.lower()
+
+        if keyword == "procedure" or keyword == "function":
+            if depth:
+                return None
+            starts.append(m.start())
+            in_subprogram = True
+
+        elif keyword == "end":
+            depth -= 1
+            if depth < 0:
+                return None
+            if depth == 0:
+                in_subprogram = False
+
+        else:
+            # begin вне подпрограммы открывает основной блок
+            if depth == 0 and not in_subprogram:
+                return (starts, m.start()) if keyword == "begin" else None
+            depth += 1
+
+    return None
+
+
+def lex_range(source: str, start: int, end: int) -> List[Token]:
+    # Токены, начинающиеся в [start, end), и EOF на позиции end.
+    # Позиции в сообщениях об ошибках — относительно всего файла
+    lexer = Lexer(source)
+    tokens = []
+    for token_type, value, offset, _ in lexer.scan(start):
+        if offset >= end:
+            break
+        tokens.append(Token(token_type, value, offset, lexer.index))
+    tokens.append(Token(TokenType.EOF, None, end, lexer.index))
+    return tokens
+
+
+# Исходный код в процессах пула (передается один раз при запуске)
+_worker_source = None
+
+
+def _init_worker(source: str):
+    global _worker_source
+    _worker_source = source
+
+
+def _parse_chunk(spans: List[tuple]) -> Optional[List[Subprogram]]:
+    # Разбор порции подпрограмм в процессе пула. Каждый отрезок должен
+    # разбираться ровно в одну подпрограмму; иначе (или при ошибке)
+    # возвращается None, и файл разбирается последовательно
+    subprograms = []
+    try:
+        for start, end in spans:
+            parser = Parser(lex_range(_worker_source, start, end))
+            subprograms.append(parser.parse_subprogram())
+            if parser.current_token().type is not TokenType.EOF:
+                return None
+    except (LexerError, ParserError):
+        return None
+    return subprograms
+
+
+def parse_serial(source: str) -> Program:
+    return Parser(Lexer(source).tokenize()).parse()
+
+
+def parse_parallel(source: str, workers: Optional[int] = None) -> Program:
+    """
+    Строит AST, разбирая подпрограммы параллельно в пуле процессов.
+    Пока процессы разбирают подпрограммы, основной процесс разбирает
+    заголовок, раздел переменных и основной блок. Результат совпадает с
+    последовательным разбором; при любой ошибке файл разбирается
+    последовательно, чтобы сообщение об ошибке было тем же
+
+    Args:
+        source: Исходный код Pascal
+        workers: Число процессов (по умолчанию — число процессоров)
+    """
+    layout = find_subprogram_spans(source)
+    if layout is None or len(layout[0]) < MIN_PARALLEL_SUBPROGRAMS:
+        return parse_serial(source)
+
+    starts, main_start = layout
+    bounds = starts + [main_start]
+    spans = list(zip(bounds, bounds[1:]))
+
+    workers = workers or os.cpu_count() or 1
+    size = math.ceil(len(spans) / (workers * CHUNKS_PER_WORKER))
+    chunks = [spans[i : i + size] for i in range(0, len(spans), size)]
+
+    try:
+        with ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(source,)
+        ) as pool:
+            results = pool.map(_parse_chunk, chunks)
+
+            # Программа без подпрограмм: заголовок и основной блок
+            tokens = lex_range(source, 0, starts[0])[:-1]
+            tokens.extend(lex_range(source, main_start, len(source)))
+            program = Parser(tokens).parse()
+
+            for subprograms in results:
+                if subprograms is None:
+                    return parse_serial(source)
+                program.subprograms.extend(subprograms)
+
+    except (LexerError, ParserError, BrokenProcessPool, pickle.PicklingError, RecursionError):
+        return parse_serial(source)
+
+    return program
@@ -3,9 +3,133 @@
 Строит AST дерево из последовательности токенов
 """
 
-from typing import List, Optional
-from src.lexer import Token, TokenType, Lexer
+import hashlib
+from collections import deque
+from typing import Iterable, List, Optional, Sequence
+from src.lexer import IncrementalLexer, Token, TokenType, Lexer
 from src.ast_nodes import *
+from src.visitor import walk
+
+
+# Сила связывания бинарных операций: сравнения < аддитивные < мультипликативные
+RELATION_POWER = 1
+ADDITIVE_POWER = 2
+MULTIPLICATIVE_POWER = 3
+
+# Порог выше любой бинарной операции: разбирается только множитель
+FACTOR_POWER = 4
+
+BINARY_POWERS = {
+    TokenType.EQUAL: RELATION_POWER,
+    TokenType.NOT_EQUAL: RELATION_POWER,
+    TokenType.LESS: RELATION_POWER,
+    TokenType.LESS_EQUAL: RELATION_POWER,
+    TokenType.GREATER: RELATION_POWER,
+    TokenType.GREATER_EQUAL: RELATION_POWER,
+    TokenType.PLUS: ADDITIVE_POWER,
+    TokenType.MINUS: ADDITIVE_POWER,
+    TokenType.OR: ADDITIVE_POWER,
+    TokenType.XOR: ADDITIVE_POWER,
+    TokenType.MULTIPLY: MULTIPLICATIVE_POWER,
+    TokenType.DIVIDE: MULTIPLICATIVE_POWER,
+    TokenType.DIV: MULTIPLICATIVE_POWER,
+    TokenType.MOD: MULTIPLICATIVE_POWER,
+    TokenType.AND: MULTIPLICATIVE_POWER,
+}
+
+SIGN_TOKENS = frozenset((TokenType.PLUS, TokenType.MINUS))
+
+# Стандартные функции — ключевые слова, но в выражении разбираются как
+# вызовы по имени, так же как пользовательские функции
+FUNCTION_TOKENS = frozenset(
+    (
+        TokenType.ABS,
+        TokenType.SQR,
+        TokenType.SQRT,
+        TokenType.SIN,
+        TokenType.COS,
+        TokenType.LN,
+        TokenType.EXP,
+        TokenType.LENGTH,
+    )
+)
+
+CASE_BRANCH_END = frozenset((TokenType.END, TokenType.ELSE))
+
+# Кадры стека разбора выражений (незавершенные конструкции):
+# (вид, порог, смещение начала, данные конструкции...)
+SIGN_FRAME, NOT_FRAME, PAREN_FRAME, INDEX_FRAME, CALL_FRAME, BINARY_FRAME = range(6)
+
+# Точки синхронизации при восстановлении после ошибки (panic mode)
+SECTION_STARTS = frozenset((TokenType.PROCEDURE, TokenType.FUNCTION, TokenType.EOF))
+
+HEADER_SYNC = SECTION_STARTS | {TokenType.VAR, TokenType.BEGIN}
+
+DECLARATION_SYNC = SECTION_STARTS | {TokenType.SEMICOLON, TokenType.BEGIN}
+
+STATEMENT_SYNC = SECTION_STARTS | {
+    TokenType.SEMICOLON,
+    TokenType.END,
+    TokenType.ELSE,
+    TokenType.UNTIL,
+}
+
+# Токены, открывающие блок, который закрывается end
+BLOCK_OPENERS = frozenset((TokenType.BEGIN, TokenType.CASE))
+
+LITERAL_NODES = {
+    TokenType.INT_LITERAL: IntegerLiteral,
+    TokenType.REAL_LITERAL: RealLiteral,
+    TokenType.STRING_LITERAL: StringLiteral,
+    TokenType.CHAR_LITERAL: CharLiteral,
+}
+
+
+def subprogram_span_end(tokens: List[Token], start: int) -> Optional[int]:
+    # Предварительный просмотр без разбора: конец подпрограммы, которая
+    # начинается с tokens[start], — индекс за ';' после end, закрывающего
+    # ее тело. None, если границу найти не удалось
+    depth = 0
+    for i in range(start + 1, len(tokens)):
+        token_type = tokens[i].type
+        if token_type in BLOCK_OPENERS:
+            depth += 1
+        elif token_type is TokenType.END:
+            depth -= 1
+            if depth == 0:
+                if i + 1 < len(tokens) and tokens[i + 1].type is TokenType.SEMICOLON:
+                    return i + 2
+                return None
+            if depth < 0:
+                return None
+        elif token_type in SECTION_STARTS:
+            return None
+    return None
+
+
+def span_fingerprint(
+    tokens: List[Token], start: int, end: int, offsets: bool = False
+) -> bytes:
+    # Отпечаток содержимого tokens[start:end] (типы и значения токенов,
+    # без позиций): совпадает у отрезков, которые разбираются одинаково.
+    # С offsets учитываются и смещения токенов от начала отрезка — для
+    # узлов с положениями важно и расположение текста
+    content = [(tokens[i].type.name, tokens[i].value) for i in range(start, end)]
+    if offsets:
+        base = tokens[start].offset
+        content.append([tokens[i].offset - base for i in range(start, end)])
+    content = repr(content)
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+
+def shift_positions(node: ASTNode, delta: int):
+    # Сдвигает на месте положения узла и всех его потомков на delta
+    # символов (переиспользованный узел после правки текста перед ним)
+    if delta:
+        shift = (delta << 32) + delta  # delta может быть отрицательным
+        for item in walk(node):
+            if item.position >= 0:
+                item.position += shift
 
 
 class ParserError(Exception):
@@ -16,14 +140,40 @@ class ParserError(Exception):
 
 
 class Parser:
-    def __init__(self, tokens: List[Token]):
+    def __init__(
+        self,
+        tokens: List[Token],
+        recover: bool = False,
+        nodes=OBJECT_NODES,
+        positions: bool = False,
+    ):
         self.tokens = tokens
         self.pos = 0
+        self.last = len(tokens) - 1
+        self.init_recovery(recover)
+        self.init_nodes(nodes, positions)
+
+    def init_nodes(self, nodes, positions: bool = False):
+        # Узлы создаются через nodes: по умолчанию это классы узлов, а
+        # ASTArena.builder() строит дерево прямо в арену. С positions
+        # операторам, выражениям и подпрограммам записывается положение
+        # в исходном коде (span)
+        self.nodes = nodes
+        self.positions = positions
+        self.literal_nodes = {
+            token_type: getattr(nodes, cls.__name__)
+            for token_type, cls in LITERAL_NODES.items()
+        }
+
+    def init_recovery(self, recover: bool):
+        # С восстановлением ошибки не прерывают разбор, а собираются в
+        # errors; разбор продолжается с ближайшей точки синхронизации
+        self.errors: Optional[List[ParserError]] = [] if recover else None
+        self.recovery_pos = -1
 
     def current_token(self) -> Token:
-        if self.pos < len(self.tokens):
-            return self.tokens[self.pos]
-        return self.tokens[-1]
+        # advance() не уходит дальше последнего токена (EOF)
+        return self.tokens[self.pos]
 
     def peek_token(self, offset: int = 1) -> Token:
         pos = self.pos + offset
@@ -31,10 +181,20 @@ class Parser:
             return self.tokens[pos]
         return self.tokens[-1]
 
+    def previous_token(self) -> Token:
+        # Последний прочитанный токен
+        return self.tokens[self.pos - 1 if self.pos else 0]
+
     def advance(self):
-        if self.pos < len(self.tokens) - 1:
+        if self.pos < self.last:
             self.pos += 1
 
+    def locate(self, node, start: int):
+        # Положение готового узла: от смещения start до последнего
+        # прочитанного токена
+        self.nodes.locate(node, start, self.previous_token().offset)
+        return node
+
     def expect(self, token_type: TokenType) -> Token:
         token = self.current_token()
         if token.type != token_type:
@@ -47,14 +207,41 @@ class Parser:
     def match(self, *token_types: TokenType) -> bool:
         return self.current_token().type in token_types
 
+    def recover(self, error: ParserError, sync: frozenset):
+        # Panic mode: ошибка запоминается, токены пропускаются до первого
+        # из sync. Без восстановления ошибка просто пробрасывается
+        if self.errors is None:
+            raise error
+
+        # Ошибка, уже обработанная на более глубоком уровне и проброшенная
+        # выше, повторно не записывается
+        if not self.errors or self.errors[-1] is not error:
+            # Вторая ошибка на том же токене не записывается
+            if not self.errors or self.errors[-1].token.offset != error.token.offset:
+                self.errors.append(error)
+
+            # Новая ошибка на месте прошлой синхронизации: токен
+            # пропускается, иначе разбор зациклится
+            if self.pos == self.recovery_pos:
+                self.advance()
+
+        while self.current_token().type not in sync:
+            self.advance()
+        self.recovery_pos = self.pos
+
     def parse(self) -> Program:
         return self.parse_program()
 
     def parse_program(self) -> Program:
-        self.expect(TokenType.PROGRAM)
-        name_token = self.expect(TokenType.IDENTIFIER)
-        name = name_token.value
-        self.expect(TokenType.SEMICOLON)
+        start = self.current_token().offset
+        name = None
+        try:
+            self.expect(TokenType.PROGRAM)
+            name_token = self.expect(TokenType.IDENTIFIER)
+            name = name_token.value
+            self.expect(TokenType.SEMICOLON)
+        except ParserError as error:
+            self.recover(error, HEADER_SYNC)
 
         variables = []
         subprograms = []
@@ -65,21 +252,35 @@ class Parser:
 
         # Раздел подпрограмм
         while self.match(TokenType.PROCEDURE, TokenType.FUNCTION):
-            subprograms.append(self.parse_subprogram())
+            try:
+                subprograms.append(self.parse_subprogram())
+            except ParserError as error:
+                self.recover(error, SECTION_STARTS)
 
         # Основной блок
-        body = self.parse_compound_statement()
-        self.expect(TokenType.DOT)
+        body = self.nodes.CompoundStatement([])
+        try:
+            body = self.parse_compound_statement()
+            self.expect(TokenType.DOT)
+        except ParserError as error:
+            self.recover(error, frozenset((TokenType.EOF,)))
 
-        return Program(name, variables, subprograms, body)
+        program = self.nodes.Program(name, variables, subprograms, body)
+        return self.locate(program, start) if self.positions else program
 
     def parse_var_section(self) -> List[VarDeclaration]:
         self.expect(TokenType.VAR)
         variables = []
 
         while self.match(TokenType.IDENTIFIER):
-            variables.append(self.parse_var_declaration())
-            self.expect(TokenType.SEMICOLON)
+            try:
+                variables.append(self.parse_var_declaration())
+                self.expect(TokenType.SEMICOLON)
+            except ParserError as error:
+                self.recover(error, DECLARATION_SYNC)
+                if not self.match(TokenType.SEMICOLON):
+                    break
+                self.advance()
 
         return variables
 
@@ -93,7 +294,7 @@ class Parser:
         self.expect(TokenType.COLON)
         var_type = self.parse_type()
 
-        return VarDeclaration(names, var_type)
+        return self.nodes.VarDeclaration(names, var_type)
 
     def parse_type(self) -> Type:
         if self.match(TokenType.ARRAY):
@@ -108,7 +309,7 @@ class Parser:
         ):
             type_name = self.current_token().value
             self.advance()
-            return Type(type_name)
+            return self.nodes.Type(type_name)
 
         raise ParserError("Ожидается тип данных", self.current_token())
 
@@ -128,7 +329,7 @@ class Parser:
 
         element_type = self.parse_type()
 
-        array_type = ArrayType("array", element_type, dimensions)
+        array_type = self.nodes.ArrayType("array", element_type, dimensions)
         return array_type
 
     def parse_range(self) -> tuple:
@@ -147,14 +348,19 @@ class Parser:
         )
 
     def parse_procedure(self) -> Procedure:
-        self.expect(TokenType.PROCEDURE)
-        name = self.expect(TokenType.IDENTIFIER).value
+        start = self.expect(TokenType.PROCEDURE).offset
 
+        name = None
         parameters = []
-        if self.match(TokenType.LPAREN):
-            parameters = self.parse_parameters()
+        try:
+            name = self.expect(TokenType.IDENTIFIER).value
 
-        self.expect(TokenType.SEMICOLON)
+            if self.match(TokenType.LPAREN):
+                parameters = self.parse_parameters()
+
+            self.expect(TokenType.SEMICOLON)
+        except ParserError as error:
+            self.recover_header(error)
 
         variables = []
         if self.match(TokenType.VAR):
@@ -163,19 +369,26 @@ class Parser:
         body = self.parse_compound_statement()
         self.expect(TokenType.SEMICOLON)
 
-        return Procedure(name, parameters, variables, body)
+        procedure = self.nodes.Procedure(name, parameters, variables, body)
+        return self.locate(procedure, start) if self.positions else procedure
 
     def parse_function(self) -> Function:
-        self.expect(TokenType.FUNCTION)
-        name = self.expect(TokenType.IDENTIFIER).value
+        start = self.expect(TokenType.FUNCTION).offset
 
+        name = None
         parameters = []
-        if self.match(TokenType.LPAREN):
-            parameters = self.parse_parameters()
+        return_type = None
+        try:
+            name = self.expect(TokenType.IDENTIFIER).value
 
-        self.expect(TokenType.COLON)
-        return_type = self.parse_type()
-        self.expect(TokenType.SEMICOLON)
+            if self.match(TokenType.LPAREN):
+                parameters = self.parse_parameters()
+
+            self.expect(TokenType.COLON)
+            return_type = self.parse_type()
+            self.expect(TokenType.SEMICOLON)
+        except ParserError as error:
+            self.recover_header(error)
 
         variables = []
         if self.match(TokenType.VAR):
@@ -184,7 +397,16 @@ class Parser:
         body = self.parse_compound_statement()
         self.expect(TokenType.SEMICOLON)
 
-        return Function(name, parameters, return_type, variables, body)
+        function = self.nodes.Function(name, parameters, return_type, variables, body)
+        return self.locate(function, start) if self.positions else function
+
+    def recover_header(self, error: ParserError):
+        # Ошибка в заголовке подпрограммы: разбор продолжается с раздела
+        # переменных или тела, а если до них не дойти — с следующей
+        # подпрограммы (ошибку ловит parse_program)
+        self.recover(error, HEADER_SYNC)
+        if not self.match(TokenType.VAR, TokenType.BEGIN):
+            raise error
 
     def parse_parameters(self) -> List[Parameter]:
         self.expect(TokenType.LPAREN)
@@ -215,96 +437,150 @@ class Parser:
         self.expect(TokenType.COLON)
         param_type = self.parse_type()
 
-        return Parameter(names, param_type, by_reference)
+        return self.nodes.Parameter(names, param_type, by_reference)
 
     def parse_compound_statement(self) -> CompoundStatement:
-        self.expect(TokenType.BEGIN)
-        statements = []
-
-        if not self.match(TokenType.END):
-            statements.append(self.parse_statement())
-
-            while self.match(TokenType.SEMICOLON):
-                self.advance()
-                if not self.match(TokenType.END):
-                    statements.append(self.parse_statement())
-
-        self.expect(TokenType.END)
-        return CompoundStatement(statements)
+        if self.current_token().type is not TokenType.BEGIN:
+            self.expect(TokenType.BEGIN)
+        return self.parse_statement()
 
     def parse_statement(self) -> Statement:
-        if self.match(TokenType.BEGIN):
-            return self.parse_compound_statement()
-
-        if self.match(TokenType.IF):
-            return self.parse_if_statement()
-
-        if self.match(TokenType.WHILE):
-            return self.parse_while_statement()
-
-        if self.match(TokenType.REPEAT):
-            return self.parse_repeat_statement()
+        # Вложенные операторы разбираются без рекурсии. Открывающий метод из
+        # STATEMENT_OPENERS разбирает заголовок конструкции и кладет на стек
+        # кадр (метод продолжения, состояние). Кадр получает очередной
+        # вложенный оператор и возвращает готовый узел либо None, если
+        # конструкция ждет следующий вложенный оператор
+        #
+        # С positions начало каждой незавершенной конструкции хранится в
+        # starts параллельно ее кадру, а положение записывается готовому узлу
+        positions = self.positions
+        stack = []
+        starts = []
+        node = None
+        while True:
+            frame = None
+            try:
+                if node is None:
+                    token = self.current_token()
+                    opener = self.STATEMENT_OPENERS.get(token.type)
+                    if opener is not None:
+                        node = opener(self, stack)
+                    else:
+                        handler = self.STATEMENT_PARSERS.get(token.type)
+                        if handler is None:
+                            node = self.nodes.EmptyStatement()
+                        else:
+                            node = handler(self)
+
+                    if positions and (opener or handler):
+                        if node is None:
+                            starts.append(token.offset)
+                        else:
+                            self.locate(node, token.offset)
+
+                while node is not None:
+                    if not stack:
+                        return node
+                    frame = stack.pop()
+                    resume, state = frame
+                    node = resume(stack, state, node)
+                    frame = None
+
+                    if positions:
+                        # Конструкция продолжается новым кадром или завершена
+                        if node is None:
+                            continue
+                        self.locate(node, starts.pop())
+
+            except ParserError as error:
+                # Ошибочный оператор заменяется пустым, и разбор продолжается
+                # с ближайшего ';', end, else или until в той же конструкции.
+                # На границе подпрограммы или в конце файла вложенные
+                # конструкции не закрыть: ошибка уходит на уровень выше
+                self.recover(error, STATEMENT_SYNC)
+                if self.current_token().type in SECTION_STARTS:
+                    raise
+                if frame is not None:
+                    stack.append(frame)
+                node = self.nodes.EmptyStatement()
+
+    def open_compound(self, stack: list) -> Optional[Statement]:
+        self.expect(TokenType.BEGIN)
 
-        if self.match(TokenType.FOR):
-            return self.parse_for_statement()
+        if self.current_token().type is TokenType.END:
+            self.advance()
+            return self.nodes.CompoundStatement([])
 
-        if self.match(TokenType.CASE):
-            return self.parse_case_statement()
+        stack.append((self.resume_compound, []))
+        return None
 
-        if self.match(
-            TokenType.WRITE, TokenType.WRITELN, TokenType.READ, TokenType.READLN
-        ):
-            return self.parse_builtin_procedure()
+    def resume_compound(self, stack: list, statements: list, statement: Statement):
+        statements.append(statement)
 
-        if self.match(TokenType.IDENTIFIER):
-            return self.parse_assignment_or_call()
+        if self.current_token().type is TokenType.SEMICOLON:
+            self.advance()
+            if self.current_token().type is not TokenType.END:
+                stack.append((self.resume_compound, statements))
+                return None
 
-        return EmptyStatement()
+        self.expect(TokenType.END)
+        return self.nodes.CompoundStatement(statements)
 
-    def parse_if_statement(self) -> IfStatement:
+    def open_if(self, stack: list) -> None:
         self.expect(TokenType.IF)
         condition = self.parse_expression()
         self.expect(TokenType.THEN)
-        then_stmt = self.parse_statement()
+        stack.append((self.resume_if, condition))
 
-        else_stmt = None
-        if self.match(TokenType.ELSE):
+    def resume_if(self, stack: list, condition: Expression, then_stmt: Statement):
+        if self.current_token().type is TokenType.ELSE:
             self.advance()
-            else_stmt = self.parse_statement()
+            stack.append((self.resume_else, (condition, then_stmt)))
+            return None
 
-        return IfStatement(condition, then_stmt, else_stmt)
+        return self.nodes.IfStatement(condition, then_stmt)
 
-    def parse_while_statement(self) -> WhileStatement:
+    def resume_else(self, stack: list, state: tuple, else_stmt: Statement):
+        condition, then_stmt = state
+        return self.nodes.IfStatement(condition, then_stmt, else_stmt)
+
+    def open_while(self, stack: list) -> None:
         self.expect(TokenType.WHILE)
         condition = self.parse_expression()
         self.expect(TokenType.DO)
-        body = self.parse_statement()
+        stack.append((self.resume_while, condition))
 
-        return WhileStatement(condition, body)
+    def resume_while(self, stack: list, condition: Expression, body: Statement):
+        return self.nodes.WhileStatement(condition, body)
 
-    def parse_repeat_statement(self) -> RepeatStatement:
+    def open_repeat(self, stack: list) -> None:
         self.expect(TokenType.REPEAT)
-        statements = []
+        stack.append((self.resume_repeat, []))
+
+    def resume_repeat(self, stack: list, statements: list, statement: Statement):
+        statements.append(statement)
 
-        statements.append(self.parse_statement())
-        while self.match(TokenType.SEMICOLON):
+        if self.current_token().type is TokenType.SEMICOLON:
             self.advance()
-            if not self.match(TokenType.UNTIL):
-                statements.append(self.parse_statement())
+            if self.current_token().type is not TokenType.UNTIL:
+                stack.append((self.resume_repeat, statements))
+                return None
 
         self.expect(TokenType.UNTIL)
         condition = self.parse_expression()
 
-        return RepeatStatement(CompoundStatement(statements), condition)
+        return self.nodes.RepeatStatement(
+            self.nodes.CompoundStatement(statements), condition
+        )
 
-    def parse_for_statement(self) -> ForStatement:
+    def open_for(self, stack: list) -> None:
         self.expect(TokenType.FOR)
         variable = self.expect(TokenType.IDENTIFIER).value
         self.expect(TokenType.ASSIGN)
         start_value = self.parse_expression()
 
         downto = False
-        if self.match(TokenType.DOWNTO):
+        if self.current_token().type is TokenType.DOWNTO:
             downto = True
             self.advance()
         else:
@@ -312,221 +588,389 @@ class Parser:
 
         end_value = self.parse_expression()
         self.expect(TokenType.DO)
-        body = self.parse_statement()
+        stack.append((self.resume_for, (variable, start_value, end_value, downto)))
 
-        return ForStatement(variable, start_value, end_value, body, downto)
+    def resume_for(self, stack: list, state: tuple, body: Statement):
+        variable, start_value, end_value, downto = state
+        return self.nodes.ForStatement(variable, start_value, end_value, body, downto)
 
-    def parse_case_statement(self) -> CaseStatement:
+    def open_case(self, stack: list) -> None:
         self.expect(TokenType.CASE)
         expression = self.parse_expression()
         self.expect(TokenType.OF)
+        self.open_case_branch(stack, expression, [])
 
-        branches = []
-        branches.append(self.parse_case_branch())
+    def open_case_branch(self, stack: list, expression: Expression, branches: list):
+        values = self.parse_expression_list()
+        self.expect(TokenType.COLON)
+        stack.append((self.resume_case, (expression, branches, values)))
 
-        while self.match(TokenType.SEMICOLON):
-            self.advance()
-            if not self.match(TokenType.END, TokenType.ELSE):
-                branches.append(self.parse_case_branch())
+    def resume_case(self, stack: list, state: tuple, statement: Statement):
+        expression, branches, values = state
+        branches.append((values, statement))
 
-        else_stmt = None
-        if self.match(TokenType.ELSE):
+        if self.current_token().type is TokenType.SEMICOLON:
             self.advance()
-            else_stmt = self.parse_statement()
+            if self.current_token().type not in CASE_BRANCH_END:
+                self.open_case_branch(stack, expression, branches)
+                return None
 
-        self.expect(TokenType.END)
-        return CaseStatement(expression, branches, else_stmt)
-
-    def parse_case_branch(self) -> tuple:
-        values = [self.parse_expression()]
-
-        while self.match(TokenType.COMMA):
+        if self.current_token().type is TokenType.ELSE:
             self.advance()
-            values.append(self.parse_expression())
+            stack.append((self.resume_case_else, (expression, branches)))
+            return None
 
-        self.expect(TokenType.COLON)
-        statement = self.parse_statement()
+        self.expect(TokenType.END)
+        return self.nodes.CaseStatement(expression, branches)
 
-        return (values, statement)
+    def resume_case_else(self, stack: list, state: tuple, else_stmt: Statement):
+        expression, branches = state
+        self.expect(TokenType.END)
+        return self.nodes.CaseStatement(expression, branches, else_stmt)
 
     def parse_builtin_procedure(self) -> Statement:
         proc_name = self.current_token().value
         self.advance()
 
-        arguments = []
-        if self.match(TokenType.LPAREN):
-            self.advance()
-            if not self.match(TokenType.RPAREN):
-                arguments.append(self.parse_expression())
-
-                while self.match(TokenType.COMMA):
-                    self.advance()
-                    arguments.append(self.parse_expression())
-
-            self.expect(TokenType.RPAREN)
-
-        return ProcedureCall(proc_name, arguments)
+        return self.nodes.ProcedureCall(proc_name, self.parse_arguments())
 
     def parse_assignment_or_call(self) -> Statement:
-        name = self.expect(TokenType.IDENTIFIER).value
+        name_token = self.expect(TokenType.IDENTIFIER)
+        name = name_token.value
 
         # Проверка на индексированную переменную
-        indices = []
-        if self.match(TokenType.LBRACKET):
-            self.advance()
-            indices.append(self.parse_expression())
-
-            while self.match(TokenType.COMMA):
-                self.advance()
-                indices.append(self.parse_expression())
-
-            self.expect(TokenType.RBRACKET)
-
-        if self.match(TokenType.ASSIGN):
+        indices = EMPTY
+        if self.current_token().type is TokenType.LBRACKET:
+            indices = self.parse_indices()
+
+        if self.current_token().type is TokenType.ASSIGN:
+            variable = self.nodes.Variable(name, indices)
+            if self.positions:
+                self.locate(variable, name_token.offset)
             self.advance()
             expression = self.parse_expression()
-            return AssignmentStatement(Variable(name, indices), expression)
+            return self.nodes.AssignmentStatement(variable, expression)
 
         # Вызов процедуры
-        arguments = []
-        if self.match(TokenType.LPAREN):
-            self.advance()
-            if not self.match(TokenType.RPAREN):
-                arguments.append(self.parse_expression())
-
-                while self.match(TokenType.COMMA):
-                    self.advance()
-                    arguments.append(self.parse_expression())
-
-            self.expect(TokenType.RPAREN)
-
-        return ProcedureCall(name, arguments)
-
-    def parse_expression(self) -> Expression:
-        left = self.parse_simple_expression()
-
-        if self.match(
-            TokenType.EQUAL,
-            TokenType.NOT_EQUAL,
-            TokenType.LESS,
-            TokenType.LESS_EQUAL,
-            TokenType.GREATER,
-            TokenType.GREATER_EQUAL,
-        ):
-            operator = self.current_token().value
-            self.advance()
-            right = self.parse_simple_expression()
-            return BinaryOp(left, operator, right)
+        return self.nodes.ProcedureCall(name, self.parse_arguments())
 
-        return left
+    def parse_expression_list(self) -> List[Expression]:
+        # Непустой список выражений через запятую
+        expressions = [self.parse_expression()]
 
-    def parse_simple_expression(self) -> Expression:
-        sign = None
-        if self.match(TokenType.PLUS, TokenType.MINUS):
-            sign = self.current_token().value
+        while self.current_token().type is TokenType.COMMA:
             self.advance()
+            expressions.append(self.parse_expression())
 
-        left = self.parse_term()
+        return expressions
 
-        if sign:
-            left = UnaryOp(sign, left)
-
-        while self.match(TokenType.PLUS, TokenType.MINUS, TokenType.OR, TokenType.XOR):
-            operator = self.current_token().value
-            self.advance()
-            right = self.parse_term()
-            left = BinaryOp(left, operator, right)
+    def parse_indices(self) -> Sequence[Expression]:
+        self.expect(TokenType.LBRACKET)
+        indices = self.parse_expression_list()
+        self.expect(TokenType.RBRACKET)
+        return indices
 
-        return left
+    def parse_arguments(self) -> Sequence[Expression]:
+        # Необязательный список фактических параметров в скобках
+        if self.current_token().type is not TokenType.LPAREN:
+            return EMPTY
 
-    def parse_term(self) -> Expression:
-        left = self.parse_factor()
+        self.advance()
+        arguments = EMPTY
+        if self.current_token().type is not TokenType.RPAREN:
+            arguments = self.parse_expression_list()
 
-        while self.match(
-            TokenType.MULTIPLY,
-            TokenType.DIVIDE,
-            TokenType.DIV,
-            TokenType.MOD,
-            TokenType.AND,
-        ):
-            operator = self.current_token().value
-            self.advance()
-            right = self.parse_factor()
-            left = BinaryOp(left, operator, right)
+        self.expect(TokenType.RPAREN)
+        return arguments
 
-        return left
+    def parse_expression(self) -> Expression:
+        return self.parse_binary(RELATION_POWER)
 
     def parse_factor(self) -> Expression:
-        if self.match(TokenType.NOT):
-            self.advance()
-            return UnaryOp("not", self.parse_factor())
-
-        if self.match(TokenType.LPAREN):
-            self.advance()
-            expr = self.parse_expression()
-            self.expect(TokenType.RPAREN)
-            return expr
-
-        if self.match(TokenType.INT_LITERAL):
-            value = self.current_token().value
-            self.advance()
-            return IntegerLiteral(value)
+        return self.parse_binary(FACTOR_POWER)
+
+    def parse_binary(self, min_power: int) -> Expression:
+        # Разбор по приоритетам (Пратт) без рекурсии. Собираются только
+        # операции с силой связывания не меньше min_power; правый операнд
+        # разбирается с порогом на единицу выше, что дает левую
+        # ассоциативность. Вместо вложенных вызовов на стек кладутся кадры
+        # незавершенных конструкций вместе с порогом, к которому нужно
+        # вернуться после разбора операнда, и смещением их начала
+        nodes = self.nodes
+        literal_nodes = self.literal_nodes
+        positions = self.positions
+        locate = nodes.locate
+        previous_token = self.previous_token
+        stack = []
+        while True:
+            token = self.current_token()
+            token_type = token.type
+            literal = literal_nodes.get(token_type)
+            start = token.offset
+
+            if literal is not None:
+                self.advance()
+                node = literal(token.value)
 
-        if self.match(TokenType.REAL_LITERAL):
-            value = self.current_token().value
-            self.advance()
-            return RealLiteral(value)
+            elif token_type is TokenType.IDENTIFIER or token_type in FUNCTION_TOKENS:
+                self.advance()
+                next_type = self.current_token().type
 
-        if self.match(TokenType.STRING_LITERAL):
-            value = self.current_token().value
-            self.advance()
-            return StringLiteral(value)
+                # Индексация массива
+                if next_type is TokenType.LBRACKET:
+                    self.advance()
+                    stack.append((INDEX_FRAME, min_power, start, token.value, []))
+                    min_power = RELATION_POWER
+                    continue
 
-        if self.match(TokenType.CHAR_LITERAL):
-            value = self.current_token().value
-            self.advance()
-            return CharLiteral(value)
+                # Вызов функции
+                if next_type is TokenType.LPAREN:
+                    self.advance()
+                    if self.current_token().type is not TokenType.RPAREN:
+                        stack.append((CALL_FRAME, min_power, start, token.value, []))
+                        min_power = RELATION_POWER
+                        continue
+                    self.advance()
+                    node = nodes.FunctionCall(token.value, EMPTY)
+                else:
+                    node = nodes.Variable(token.value)
 
-        if self.match(TokenType.TRUE):
-            self.advance()
-            return BooleanLiteral(True)
+            elif token_type in SIGN_TOKENS and min_power <= ADDITIVE_POWER:
+                # Знак допустим только в начале простого выражения и
+                # относится к первому слагаемому целиком
+                self.advance()
+                stack.append((SIGN_FRAME, min_power, start, token.value))
+                min_power = MULTIPLICATIVE_POWER
+                continue
 
-        if self.match(TokenType.FALSE):
-            self.advance()
-            return BooleanLiteral(False)
+            elif token_type is TokenType.NOT:
+                self.advance()
+                stack.append((NOT_FRAME, min_power, start))
+                min_power = FACTOR_POWER
+                continue
 
-        if self.match(TokenType.IDENTIFIER):
-            name = self.current_token().value
-            self.advance()
+            elif token_type is TokenType.LPAREN:
+                self.advance()
+                stack.append((PAREN_FRAME, min_power, start))
+                min_power = RELATION_POWER
+                continue
 
-            # Индексация массива
-            indices = []
-            if self.match(TokenType.LBRACKET):
+            elif token_type is TokenType.TRUE or token_type is TokenType.FALSE:
                 self.advance()
-                indices.append(self.parse_expression())
+                node = nodes.BooleanLiteral(token_type is TokenType.TRUE)
+
+            else:
+                raise ParserError("Ожидается выражение", token)
+
+            if positions:
+                locate(node, start, previous_token().offset)
+
+            # Операнд готов: либо его забирает следующая бинарная операция
+            # текущего уровня, либо он завершает верхний кадр стека
+            finished = False
+            while True:
+                if not finished:
+                    token = self.current_token()
+                    power = BINARY_POWERS.get(token.type)
+                    if power is not None and power >= min_power:
+                        self.advance()
+                        stack.append(
+                            (BINARY_FRAME, min_power, start, node, token.value, power)
+                        )
+                        min_power = power + 1
+                        break
+
+                if not stack:
+                    return node
+
+                frame = stack.pop()
+                kind = frame[0]
+                min_power = frame[1]
+                start = frame[2]
+                finished = False
+
+                if kind == BINARY_FRAME:
+                    node = nodes.BinaryOp(frame[3], frame[4], node)
+                    # Операции сравнения не ассоциативны: a < b < c не
+                    # разбирается, уровень завершается сразу
+                    finished = frame[5] == RELATION_POWER
+
+                elif kind == SIGN_FRAME:
+                    node = nodes.UnaryOp(frame[3], node)
+
+                elif kind == NOT_FRAME:
+                    node = nodes.UnaryOp("not", node)
+
+                elif kind == PAREN_FRAME:
+                    # Скобки не создают узла: положение остается у выражения
+                    # в скобках, а start включает скобку для внешних операций
+                    self.expect(TokenType.RPAREN)
+                    continue
+
+                else:
+                    items = frame[4]
+                    items.append(node)
+                    if self.current_token().type is TokenType.COMMA:
+                        self.advance()
+                        stack.append(frame)
+                        min_power = RELATION_POWER
+                        break
+
+                    if kind == INDEX_FRAME:
+                        self.expect(TokenType.RBRACKET)
+                        node = nodes.Variable(frame[3], items)
+                    else:
+                        self.expect(TokenType.RPAREN)
+                        node = nodes.FunctionCall(frame[3], items)
+
+                if positions:
+                    locate(node, start, previous_token().offset)
+
+    STATEMENT_OPENERS = {
+        TokenType.BEGIN: open_compound,
+        TokenType.IF: open_if,
+        TokenType.WHILE: open_while,
+        TokenType.REPEAT: open_repeat,
+        TokenType.FOR: open_for,
+        TokenType.CASE: open_case,
+    }
+
+    STATEMENT_PARSERS = {
+        TokenType.WRITE: parse_builtin_procedure,
+        TokenType.WRITELN: parse_builtin_procedure,
+        TokenType.READ: parse_builtin_procedure,
+        TokenType.READLN: parse_builtin_procedure,
+        TokenType.IDENTIFIER: parse_assignment_or_call,
+    }
+
+
+class StreamingParser(Parser):
+    # Разбор потока токенов (например, Lexer.iter_tokens()) без построения
+    # списка: в памяти держится только окно просмотра вперед, а разбор
+    # начинается до окончания лексического анализа
+    def __init__(
+        self,
+        tokens: Iterable[Token],
+        lookahead: int = 1,
+        recover: bool = False,
+        nodes=OBJECT_NODES,
+        positions: bool = False,
+    ):
+        self.stream = iter(tokens)
+        self.window = deque()
+        self.lookahead = lookahead
+        self.pos = 0
+        self.previous = None
+        self.fill(0)
+        self.init_recovery(recover)
+        self.init_nodes(nodes, positions)
+
+    def fill(self, offset: int):
+        window = self.window
+        while len(window) <= offset:
+            if window and window[-1].type == TokenType.EOF:
+                return
+            window.append(next(self.stream))
 
-                while self.match(TokenType.COMMA):
-                    self.advance()
-                    indices.append(self.parse_expression())
+    def current_token(self) -> Token:
+        return self.window[0]
 
-                self.expect(TokenType.RBRACKET)
-                return Variable(name, indices)
+    def peek_token(self, offset: int = 1) -> Token:
+        if offset > self.lookahead:
+            raise ValueError(
+                f"Просмотр вперед на {offset} токенов превышает окно {self.lookahead}"
+            )
+        self.fill(offset)
+        if offset < len(self.window):
+            return self.window[offset]
+        return self.window[-1]
 
-            # Вызов функции
-            if self.match(TokenType.LPAREN):
-                self.advance()
-                arguments = []
+    def previous_token(self) -> Token:
+        return self.previous or self.window[0]
 
-                if not self.match(TokenType.RPAREN):
-                    arguments.append(self.parse_expression())
+    def advance(self):
+        window = self.window
+        if window[0].type != TokenType.EOF:
+            self.previous = window.popleft()
+            self.pos += 1
+            if not window:
+                window.append(next(self.stream))
+
+
+class IncrementalParser(Parser):
+    # Разбор редактируемого буфера (поверх IncrementalLexer): после правки
+    # заново разбираются только затронутые ею подпрограммы и основной блок.
+    # Для каждой подпрограммы запоминается отрезок токенов [start, end),
+    # отпечаток его содержимого и построенный узел. Отрезки целиком вне
+    # замененных токенов переиспользуются по месту (со сдвигом индексов),
+    # а узлы затронутых отрезков — если отпечаток нового отрезка совпал.
+    # С positions положения переиспользованного узла сдвигаются на месте,
+    # если текст перед ним изменил длину
+    def __init__(self, source: str, positions: bool = False):
+        self.lexer = IncrementalLexer(source)
+        super().__init__(self.lexer.tokens, positions=positions)
+        self.spans: List[tuple] = []  # (start, end, fingerprint, node)
+        self.detached = {}  # отпечаток -> узел подпрограммы, затронутой правкой
+        self.reused = 0
+        self.program = self.parse()
+
+    def edit(self, offset: int, removed: int, inserted: str) -> Program:
+        # Заменяет removed символов начиная с offset на inserted и
+        # возвращает новое дерево. При ошибке разбора состояние остается
+        # согласованным с исходным кодом, и следующая правка ее исправит
+        first, old_count, new_count = self.lexer.edit(offset, removed, inserted)
+        changed_end = first + old_count
+        delta = new_count - old_count
+
+        spans = []
+        for span in self.spans:
+            start, end, fingerprint, node = span
+            if end <= first:
+                spans.append(span)
+            elif start >= changed_end:
+                spans.append((start + delta, end + delta, fingerprint, node))
+            else:
+                self.detached[fingerprint] = node
+        self.spans = spans
+
+        self.program = self.parse()
+        return self.program
 
-                    while self.match(TokenType.COMMA):
-                        self.advance()
-                        arguments.append(self.parse_expression())
+    def parse(self) -> Program:
+        self.pos = 0
+        self.last = len(self.tokens) - 1
+        self.reusable = {span[0]: span for span in self.spans}
+        self.new_spans = []
+        self.reused = 0
 
-                self.expect(TokenType.RPAREN)
-                return FunctionCall(name, arguments)
+        program = self.parse_program()
 
-            return Variable(name)
+        self.spans = self.new_spans
+        self.detached = {}
+        return program
+
+    def parse_subprogram(self) -> Subprogram:
+        start = self.pos
+        span = self.reusable.get(start)
+
+        if span is None and self.detached:
+            end = subprogram_span_end(self.tokens, start)
+            if end is not None:
+                fingerprint = span_fingerprint(self.tokens, start, end, self.positions)
+                node = self.detached.pop(fingerprint, None)
+                if node is not None:
+                    span = (start, end, fingerprint, node)
+
+        if span is not None:
+            self.pos = span[1]
+            self.reused += 1
+            if self.positions:
+                node = span[3]
+                shift_positions(node, self.tokens[start].offset - node.span[0])
+        else:
+            node = super().parse_subprogram()
+            fingerprint = span_fingerprint(self.tokens, start, self.pos, self.positions)
+            span = (start, self.pos, fingerprint, node)
 
-        raise ParserError("Ожидается выражение", self.current_token())
+        self.new_spans.append(span)
+        return span[3]
@@ -0,0 +1,451 @@
+"""
+Семантический анализ
+Таблицы символов по областям видимости и типы выражений — между
+синтаксическим анализом и генерацией кода
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from src.ast_nodes import (
+    ASTNode,
+    Program,
+    Type,
+    ArrayType,
+    Subprogram,
+    Function,
+    Statement,
+    CompoundStatement,
+    AssignmentStatement,
+    IfStatement,
+    WhileStatement,
+    RepeatStatement,
+    ForStatement,
+    CaseStatement,
+    ProcedureCall,
+    EmptyStatement,
+    Expression,
+    BinaryOp,
+    UnaryOp,
+    Variable,
+    IntegerLiteral,
+    RealLiteral,
+    StringLiteral,
+    CharLiteral,
+    BooleanLiteral,
+    FunctionCall,
+    node_key,
+)
+from src.folding import array_bounds
+from src.standard import BUILTIN_FUNCTIONS, IO_PROCEDURES, JUMP_PROCEDURES
+from src.visitor import NodeVisitor, node_class
+
+
+# Стандартные процедуры (число аргументов не проверяется). Как и
+# стандартные функции, они важнее одноименных пользовательских
+BUILTIN_PROCEDURES = frozenset(IO_PROCEDURES + JUMP_PROCEDURES)
+
+RELATION_OPERATORS = frozenset(("=", "<>", "<", ">", "<=", ">="))
+LOGICAL_OPERATORS = frozenset(("and", "or", "xor"))
+
+
+class SemanticError(Exception):
+    def __init__(self, message: str, node: ASTNode):
+        self.message = message
+        self.node = node
+        super().__init__(f"Semantic error: {message}")
+
+
+@dataclass(slots=True, eq=False)
+class Symbol:
+    name: str
+    kind: str  # "variable", "parameter", "function" или "procedure"
+    type: Optional[Type]  # тип из объявления; у процедуры None
+    declaration: ASTNode  # VarDeclaration, Parameter или подпрограмма
+    by_reference: bool = False
+    scope: Optional["Scope"] = field(default=None, repr=False)
+    # Границы измерений массива (array_bounds), в том числе массивов
+    # массивов: ((начало, конец), ...); у скаляров — пустой кортеж
+    bounds: tuple = ()
+
+    @property
+    def type_name(self) -> Optional[str]:
+        return self.type.name if self.type is not None else None
+
+
+class Scope:
+    """
+    Область видимости: программа или подпрограмма. Имена ищутся в словаре
+    области, затем во внешней области — глубина вложенности не больше двух,
+    поэтому поиск выполняется за O(1).
+
+    Результаты анализа хранятся в таблицах по ключу узла (node_key):
+    references — символ, к которому относится Variable, FunctionCall,
+    ProcedureCall или переменная цикла ForStatement; types — тип каждого
+    выражения. Общий узел InterningNodes может встречаться в разных
+    подпрограммах и относиться в них к разным символам, поэтому таблицы
+    у каждой области свои. Они действительны, пока дерево не изменено
+    """
+
+    def __init__(self, name: str, parent: Optional["Scope"] = None,
+                 subprogram: Optional[Subprogram] = None):
+        self.name = name
+        self.parent = parent
+        self.subprogram = subprogram
+        self.symbols: Dict[str, Symbol] = {}
+        self.references: Dict[int, Symbol] = {}
+        self.types: Dict[int, Optional[str]] = {}
+
+    def declare(self, symbol: Symbol) -> Optional[Symbol]:
+        # Добавляет символ; возвращает прежний символ с тем же именем в
+        # этой же области (повторное объявление) или None
+        previous = self.symbols.get(symbol.name)
+        if previous is None:
+            symbol.scope = self
+            self.symbols[symbol.name] = symbol
+        return previous
+
+    def lookup(self, name: str) -> Optional[Symbol]:
+        scope = self
+        while scope is not None:
+            symbol = scope.symbols.get(name)
+            if symbol is not None:
+                return symbol
+            scope = scope.parent
+        return None
+
+    def symbol(self, node: ASTNode) -> Optional[Symbol]:
+        return self.references.get(node_key(node))
+
+    def type_of(self, node: Expression) -> Optional[str]:
+        return self.types.get(node_key(node))
+
+
+class SemanticInfo:
+    # Результат анализа программы: области видимости и найденные ошибки
+    def __init__(self, program_scope: Scope):
+        self.program_scope = program_scope
+        self.scopes: Dict[str, Scope] = {}  # имя подпрограммы -> область
+        self.errors: List[SemanticError] = []
+
+    def scope(self, subprogram: Optional[Subprogram] = None) -> Scope:
+        # Область подпрограммы; без аргумента — область основной программы
+        if subprogram is None:
+            return self.program_scope
+        return self.scopes.get(subprogram.name, self.program_scope)
+
+
+# Маркер на стеке анализа выражений: тип узла вычисляется после типов
+# дочерних узлов
+_TYPE_NODE = object()
+
+# Дочерние выражения по классам узлов, в обратном порядке (для стека)
+_CHILDREN = {
+    BinaryOp: lambda expr: (expr.right, expr.left),
+    UnaryOp: lambda expr: (expr.operand,),
+    Variable: lambda expr: expr.indices[::-1],
+    FunctionCall: lambda expr: expr.arguments[::-1],
+}
+
+
+def _no_children(expr: Expression) -> tuple:
+    return ()
+
+
+def _children_getter(node_type: type):
+    # Литералы и представления ASTArena (подклассы классов узлов)
+    getter = _CHILDREN.get(node_class(node_type), _no_children)
+    _CHILDREN[node_type] = getter
+    return getter
+
+
+class SemanticAnalyzer(NodeVisitor):
+    """
+    Строит области видимости программы и подпрограмм (глобальные
+    переменные, подпрограммы, параметры, локальные переменные), связывает
+    каждое обращение к имени с объявлением и выводит типы выражений.
+    Операторы и выражения обходятся по явному стеку, поэтому глубина
+    вложенности не ограничена. Ошибки (необъявленные и повторно
+    объявленные имена, неверное число аргументов) не прерывают анализ, а
+    собираются в SemanticInfo.errors
+    """
+
+    def analyze(self, program: Program) -> SemanticInfo:
+        info = SemanticInfo(Scope(program.name))
+        self.info = info
+        program_scope = info.program_scope
+
+        self.declare_variables(program_scope, program.variables)
+        for subprogram in program.subprograms:
+            kind = "function" if isinstance(subprogram, Function) else "procedure"
+            return_type = subprogram.return_type if kind == "function" else None
+            self.declare(program_scope, Symbol(subprogram.name, kind, return_type, subprogram))
+
+        # Тела анализируются после объявления всех подпрограмм: вызов
+        # может стоять раньше объявления вызываемой подпрограммы
+        for subprogram in program.subprograms:
+            scope = Scope(subprogram.name, program_scope, subprogram)
+            info.scopes.setdefault(subprogram.name, scope)
+            for param in subprogram.parameters:
+                for name in param.names:
+                    self.declare(
+                        scope,
+                        Symbol(name, "parameter", param.param_type, param, param.by_reference),
+                    )
+            self.declare_variables(scope, subprogram.variables)
+            self.analyze_statements([subprogram.body], scope)
+
+        self.analyze_statements([program.body], program_scope)
+        return info
+
+    def declare_variables(self, scope: Scope, declarations: list):
+        for var_decl in declarations:
+            for name in var_decl.names:
+                self.declare(scope, Symbol(name, "variable", var_decl.var_type, var_decl))
+
+    def declare(self, scope: Scope, symbol: Symbol):
+        if scope.declare(symbol) is not None:
+            self.error(f"Повторное объявление '{symbol.name}'", symbol.declaration, scope)
+        if isinstance(symbol.type, ArrayType) and symbol.kind != "function":
+            symbol.bounds = self.check_bounds(symbol, scope)
+
+    def check_bounds(self, symbol: Symbol, scope: Scope) -> tuple:
+        # Границы, вычисленные при трансляции (свертка констант). Массив с
+        # неконстантной границей получает в C++ размер-заглушку, как и
+        # раньше; пустой диапазон — ошибка
+        bounds = tuple(array_bounds(symbol.type))
+        for start, end in bounds:
+            if start is not None and end is not None and end < start:
+                self.error(
+                    f"Пустой диапазон индексов массива '{symbol.name}' "
+                    f"({start}..{end})",
+                    symbol.declaration,
+                    scope,
+                )
+                break
+        return bounds
+
+    def error(self, message: str, node: ASTNode, scope: Scope):
+        if scope.subprogram is not None:
+            message = f"{message} в подпрограмме {scope.name}"
+        self.info.errors.append(SemanticError(message, node))
+
+    def resolve(self, node: ASTNode, name: str, scope: Scope) -> Optional[Symbol]:
+        symbol = scope.lookup(name)
+        if symbol is None:
+            self.error(f"Необъявленный идентификатор '{name}'", node, scope)
+        else:
+            scope.references[node_key(node)] = symbol
+        return symbol
+
+    def check_arguments(self, call, symbol: Symbol, scope: Scope):
+        expected = sum(len(param.names) for param in symbol.declaration.parameters)
+        if len(call.arguments) != expected:
+            self.error(
+                f"'{call.name}' ожидает аргументов: {expected}, передано: "
+                f"{len(call.arguments)}",
+                call,
+                scope,
+            )
+
+    # Операторы: метод получает оператор и область, анализирует его
+    # выражения и кладет вложенные операторы на стек work
+
+    def analyze_statements(self, statements: List[Statement], scope: Scope):
+        table = self._dispatch_table
+        work = list(reversed(statements))
+
+        while work:
+            item = work.pop()
+            item_type = type(item)
+            visit = table.get(item_type) or self.dispatch(item_type)
+            visit(self, item, scope, work)
+
+    def visit_CompoundStatement(self, stmt: CompoundStatement, scope: Scope, work: list):
+        work.extend(reversed(stmt.statements))
+
+    def visit_AssignmentStatement(
+        self, stmt: AssignmentStatement, scope: Scope, work: list
+    ):
+        self.analyze_expression(stmt.variable, scope)
+        self.analyze_expression(stmt.expression, scope)
+
+        # Присваивать можно переменным и результату текущей функции
+        # (представления ASTArena сравниваются по ключу, а не по тождеству)
+        symbol = scope.symbol(stmt.variable)
+        if symbol is not None and symbol.kind in ("function", "procedure"):
+            if scope.subprogram is None or node_key(symbol.declaration) != node_key(
+                scope.subprogram
+            ):
+                self.error(f"Присваивание подпрограмме '{symbol.name}'", stmt, scope)
+
+    def visit_IfStatement(self, stmt: IfStatement, scope: Scope, work: list):
+        self.analyze_expression(stmt.condition, scope)
+        if stmt.else_statement:
+            work.append(stmt.else_statement)
+        work.append(stmt.then_statement)
+
+    def visit_WhileStatement(self, stmt: WhileStatement, scope: Scope, work: list):
+        self.analyze_expression(stmt.condition, scope)
+        work.append(stmt.body)
+
+    def visit_RepeatStatement(self, stmt: RepeatStatement, scope: Scope, work: list):
+        self.analyze_expression(stmt.condition, scope)
+        work.append(stmt.body)
+
+    def visit_ForStatement(self, stmt: ForStatement, scope: Scope, work: list):
+        self.resolve(stmt, stmt.variable, scope)
+        self.analyze_expression(stmt.start_value, scope)
+        self.analyze_expression(stmt.end_value, scope)
+        work.append(stmt.body)
+
+    def visit_CaseStatement(self, stmt: CaseStatement, scope: Scope, work: list):
+        self.analyze_expression(stmt.expression, scope)
+        if stmt.else_statement:
+            work.append(stmt.else_statement)
+        for values, branch_stmt in reversed(stmt.branches):
+            for value in values:
+                self.analyze_expression(value, scope)
+            work.append(branch_stmt)
+
+    def visit_ProcedureCall(self, stmt: ProcedureCall, scope: Scope, work: list):
+        for arg in stmt.arguments:
+            self.analyze_expression(arg, scope)
+        if stmt.name in BUILTIN_PROCEDURES:
+            return
+        symbol = self.resolve(stmt, stmt.name, scope)
+        if symbol is None:
+            return
+        if symbol.kind in ("function", "procedure"):
+            self.check_arguments(stmt, symbol, scope)
+        else:
+            self.error(f"'{stmt.name}' не является процедурой", stmt, scope)
+
+    def visit_EmptyStatement(self, stmt: EmptyStatement, scope: Scope, work: list):
+        pass
+
+    # Выражения: метод получает узел, типы дочерних узлов которого уже
+    # записаны в scope.types, и возвращает тип узла (None — неизвестен)
+
+    def analyze_expression(self, expr: Expression, scope: Scope):
+        types = scope.types
+        table = self._dispatch_table
+        work = [expr]
+
+        while work:
+            item = work.pop()
+            if item is _TYPE_NODE:
+                node = work.pop()
+                node_type = type(node)
+                visit = table.get(node_type) or self.dispatch(node_type)
+                types[work.pop()] = visit(self, node, scope)
+                continue
+
+            # Общий узел (InterningNodes) анализируется в области один раз
+            key = node_key(item)
+            if key in types:
+                continue
+            item_type = type(item)
+            children = _CHILDREN.get(item_type) or _children_getter(item_type)
+            children = children(item)
+            if children:
+                work.append(key)
+                work.append(item)
+                work.append(_TYPE_NODE)
+                work.extend(children)
+            else:
+                visit = table.get(item_type) or self.dispatch(item_type)
+                types[key] = visit(self, item, scope)
+
+    def visit_BinaryOp(self, expr: BinaryOp, scope: Scope) -> Optional[str]:
+        operator = expr.operator
+        if operator in RELATION_OPERATORS:
+            return "boolean"
+        if operator == "/":
+            return "real"
+        if operator in ("div", "mod"):
+            return "integer"
+
+        left = scope.type_of(expr.left)
+        right = scope.type_of(expr.right)
+        if operator in LOGICAL_OPERATORS:
+            return "boolean" if left == right == "boolean" else "integer"
+        if operator == "+" and (left in ("string", "char") or right in ("string", "char")):
+            return "string"
+        if left == "real" or right == "real":
+            return "real"
+        if left == right == "integer":
+            return "integer"
+        return None
+
+    def visit_UnaryOp(self, expr: UnaryOp, scope: Scope) -> Optional[str]:
+        operand = scope.type_of(expr.operand)
+        if expr.operator == "not":
+            return "boolean" if operand == "boolean" else operand
+        return operand
+
+    def visit_Variable(self, expr: Variable, scope: Scope) -> Optional[str]:
+        symbol = self.resolve(expr, expr.name, scope)
+        if symbol is None:
+            return None
+        if symbol.kind == "procedure":
+            self.error(f"Процедура '{expr.name}' в выражении", expr, scope)
+            return None
+
+        # Индексы снимают измерения массива по одному; индекс строки — символ
+        var_type = symbol.type
+        indices = len(expr.indices)
+        while indices and isinstance(var_type, ArrayType):
+            if indices < len(var_type.dimensions):
+                return "array"  # строка многомерного массива
+            indices -= len(var_type.dimensions)
+            var_type = var_type.element_type
+        if not indices:
+            return var_type.name
+        if indices == 1 and var_type.name == "string":
+            return "char"
+        self.error(f"'{expr.name}' не является массивом", expr, scope)
+        return None
+
+    def visit_FunctionCall(self, expr: FunctionCall, scope: Scope) -> Optional[str]:
+        builtin = BUILTIN_FUNCTIONS.get(expr.name)
+        if builtin is not None:
+            if len(expr.arguments) != builtin.arity:
+                self.error(
+                    f"'{expr.name}' ожидает аргументов: {builtin.arity}, передано: "
+                    f"{len(expr.arguments)}",
+                    expr,
+                    scope,
+                )
+            result = builtin.result
+            if result is None and expr.arguments:
+                result = scope.type_of(expr.arguments[0])
+            return result
+
+        symbol = self.resolve(expr, expr.name, scope)
+        if symbol is None:
+            return None
+        if symbol.kind != "function":
+            self.error(f"'{expr.name}' не является функцией", expr, scope)
+            return None
+        self.check_arguments(expr, symbol, scope)
+        return symbol.type_name
+
+    def visit_IntegerLiteral(self, expr: IntegerLiteral, scope: Scope) -> str:
+        return "integer"
+
+    def visit_RealLiteral(self, expr: RealLiteral, scope: Scope) -> str:
+        return "real"
+
+    def visit_StringLiteral(self, expr: StringLiteral, scope: Scope) -> str:
+        return "string"
+
+    def visit_CharLiteral(self, expr: CharLiteral, scope: Scope) -> str:
+        return "char"
+
+    def visit_BooleanLiteral(self, expr: BooleanLiteral, scope: Scope) -> str:
+        return "boolean"
+
+
+def analyze(program: Program) -> SemanticInfo:
+    return SemanticAnalyzer().analyze(program)
@@ -0,0 +1,293 @@
+"""
+Двоичная сериализация AST
+Компактный версионированный формат для кэшей на диске и передачи
+деревьев между процессами
+"""
+
+import struct
+from typing import BinaryIO
+
+from src.ast_nodes import NODE_CLASSES, NODE_KINDS, ASTNode, node_fields, pack_span
+
+# Сигнатура и версия формата. Версия повышается при любом изменении
+# набора узлов, порядка NODE_CLASSES или полей узлов
+MAGIC = b"PASAST"
+FORMAT_VERSION = 2
+# Версии, которые читает loads(): в версии 1 нет кода SPAN
+READABLE_VERSIONS = (1, FORMAT_VERSION)
+
+# Формат данных после заголовка:
+#
+#     varint  число строк, затем каждая строка: varint длина + UTF-8
+#     код...  дерево в обратной польской записи
+#
+# Коды 0..len(NODE_CLASSES)-1 — вид узла: узел строится из стольких
+# последних значений стека, сколько у него полей. Остальные коды кладут
+# на стек значение. Узел, который встречается в дереве повторно (общие
+# узлы InterningNodes), записывается как REF с его порядковым номером.
+# Положение узла в исходном коде (Parser с positions=True) записывается
+# кодом SPAN непосредственно перед кодом вида узла
+OP_NONE = 64
+OP_FALSE = 65
+OP_TRUE = 66
+OP_INT = 67  # varint, зигзаг-кодирование знака
+OP_FLOAT = 68  # 8 байт, double
+OP_STR = 69  # varint, номер в таблице строк
+OP_LIST = 70  # varint, число элементов со стека
+OP_TUPLE = 71  # varint, число элементов со стека
+OP_REF = 72  # varint, номер ранее построенного узла
+OP_SPAN = 73  # varint начало, varint длина (конец - начало)
+
+_DOUBLE = struct.Struct("<d")
+
+_FIELD_NAMES = [tuple(item.name for item in node_fields(cls)) for cls in NODE_CLASSES]
+
+
+class SerializationError(Exception):
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(f"Serialization error: {message}")
+
+
+# Маркеры на стеке кодировщика: завершение узла или последовательности
+_NODE_END = object()
+_LIST_END = object()
+_TUPLE_END = object()
+
+
+def _write_varint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _node_kind(cls: type, cache: dict) -> int:
+    # Представления узлов ASTArena — подклассы классов узлов
+    kind = cache.get(cls)
+    if kind is None:
+        for base in cls.__mro__:
+            kind = NODE_KINDS.get(base)
+            if kind is not None:
+                break
+        else:
+            raise SerializationError(f"Неизвестный класс узла {cls.__name__}")
+        cache[cls] = kind
+    return kind
+
+
+def dumps(node: ASTNode) -> bytes:
+    """
+    Кодирует дерево (обычно Program) в байты. Обход без рекурсии, поэтому
+    глубина вложенности не ограничена
+    """
+    body = bytearray()
+    strings = {}
+    kinds = {}
+    # id узла -> (порядковый номер, узел). Ссылка на узел не дает id
+    # освободиться и достаться другому узлу (представления ASTArena
+    # создаются заново при каждом обращении)
+    built = {}
+    count = 0
+    stack = [node]
+
+    while stack:
+        item = stack.pop()
+
+        if item is _NODE_END:
+            node = stack.pop()
+            built[id(node)] = (count, node)
+            count += 1
+            span = node.span
+            if span is not None:
+                body.append(OP_SPAN)
+                _write_varint(body, span[0])
+                _write_varint(body, span[1] - span[0])
+            body.append(_node_kind(type(node), kinds))
+
+        elif item is _LIST_END or item is _TUPLE_END:
+            body.append(OP_LIST if item is _LIST_END else OP_TUPLE)
+            _write_varint(body, stack.pop())
+
+        elif isinstance(item, ASTNode):
+            shared = built.get(id(item))
+            if shared is not None:
+                body.append(OP_REF)
+                _write_varint(body, shared[0])
+                continue
+            stack.append(item)
+            stack.append(_NODE_END)
+            names = _FIELD_NAMES[_node_kind(type(item), kinds)]
+            for name in reversed(names):
+                stack.append(getattr(item, name))
+
+        elif isinstance(item, (list, tuple)):
+            stack.append(len(item))
+            stack.append(_LIST_END if isinstance(item, list) else _TUPLE_END)
+            stack.extend(reversed(item))
+
+        elif isinstance(item, str):
+            index = strings.get(item)
+            if index is None:
+                index = strings[item] = len(strings)
+            body.append(OP_STR)
+            _write_varint(body, index)
+
+        elif item is None:
+            body.append(OP_NONE)
+
+        elif item is True or item is False:
+            body.append(OP_TRUE if item else OP_FALSE)
+
+        elif isinstance(item, int):
+            body.append(OP_INT)
+            _write_varint(body, item << 1 if item >= 0 else (-item << 1) - 1)
+
+        elif isinstance(item, float):
+            body.append(OP_FLOAT)
+            body += _DOUBLE.pack(item)
+
+        else:
+            raise SerializationError(f"Неподдерживаемое значение {item!r}")
+
+    out = bytearray(MAGIC)
+    _write_varint(out, FORMAT_VERSION)
+    _write_varint(out, len(strings))
+    for string in strings:
+        data = string.encode("utf-8")
+        _write_varint(out, len(data))
+        out += data
+    out += body
+    return bytes(out)
+
+
+def loads(data: bytes) -> ASTNode:
+    """
+    Восстанавливает дерево из байтов dumps(). Создаются только узлы из
+    NODE_CLASSES и простые значения, поэтому, в отличие от pickle, чтение
+    непроверенных данных не выполняет произвольный код
+
+    Raises:
+        SerializationError: данные повреждены или другой версии формата
+    """
+    data = memoryview(data)
+    if bytes(data[: len(MAGIC)]) != MAGIC:
+        raise SerializationError("Нет сигнатуры формата AST")
+
+    try:
+        return _decode(data, len(MAGIC))
+    except SerializationError:
+        raise
+    except (IndexError, ValueError, TypeError, UnicodeDecodeError, struct.error) as e:
+        raise SerializationError(f"Поврежденные данные: {e}") from None
+
+
+def _decode(data: memoryview, pos: int) -> ASTNode:
+    def read_varint():
+        nonlocal pos
+        value = 0
+        shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    version = read_varint()
+    if version not in READABLE_VERSIONS:
+        raise SerializationError(
+            f"Версия формата {version} не поддерживается (ожидается {FORMAT_VERSION})"
+        )
+
+    strings = []
+    for _ in range(read_varint()):
+        length = read_varint()
+        strings.append(str(data[pos : pos + length], "utf-8"))
+        pos += length
+
+    classes = NODE_CLASSES
+    kind_count = len(classes)
+    field_counts = [len(names) for names in _FIELD_NAMES]
+    stack = []
+    built = []
+    end = len(data)
+    position = -1  # положение из SPAN для следующего узла
+
+    while pos < end:
+        op = data[pos]
+        pos += 1
+
+        if op < kind_count:
+            count = field_counts[op]
+            if count:
+                if len(stack) < count:
+                    raise SerializationError("Недостаточно значений для узла")
+                node = classes[op](*stack[-count:])
+                del stack[-count:]
+            else:
+                node = classes[op]()
+            if position >= 0:
+                node.position = position
+                position = -1
+            built.append(node)
+            stack.append(node)
+            continue
+
+        if op == OP_STR or op == OP_REF or op == OP_INT or op >= OP_LIST:
+            # varint читается прямо в цикле: вызов функции на каждое
+            # число заметно замедлил бы загрузку
+            value = data[pos]
+            pos += 1
+            if value >= 0x80:
+                value &= 0x7F
+                shift = 7
+                while True:
+                    byte = data[pos]
+                    pos += 1
+                    value |= (byte & 0x7F) << shift
+                    if byte < 0x80:
+                        break
+                    shift += 7
+
+            if op == OP_STR:
+                stack.append(strings[value])
+            elif op == OP_REF:
+                stack.append(built[value])
+            elif op == OP_INT:
+                stack.append(value >> 1 if not value & 1 else -((value + 1) >> 1))
+            elif op == OP_LIST or op == OP_TUPLE:
+                if len(stack) < value:
+                    raise SerializationError("Недостаточно значений для списка")
+                items = stack[len(stack) - value :]
+                del stack[len(stack) - value :]
+                stack.append(items if op == OP_LIST else tuple(items))
+            elif op == OP_SPAN and version > 1:
+                position = pack_span(value, value + read_varint())
+            else:
+                raise SerializationError(f"Неизвестный код {op}")
+
+        elif op == OP_NONE:
+            stack.append(None)
+        elif op == OP_TRUE:
+            stack.append(True)
+        elif op == OP_FALSE:
+            stack.append(False)
+        elif op == OP_FLOAT:
+            stack.append(_DOUBLE.unpack_from(data, pos)[0])
+            pos += 8
+        else:
+            raise SerializationError(f"Неизвестный код {op}")
+
+    if len(stack) != 1 or not isinstance(stack[0], ASTNode):
+        raise SerializationError("Данные не образуют одно дерево")
+    return stack[0]
+
+
+def dump(node: ASTNode, file: BinaryIO):
+    file.write(dumps(node))
+
+
+def load(file: BinaryIO) -> ASTNode:
+    return loads(file.read())
@@ -0,0 +1,76 @@
+"""
+Стандартные функции
+Реестр стандартных функций Pascal: число аргументов, тип результата,
+запись в C++, отсутствие побочных эффектов и стоимость вызова — для
+семантического анализа, оптимизаций и генерации кода, а также имена
+стандартных процедур
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass(slots=True, frozen=True)
+class Builtin:
+    name: str
+    arity: int
+    result: Optional[str]  # тип результата; None — тип первого аргумента
+    # Имя функции C++ или шаблон, в котором {0} заменяется аргументом
+    cpp: str
+    # Определение одноименной inline-функции C++ для заголовка программы.
+    # Нужно, если шаблон повторяет аргумент: тогда сложный аргумент
+    # передается этой функции и вычисляется один раз
+    runtime: str = ""
+    # Вызов не изменяет переменных и не выполняет ввода-вывода; такие
+    # вызовы можно выносить из циклов и вычислять один раз
+    pure: bool = True
+    # Условная стоимость вызова (1 — арифметическая операция): вызов
+    # стоимостью 0 не выносится во временную переменную
+    cost: int = 1
+
+    @property
+    def repeats_argument(self) -> bool:
+        return self.cpp.count("{0}") > 1
+
+
+# Стандартные процедуры: ввод-вывод (из них — чтение, которое записывает
+# аргументы) и переходы в цикле
+IO_PROCEDURES = ("write", "writeln", "read", "readln")
+READ_PROCEDURES = ("read", "readln")
+JUMP_PROCEDURES = ("break", "continue")
+
+# Стандартные функции по именам. Как и стандартные процедуры, они важнее
+# одноименных пользовательских
+BUILTIN_FUNCTIONS: Dict[str, Builtin] = {}
+
+
+def register_builtin(builtin: Builtin) -> Builtin:
+    # Добавляет стандартную функцию или заменяет прежнюю с тем же именем
+    if builtin.repeats_argument and (builtin.arity != 1 or not builtin.runtime):
+        raise ValueError(
+            f"Шаблон '{builtin.cpp}' повторяет аргумент: нужна функция "
+            f"одного аргумента с определением runtime"
+        )
+    BUILTIN_FUNCTIONS[builtin.name] = builtin
+    return builtin
+
+
+def is_pure_builtin(name: str) -> bool:
+    builtin = BUILTIN_FUNCTIONS.get(name)
+    return builtin is not None and builtin.pure
+
+
+for _builtin in (
+    Builtin("abs", 1, None, "abs"),
+    Builtin(
+        "sqr", 1, None, "({0} * {0})",
+        runtime="template <typename T>\ninline T sqr(T x) {\n    return x * x;\n}",
+    ),
+    Builtin("sqrt", 1, "real", "sqrt", cost=10),
+    Builtin("sin", 1, "real", "sin", cost=40),
+    Builtin("cos", 1, "real", "cos", cost=40),
+    Builtin("ln", 1, "real", "log", cost=40),
+    Builtin("exp", 1, "real", "exp", cost=40),
+    Builtin("length", 1, "integer", "{0}.length()"),
+):
+    register_builtin(_builtin)
@@ -0,0 +1,487 @@
+"""
+Временные переменные проходов оптимизации
+Общая основа выноса инвариантов (licm.py) и устранения общих
+подвыражений (cse.py): выражения вычисляются заранее во временные
+переменные
+"""
+
+from typing import Dict, List, Optional
+
+from src.ast_nodes import (
+    ASTNode,
+    Program,
+    VarDeclaration,
+    Type,
+    ArrayType,
+    Function,
+    Statement,
+    CompoundStatement,
+    AssignmentStatement,
+    IfStatement,
+    WhileStatement,
+    RepeatStatement,
+    ForStatement,
+    CaseStatement,
+    ProcedureCall,
+    Expression,
+    BinaryOp,
+    UnaryOp,
+    Variable,
+    IntegerLiteral,
+    RealLiteral,
+    StringLiteral,
+    CharLiteral,
+    BooleanLiteral,
+    FunctionCall,
+    node_key,
+)
+from src.folding import LITERAL_CLASSES
+from src.optimizer import (
+    global_effects,
+    literal_value,
+    reference_parameters,
+    statement_children,
+)
+from src.semantic import Scope, SemanticInfo, Symbol, analyze
+from src.standard import (
+    BUILTIN_FUNCTIONS,
+    IO_PROCEDURES,
+    READ_PROCEDURES,
+    is_pure_builtin,
+)
+from src.visitor import NodeTransformer, NodeVisitor
+
+# Типы выражений, которые выносятся во временные переменные
+HOISTED_TYPES = frozenset(("integer", "real", "boolean", "char", "string"))
+
+# Элемент множества записей цикла: запись, которая может изменить
+# var-параметры, параметры-массивы и глобальные переменные через
+# псевдонимы (var-параметр может ссылаться на глобальную переменную)
+ALIASED = None
+
+NO_WRITES = frozenset()
+
+_LITERAL_TAGS = {
+    IntegerLiteral: "integer",
+    RealLiteral: "real",
+    StringLiteral: "string",
+    CharLiteral: "char",
+    BooleanLiteral: "boolean",
+}
+
+
+def pure_subprograms(program: Program, semantics: SemanticInfo,
+                     effects: Optional[Dict[str, set]] = None) -> set:
+    # Имена подпрограмм без побочных эффектов, видимых вызывающему: они не
+    # обращаются к глобальным переменным (и через вызовы), не выполняют
+    # ввод-вывод и вызывают только такие же подпрограммы. Запись в
+    # собственные var-параметры допустима — ее учитывает вызывающий
+    if effects is None:
+        effects = global_effects(program, semantics)
+    candidates = {}
+    for subprogram in program.subprograms:
+        if effects.get(subprogram.name):
+            continue
+        # Ввод-вывод — операторы, поэтому выражения не просматриваются
+        work = [subprogram.body]
+        while work:
+            stmt = work.pop()
+            if isinstance(stmt, ProcedureCall) and stmt.name in IO_PROCEDURES:
+                break
+            work.extend(child for child in statement_children(stmt) if child is not None)
+        else:
+            candidates[subprogram.name] = {
+                symbol.name for symbol in semantics.scope(subprogram).references.values()
+                if symbol.kind in ("function", "procedure")
+            }
+
+    changed = True
+    while changed:
+        changed = False
+        for name in list(candidates):
+            if any(callee not in candidates for callee in candidates[name]):
+                del candidates[name]
+                changed = True
+    return set(candidates)
+
+
+def expression_text(expr: Expression) -> str:
+    # Запись выражения на Pascal (для отчета о вынесенных выражениях)
+    parts = []
+    work = [expr]
+    while work:
+        item = work.pop()
+        if item.__class__ is str:
+            parts.append(item)
+        elif isinstance(item, BinaryOp):
+            work.extend((")", item.right, f" {item.operator} ", item.left, "("))
+        elif isinstance(item, UnaryOp):
+            operator = "not " if item.operator == "not" else item.operator
+            work.extend((item.operand, operator))
+        elif isinstance(item, (Variable, FunctionCall)):
+            arguments = item.indices if isinstance(item, Variable) else item.arguments
+            brackets = "[]" if isinstance(item, Variable) else "()"
+            if arguments:
+                work.append(brackets[1])
+                for number in range(len(arguments) - 1, -1, -1):
+                    work.append(arguments[number])
+                    if number:
+                        work.append(", ")
+                work.append(brackets[0])
+            work.append(item.name)
+        elif isinstance(item, (StringLiteral, CharLiteral)):
+            parts.append("'" + item.value.replace("'", "''") + "'")
+        elif isinstance(item, BooleanLiteral):
+            parts.append("true" if item.value else "false")
+        elif isinstance(item, (IntegerLiteral, RealLiteral)):
+            parts.append(str(item.value))
+    text = "".join(parts)
+    if isinstance(expr, BinaryOp):
+        text = text[1:-1]
+    return text
+
+
+def expression_shape(node: Expression, children: list) -> tuple:
+    # Структура узла по номерам структур дочерних узлов: одинаковые по
+    # структуре выражения имеют равные кортежи
+    if isinstance(node, BinaryOp):
+        return ("op", node.operator, *children)
+    if isinstance(node, UnaryOp):
+        return ("unary", node.operator, *children)
+    if isinstance(node, Variable):
+        return ("variable", node.name, *children)
+    if isinstance(node, FunctionCall):
+        return ("call", node.name, *children)
+    # -0.0 и 0.0 равны в Python, но не в C++
+    tag = next(tag for cls, tag in _LITERAL_TAGS.items() if isinstance(node, cls))
+    return (tag, repr(node.value))
+
+
+class Replacement(NodeTransformer):
+    # Заменяет вынесенные выражения (ключ узла -> временная переменная) и
+    # удаляет из составных операторов перенесенные присваивания. Тип
+    # перестроенного выражения запоминается: в таблицах семантического
+    # анализа нового узла нет. Перестроенный узел заменяется по ключу
+    # исходного: выражение может содержать другое заменяемое выражение
+    def __init__(self, owner: "TemporaryPass", replacements: dict, removed: set = frozenset()):
+        self.owner = owner
+        self.replacements = replacements
+        self.removed = removed
+        self.origins: Dict[int, int] = {}  # ключ перестроенного узла -> ключ исходного
+
+    def rebuild(self, node: ASTNode, changed: dict) -> ASTNode:
+        new = NodeTransformer.rebuild(node, changed)
+        key = node_key(node)
+        self.origins[node_key(new)] = self.origins.get(key, key)
+        if isinstance(node, Expression):
+            self.owner.types[node_key(new)] = (new, self.owner.type_of(node))
+        return new
+
+    def generic_visit(self, node: ASTNode) -> ASTNode:
+        key = node_key(node)
+        return self.replacements.get(self.origins.get(key, key), node)
+
+    def visit_CompoundStatement(self, stmt: CompoundStatement) -> CompoundStatement:
+        if not self.removed:
+            return stmt
+        statements = [item for item in stmt.statements if node_key(item) not in self.removed]
+        if len(statements) == len(stmt.statements):
+            return stmt
+        return NodeTransformer.rebuild(stmt, {"statements": statements})
+
+
+class TemporaryPass(NodeVisitor):
+    """
+    Основа проходов, которые вычисляют выражения заранее во временные
+    переменные <prefix><N> (LoopInvariantMotion, CommonSubexpressions):
+    чистые функции программы, записи операторов в переменные, разбор узлов
+    выражения (чистый ли он, может ли прервать программу), типы
+    перестроенных выражений и объявления временных переменных. Подкласс
+    перестраивает тело подпрограммы или программы в process_body; после
+    run() semantics — результат анализа итогового дерева
+    """
+
+    # Префикс имен временных переменных задает подкласс
+    prefix = "tmp"
+
+    def __init__(self):
+        self.semantics: Optional[SemanticInfo] = None
+
+    def run(self, program: Program, semantics: Optional[SemanticInfo] = None) -> Program:
+        if semantics is None:
+            semantics = analyze(program)
+        self.semantics = semantics
+        if semantics.errors:
+            return program
+        self.effects = global_effects(program, semantics)
+        pure = pure_subprograms(program, semantics, self.effects)
+        # Функции, вызов которых можно вычислить заранее
+        self.functions = {
+            subprogram.name for subprogram in program.subprograms
+            if subprogram.name in pure and isinstance(subprogram, Function)
+            and all(not param.by_reference and not isinstance(param.param_type, ArrayType)
+                    for param in subprogram.parameters)
+        }
+
+        changed = False
+        subprograms = []
+        for subprogram in program.subprograms:
+            body, declarations = self.run_body(subprogram.body, semantics.scope(subprogram))
+            if declarations:
+                changed = True
+                subprogram = NodeTransformer.rebuild(subprogram, {
+                    "body": body,
+                    "variables": list(subprogram.variables) + declarations,
+                })
+            subprograms.append(subprogram)
+        body, declarations = self.run_body(program.body, semantics.scope())
+        if not changed and not declarations:
+            return program
+
+        program = NodeTransformer.rebuild(program, {
+            "variables": list(program.variables) + declarations,
+            "subprograms": subprograms,
+            "body": body,
+        })
+        self.semantics = analyze(program)
+        return program
+
+    def run_body(self, body: CompoundStatement, scope: Scope) -> tuple:
+        # Перестроенное тело и объявления временных переменных
+        self.scope = scope
+        self.temporaries: Dict[str, str] = {}  # имя -> тип
+        self.declarations: List[VarDeclaration] = []
+        self.number = 0
+        # Типы перестроенных выражений: ключ -> (узел, тип). Узел хранится,
+        # чтобы его id не достался новому узлу, пока таблица жива
+        self.types: Dict[int, tuple] = {}
+        # Имена, к которым в подпрограмме возможен доступ через псевдонимы
+        self.aliased = {
+            symbol.name for symbol in scope.symbols.values()
+            if symbol.kind == "parameter"
+            and (symbol.by_reference or isinstance(symbol.type, ArrayType))
+        }
+        if scope.parent is not None:
+            self.aliased.update(scope.parent.symbols)
+        return self.process_body(body), self.declarations
+
+    def process_body(self, body: CompoundStatement) -> Statement:
+        raise NotImplementedError
+
+    # Типы и символы (в том числе перестроенных узлов и временных переменных)
+
+    def type_of(self, node: Expression) -> Optional[str]:
+        key = node_key(node)
+        if key in self.types:
+            return self.types[key][1]
+        if isinstance(node, Variable) and node.name in self.temporaries:
+            return self.temporaries[node.name]
+        return self.scope.type_of(node)
+
+    def lookup(self, name: str) -> Optional[Symbol]:
+        # Имя в теле всегда относится к одному символу, поэтому символ
+        # перестроенного узла находится по имени
+        return self.scope.lookup(name)
+
+    def temporary(self, type_name: str) -> str:
+        # Новая временная переменная, имя которой не занято в области
+        while True:
+            self.number += 1
+            name = f"{self.prefix}{self.number}"
+            if self.scope.lookup(name) is None and name not in self.temporaries:
+                break
+        self.temporaries[name] = type_name
+        self.declarations.append(VarDeclaration([name], Type(type_name)))
+        return name
+
+    # Записи операторов: имена переменных, которые оператор может изменить
+
+    def call_writes(self, symbol: Symbol, arguments, writes: set):
+        # Вызов пользовательской подпрограммы: var-аргументы, массивы
+        # (передаются в C++ указателем) и ее глобальные переменные
+        for argument, by_reference in zip(arguments, reference_parameters(symbol)):
+            if isinstance(argument, Variable):
+                argument_symbol = self.lookup(argument.name)
+                if by_reference or argument_symbol is not None and isinstance(
+                    argument_symbol.type, ArrayType
+                ):
+                    self.add_write(argument.name, writes)
+        variables = self.effects.get(symbol.name, ())
+        for variable in variables:
+            if self.lookup(variable.name) is variable:
+                writes.add(variable.name)
+        if variables:
+            writes.add(ALIASED)
+
+    def add_write(self, name: str, writes: set):
+        writes.add(name)
+        if name in self.aliased:
+            writes.add(ALIASED)
+
+    def expression_writes(self, expressions, writes: set):
+        for expr in expressions:
+            for node in expression_nodes(expr):
+                if isinstance(node, FunctionCall) and not is_pure_builtin(node.name):
+                    symbol = self.lookup(node.name)
+                    if symbol is not None and symbol.kind == "function":
+                        self.call_writes(symbol, node.arguments, writes)
+
+    def own_writes(self, stmt: Statement, writes: set, calls: bool = True):
+        # Записи самого оператора, без вложенных операторов. calls=False —
+        # выражения оператора не вызывают функций с побочными эффектами
+        if isinstance(stmt, AssignmentStatement):
+            symbol = self.lookup(stmt.variable.name)
+            if symbol is None or symbol.kind not in ("function", "procedure"):
+                self.add_write(stmt.variable.name, writes)
+            expressions = (stmt.expression, *stmt.variable.indices)
+        elif isinstance(stmt, ProcedureCall):
+            if stmt.name in READ_PROCEDURES:
+                for argument in stmt.arguments:
+                    if isinstance(argument, Variable):
+                        self.add_write(argument.name, writes)
+            expressions = stmt.arguments
+            if stmt.name not in IO_PROCEDURES:
+                symbol = self.lookup(stmt.name)
+                if symbol is not None and symbol.kind == "procedure":
+                    self.call_writes(symbol, stmt.arguments, writes)
+        elif isinstance(stmt, ForStatement):
+            self.add_write(stmt.variable, writes)
+            expressions = (stmt.start_value, stmt.end_value)
+        elif isinstance(stmt, (IfStatement, WhileStatement, RepeatStatement)):
+            expressions = (stmt.condition,)
+        elif isinstance(stmt, CaseStatement):
+            expressions = (stmt.expression,)
+        else:
+            return
+        if calls:
+            self.expression_writes(expressions, writes)
+
+    # Выражения операторов
+
+    def heads(self, stmt: Statement) -> list:
+        # Выражения, которые оператор вычисляет сам (без вложенных
+        # операторов). Переменная, которой присваивается значение или
+        # которая передается var-аргументом, в список не входит — только
+        # ее индексы
+        if isinstance(stmt, AssignmentStatement):
+            return [*stmt.variable.indices, stmt.expression]
+        if isinstance(stmt, ProcedureCall):
+            if stmt.name in READ_PROCEDURES:
+                return [index for arg in stmt.arguments if isinstance(arg, Variable)
+                        for index in arg.indices]
+            if stmt.name in IO_PROCEDURES:
+                return list(stmt.arguments)
+            symbol = self.lookup(stmt.name)
+            if symbol is None or symbol.kind != "procedure":
+                return []
+            heads = []
+            for argument, by_reference in zip(stmt.arguments, reference_parameters(symbol)):
+                if by_reference and isinstance(argument, Variable):
+                    heads.extend(argument.indices)
+                else:
+                    heads.append(argument)
+            return heads
+        if isinstance(stmt, (IfStatement, WhileStatement, RepeatStatement)):
+            return [stmt.condition]
+        if isinstance(stmt, ForStatement):
+            return [stmt.start_value, stmt.end_value]
+        if isinstance(stmt, CaseStatement):
+            return [stmt.expression]
+        return []
+
+    def analyze(self, expr: Expression, writes: set) -> dict:
+        # Для каждого узла выражения: (не зависит ли он от записей writes и
+        # вызовов с побочными эффектами, может ли его вычисление прервать
+        # программу)
+        info = {}
+        for node in reversed(list(expression_nodes(expr))):
+            info[node_key(node)] = self.classify(node, writes, info)
+        return info
+
+    def classify(self, node: ASTNode, writes: set, info: dict) -> tuple:
+        children = [info[node_key(child)] for child in expression_children(node)]
+        invariant = all(item[0] for item in children)
+        traps = any(item[1] for item in children)
+        if isinstance(node, LITERAL_CLASSES):
+            return True, False
+        if isinstance(node, Variable):
+            name = node.name
+            if name in self.temporaries:
+                return name not in writes, False
+            symbol = self.lookup(name)
+            if symbol is None or symbol.kind not in ("variable", "parameter"):
+                return False, True
+            if name in writes or ALIASED in writes and name in self.aliased:
+                invariant = False
+            return invariant, traps or bool(node.indices)
+        if isinstance(node, BinaryOp):
+            if node.operator in ("div", "mod"):
+                divisor = literal_value(node.right)
+                if divisor.__class__ is not int or divisor in (0, -1):
+                    traps = True
+            return invariant, traps
+        if isinstance(node, UnaryOp):
+            return invariant, traps
+        if isinstance(node, FunctionCall):
+            # Чистая стандартная функция не прерывает программу: sqrt и ln
+            # отрицательного числа дают в C++ NaN
+            if is_pure_builtin(node.name):
+                return invariant, traps
+            if node.name in self.functions:
+                return invariant, True
+            return False, True
+        return False, True
+
+    def worth(self, node: Expression) -> bool:
+        # Во временную переменную выносится вычисление, а не литерал,
+        # простая переменная или стандартная функция стоимостью 0
+        if self.type_of(node) not in HOISTED_TYPES:
+            return False
+        if isinstance(node, FunctionCall):
+            builtin = BUILTIN_FUNCTIONS.get(node.name)
+            return builtin is None or builtin.cost > 0
+        if isinstance(node, BinaryOp):
+            return True
+        if isinstance(node, UnaryOp):
+            return not isinstance(node.operand, (Variable, *LITERAL_CLASSES))
+        return isinstance(node, Variable) and bool(node.indices)
+
+
+def with_children(stmt: Statement, children: list) -> Statement:
+    # Оператор с новыми дочерними операторами (в порядке statement_children)
+    if all(new is old for new, old in zip(children, statement_children(stmt))):
+        return stmt
+    if isinstance(stmt, CompoundStatement):
+        return NodeTransformer.rebuild(stmt, {"statements": list(children)})
+    if isinstance(stmt, IfStatement):
+        return NodeTransformer.rebuild(
+            stmt, {"then_statement": children[0], "else_statement": children[1]})
+    if isinstance(stmt, CaseStatement):
+        branches = [(values, child) for (values, _), child in zip(stmt.branches, children)]
+        else_stmt = children[-1] if stmt.else_statement is not None else None
+        return NodeTransformer.rebuild(stmt, {"branches": branches, "else_statement": else_stmt})
+    return NodeTransformer.rebuild(stmt, {"body": children[0]})
+
+
+def expression_nodes(expr: Expression):
+    # Узлы выражения в прямом порядке (без обхода полей, как в walk)
+    work = [expr]
+    while work:
+        node = work.pop()
+        yield node
+        children = expression_children(node)
+        if children:
+            work.extend(reversed(children))
+
+
+def expression_children(node: ASTNode) -> tuple:
+    # Дочерние узлы выражения
+    if isinstance(node, BinaryOp):
+        return node.left, node.right
+    if isinstance(node, UnaryOp):
+        return (node.operand,)
+    if isinstance(node, Variable):
+        return tuple(node.indices)
+    if isinstance(node, FunctionCall):
+        return tuple(node.arguments)
+    return ()
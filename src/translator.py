@@ -4,19 +4,76 @@
 """
 
 import sys
+import json
 import argparse
 from pathlib import Path
-from src.lexer import Lexer, LexerError
-from src.parser import Parser, ParserError
+from src.lexer import ByteLexer, Lexer, LexerError, LineIndex
+from src.parser import Parser, ParserError, StreamingParser
 from src.codegen import CodeGenerator
+from src.semantic import analyze
+from src.optimizer import Optimizer
+from src.licm import LoopInvariantMotion
+from src.cse import CommonSubexpressions
+from src.parallel import parse_parallel
+from src.ast_nodes import OBJECT_NODES, ASTArena
 
 # Установка UTF-8 кодировки для консоли на Windows
 if sys.platform == 'win32':
     import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
+# Начиная с этого размера файла (в байтах) исходный код отображается
+# в память, а лексер и парсер работают потоково, без списка токенов
+STREAMING_THRESHOLD = 1 << 20
 
-def translate_file(input_path: str, output_path: str = None, verbose: bool = False):
+
+def parse_source(input_path: str, verbose: bool = False, nodes=OBJECT_NODES,
+                 positions: bool = False):
+    """
+    Читает файл Pascal целиком и строит AST через список токенов
+    
+    Args:
+        input_path: Путь к входному файлу Pascal
+        verbose: Выводить подробную информацию
+        nodes: Конструкторы узлов (ASTArena.builder() для плоской арены)
+        positions: Записывать в узлы положение в исходном коде
+    """
+    # Чтение исходного файла
+    with open(input_path, 'r', encoding='utf-8') as f:
+        source = f.read()
+    
+    if verbose:
+        print(f"Чтение файла: {input_path}")
+        print(f"Размер исходного кода: {len(source)} символов\n")
+    
+    # Лексический анализ
+    if verbose:
+        print("=" * 60)
+        print("ЭТАП 1: Лексический анализ")
+        print("=" * 60)
+    
+    lexer = Lexer(source)
+    tokens = lexer.tokenize()
+    
+    if verbose:
+        print(f"Найдено токенов: {len(tokens)}")
+        for token in tokens:
+            print(f"  {token}")
+        print()
+    
+    # Синтаксический анализ
+    if verbose:
+        print("=" * 60)
+        print("ЭТАП 2: Синтаксический анализ")
+        print("=" * 60)
+    
+    parser = Parser(tokens, nodes=nodes, positions=positions)
+    return parser.parse()
+
+
+def translate_file(input_path: str, output_path: str = None, verbose: bool = False,
+                   jobs: int = 1, arena: bool = False, line_directives: bool = False,
+                   source_map: bool = False, optimize: bool = False):
     """
     Транслирует файл Pascal в C++
     
@@ -24,54 +81,118 @@ def translate_file(input_path: str, output_path: str = None, verbose: bool = Fal
         input_path: Путь к входному файлу Pascal
         output_path: Путь к выходному файлу C++ (необязательно)
         verbose: Выводить подробную информацию
+        jobs: Число процессов для параллельного разбора подпрограмм
+        arena: Хранить AST в плоской арене (ASTArena): в несколько раз
+            меньше памяти ценой более медленных разбора и генерации
+        line_directives: Вставлять в код C++ директивы #line со строками
+            исходного файла (для профилировщиков и отладчиков)
+        source_map: Записать рядом с файлом C++ карту строк <файл>.map (JSON)
+        optimize: Оптимизировать программу перед генерацией: свертка и
+            распространение констант, удаление мертвого кода, вынос
+            инвариантов из циклов, устранение общих подвыражений
     """
     try:
-        # Чтение исходного файла
-        with open(input_path, 'r', encoding='utf-8') as f:
-            source = f.read()
+        # Положения узлов нужны только для привязки к исходному коду
+        positions = line_directives or source_map
         
-        if verbose:
-            print(f"Чтение файла: {input_path}")
-            print(f"Размер исходного кода: {len(source)} символов\n")
+        # Подробный вывод печатает все токены, поэтому требует полного
+        # списка. Положения переводятся в строки по тексту файла, который
+        # при потоковом разборе не хранится
+        streaming = (
+            not verbose and not positions
+            and Path(input_path).stat().st_size >= STREAMING_THRESHOLD
+        )
         
-        # Лексический анализ
-        if verbose:
-            print("=" * 60)
-            print("ЭТАП 1: Лексический анализ")
-            print("=" * 60)
+        # Узлы строятся в арену, а дальше используется представление ее
+        # корня — для генератора кода оно не отличается от обычного дерева
+        store = ASTArena() if arena else None
+        nodes = store.builder() if arena else OBJECT_NODES
+        
+        if jobs > 1 and not verbose and not arena and not positions:
+            # Подпрограммы разбираются параллельно в пуле процессов
+            with open(input_path, 'r', encoding='utf-8') as f:
+                ast = parse_parallel(f.read(), jobs)
+        elif streaming:
+            # Большой файл отображается в память и лексируется по байтам,
+            # токены сразу передаются парсеру
+            with ByteLexer.from_file(input_path) as lexer:
+                ast = StreamingParser(lexer.iter_tokens(), nodes=nodes).parse()
+        else:
+            ast = parse_source(input_path, verbose, nodes, positions)
         
-        lexer = Lexer(source)
-        tokens = lexer.tokenize()
+        if arena:
+            ast = store.program()
         
         if verbose:
-            print(f"Найдено токенов: {len(tokens)}")
-            for token in tokens:
-                print(f"  {token}")
+            print(f"Программа: {ast.name}")
+            print(f"Переменных: {len(ast.variables)}")
+            print(f"Подпрограмм: {len(ast.subprograms)}")
             print()
         
-        # Синтаксический анализ
+        line_index = None
+        if positions:
+            with open(input_path, 'r', encoding='utf-8') as f:
+                line_index = LineIndex(f.read())
+        
+        # Оптимизатор строит новое дерево, поэтому выполняется до
+        # семантического анализа: его таблицы привязаны к узлам
+        semantics = None
+        if optimize:
+            optimizer = Optimizer()
+            ast = optimizer.optimize(ast)
+            semantics = optimizer.semantics
+            if verbose:
+                print(f"Свернуто константных операций: {optimizer.folder.folded}")
+                print(f"Подставлено значений переменных: {optimizer.propagated}")
+                print(f"Упрощено ветвлений и циклов: {optimizer.pruned}")
+                print(f"Удалено недостижимых операторов: {optimizer.unreachable}")
+                print(f"Удалено мертвых присваиваний: {optimizer.removed}")
+            # Вынос инвариантов из циклов — после распространения констант,
+            # которое делает инвариантными больше выражений
+            mover = LoopInvariantMotion()
+            ast = mover.hoist(ast, semantics)
+            semantics = mover.semantics
+            if verbose:
+                print(f"Вынесено инвариантов из циклов: {len(mover.hoisted)}")
+                for scope_name, loop, text, name in mover.hoisted:
+                    print(f"  {scope_name}: {text} -> {name} (цикл {loop})")
+            # Общие подвыражения — после выноса инвариантов: в телах циклов
+            # остаются только выражения, которые вычисляются заново
+            eliminator = CommonSubexpressions()
+            ast = eliminator.eliminate(ast, semantics)
+            semantics = eliminator.semantics
+            if verbose:
+                print(f"Устранено общих подвыражений: {len(eliminator.eliminated)}")
+                for scope_name, text, name, count in eliminator.eliminated:
+                    print(f"  {scope_name}: {text} -> {name} (вхождений: {count})")
+                print()
+        
+        # Семантический анализ: области видимости и типы для генератора
         if verbose:
             print("=" * 60)
-            print("ЭТАП 2: Синтаксический анализ")
+            print("ЭТАП 3: Семантический анализ")
             print("=" * 60)
         
-        parser = Parser(tokens)
-        ast = parser.parse()
+        if semantics is None:
+            semantics = analyze(ast)
+        if semantics.errors:
+            for error in semantics.errors:
+                print(f"✗ Семантическая ошибка: {describe_semantic_error(error, line_index)}",
+                      file=sys.stderr)
+            return False
         
         if verbose:
-            print(f"Программа: {ast.name}")
-            print(f"Переменных: {len(ast.variables)}")
-            print(f"Подпрограмм: {len(ast.subprograms)}")
+            print(f"Областей видимости: {len(semantics.scopes) + 1}")
             print()
         
         # Генерация кода C++
         if verbose:
             print("=" * 60)
-            print("ЭТАП 3: Генерация кода C++")
+            print("ЭТАП 4: Генерация кода C++")
             print("=" * 60)
         
-        generator = CodeGenerator()
-        cpp_code = generator.generate(ast)
+        generator = CodeGenerator(line_index, input_path, line_directives)
+        cpp_code = generator.generate(ast, semantics)
         
         if verbose:
             print(f"Сгенерировано строк кода: {len(cpp_code.splitlines())}")
@@ -86,10 +207,24 @@ def translate_file(input_path: str, output_path: str = None, verbose: bool = Fal
         with open(output_path, 'w', encoding='utf-8') as f:
             f.write(cpp_code)
         
+        # Карта строк: [строка C++, строка Pascal, столбец Pascal] для
+        # первой строки кода каждого оператора (строки с 1)
+        if source_map:
+            map_path = f"{output_path}.map"
+            with open(map_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    "version": 1,
+                    "file": str(output_path),
+                    "source": str(input_path),
+                    "mappings": generator.source_map,
+                }, f, ensure_ascii=False)
+        
         print("=" * 60)
         print(f"✓ Трансляция успешно завершена!")
         print(f"  Входной файл:  {input_path}")
         print(f"  Выходной файл: {output_path}")
+        if source_map:
+            print(f"  Карта строк:   {map_path}")
         print("=" * 60)
         
         if verbose:
@@ -120,6 +255,86 @@ def translate_file(input_path: str, output_path: str = None, verbose: bool = Fal
         return False
 
 
+def describe_semantic_error(error, line_index=None) -> str:
+    # Текст семантической ошибки, с положением, если оно известно
+    span = error.node.span
+    if line_index is None or span is None:
+        return str(error)
+    line, column = line_index.position(span[0])
+    return f"{error} (строка {line}, столбец {column})"
+
+
+def check_file(input_path: str) -> int:
+    """
+    Проверяет файл Pascal без генерации кода: собирает все лексические и
+    синтаксические ошибки за один проход и ничего не записывает
+    
+    Args:
+        input_path: Путь к входному файлу Pascal
+    
+    Returns:
+        Количество найденных ошибок
+    """
+    try:
+        with open(input_path, 'r', encoding='utf-8') as f:
+            source = f.read()
+    except FileNotFoundError:
+        print(f"✗ Ошибка: Файл '{input_path}' не найден", file=sys.stderr)
+        return 1
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"✗ {input_path}: Ошибка чтения: {e}", file=sys.stderr)
+        return 1
+    
+    lexer = Lexer(source, recover=True)
+    parser = Parser(lexer.tokenize(), recover=True, positions=True)
+    program = parser.parse()
+    
+    # Ошибки выводятся в порядке их положения в файле
+    errors = [
+        (error.line, error.column, "Лексическая ошибка", error)
+        for error in lexer.errors
+    ]
+    errors.extend(
+        (error.token.line, error.token.column, "Синтаксическая ошибка", error)
+        for error in parser.errors
+    )
+    
+    # Дерево с синтаксическими ошибками неполно, поэтому семантический
+    # анализ выполняется только для правильной программы
+    if not errors:
+        for error in analyze(program).errors:
+            span = error.node.span
+            line, column = lexer.index.position(span[0]) if span else (0, 0)
+            errors.append((line, column, "Семантическая ошибка",
+                           describe_semantic_error(error, lexer.index)))
+    errors.sort(key=lambda item: (item[0], item[1]))
+    
+    for _, _, kind, error in errors:
+        print(f"✗ {input_path}: {kind}: {error}", file=sys.stderr)
+    
+    return len(errors)
+
+
+def check_files(input_paths: list) -> bool:
+    """
+    Проверяет набор файлов (режим --check) и печатает сводку
+    
+    Returns:
+        True, если ошибок не найдено
+    """
+    failed = 0
+    total = 0
+    for input_path in input_paths:
+        count = check_file(input_path)
+        total += count
+        if count:
+            failed += 1
+    
+    print(f"Проверено файлов: {len(input_paths)}, с ошибками: {failed}, "
+          f"всего ошибок: {total}")
+    return failed == 0
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Транслятор Pascal → C++',
@@ -130,18 +345,54 @@ def main():
   python run_translator.py program.pas -o output.cpp      # Указать имя выходного файла
   python run_translator.py program.pas -v                 # Подробный вывод
   python run_translator.py program.pas -v -o result.cpp   # Все опции вместе
+  python run_translator.py --check src/*.pas              # Только проверка ошибок
+  python run_translator.py big.pas -j 8                   # Параллельный разбор
+  python run_translator.py huge.pas --arena               # AST в плоской арене
+  python run_translator.py program.pas --line-directives  # #line для профилировщика
+  python run_translator.py program.pas -O                 # Оптимизация
         """
     )
     
-    parser.add_argument('input', help='Входной файл Pascal (.pas)')
+    parser.add_argument('input', nargs='+', help='Входные файлы Pascal (.pas)')
     parser.add_argument('-o', '--output', help='Выходной файл C++ (.cpp)')
     parser.add_argument('-v', '--verbose', action='store_true', 
                         help='Подробный вывод процесса трансляции')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Число процессов для параллельного разбора '
+                             'подпрограмм (по умолчанию 1)')
+    parser.add_argument('--arena', action='store_true',
+                        help='Хранить AST в плоской арене: меньше памяти '
+                             'для очень больших программ, но медленнее')
+    parser.add_argument('--line-directives', action='store_true',
+                        help='Вставлять директивы #line: профилировщики и '
+                             'отладчики покажут строки исходного файла Pascal')
+    parser.add_argument('--source-map', action='store_true',
+                        help='Записать карту строк C++ → Pascal в файл '
+                             '<выходной файл>.map (JSON)')
+    parser.add_argument('-O', '--optimize', action='store_true',
+                        help='Оптимизировать программу: свертка и '
+                             'распространение констант, удаление мертвого кода, '
+                             'вынос инвариантов из циклов, устранение общих '
+                             'подвыражений')
+    parser.add_argument('--check', action='store_true',
+                        help='Только найти все лексические и синтаксические '
+                             'ошибки, без генерации кода и записи файлов')
     parser.add_argument('--version', action='version', version='%(prog)s 1.0')
     
     args = parser.parse_args()
     
-    success = translate_file(args.input, args.output, args.verbose)
+    if args.check:
+        success = check_files(args.input)
+    elif args.output and len(args.input) > 1:
+        parser.error('параметр -o допустим только для одного входного файла')
+    else:
+        success = True
+        for input_path in args.input:
+            success = translate_file(
+                input_path, args.output, args.verbose, args.jobs, args.arena,
+                args.line_directives, args.source_map, args.optimize
+            ) and success
+    
     sys.exit(0 if success else 1)
 
 
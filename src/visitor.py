@@ -0,0 +1,195 @@
+"""
+Обход и преобразование AST
+Базовые классы проходов с диспетчеризацией по типу узла
+"""
+
+from typing import Callable, Iterator
+
+from src.ast_nodes import NODE_KINDS, ASTNode, child_fields, node_fields
+
+
+def node_class(node_type: type) -> type:
+    # Класс узла из NODE_CLASSES (представления ASTArena — его подклассы)
+    for base in node_type.__mro__:
+        if base in NODE_KINDS:
+            return base
+    raise TypeError(f"{node_type.__name__} не является классом узла AST")
+
+
+_FIELD_NAMES = {}
+_CHILD_NAMES = {}
+
+
+def field_names(node_type: type) -> tuple:
+    names = _FIELD_NAMES.get(node_type)
+    if names is None:
+        names = _FIELD_NAMES[node_type] = tuple(
+            field.name for field in node_fields(node_type)
+        )
+    return names
+
+
+def child_names(node_type: type) -> tuple:
+    # Имена полей, в которых могут быть дочерние узлы
+    names = _CHILD_NAMES.get(node_type)
+    if names is None:
+        names = _CHILD_NAMES[node_type] = tuple(
+            field.name for field in child_fields(node_type)
+        )
+    return names
+
+
+def iter_child_nodes(node: ASTNode) -> Iterator[ASTNode]:
+    # Дочерние узлы по порядку полей, в том числе из списков и кортежей
+    # (индексы, аргументы, границы массивов, ветви case)
+    for name in child_names(type(node)):
+        pending = [getattr(node, name)]
+        while pending:
+            value = pending.pop()
+            if isinstance(value, ASTNode):
+                yield value
+            elif isinstance(value, (list, tuple)):
+                pending.extend(reversed(value))
+
+
+def walk(node: ASTNode) -> Iterator[ASTNode]:
+    # Все узлы дерева в прямом порядке, без рекурсии
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(list(iter_child_nodes(node))))
+
+
+class NodeVisitor:
+    """
+    Базовый класс проходов по AST. Метод для узла выбирается по type(node):
+    visit_<имя класса>, а если его нет — метод ближайшего базового класса
+    узла (visit_Statement, visit_Expression ...) или generic_visit.
+    Найденный метод запоминается в таблице класса прохода, поэтому
+    повторный выбор — одно обращение к словарю.
+
+    Методы получают узел и дополнительные аргументы прохода. Обход дочерних
+    узлов — забота самого прохода: для глубоких деревьев — по явному стеку,
+    как в CodeGenerator, или через walk()
+    """
+
+    _dispatch_table = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch_table = {}
+
+    @classmethod
+    def dispatch(cls, node_type: type) -> Callable:
+        # Несвязанный метод для узлов типа node_type: method(self, node, ...)
+        method = cls._dispatch_table.get(node_type)
+        if method is None:
+            method = cls.generic_visit
+            for base in node_type.__mro__:
+                found = getattr(cls, "visit_" + base.__name__, None)
+                if found is not None:
+                    method = found
+                    break
+            cls._dispatch_table[node_type] = method
+        return method
+
+    def visit(self, node: ASTNode, *args):
+        return self.dispatch(type(node))(self, node, *args)
+
+    def generic_visit(self, node: ASTNode, *args):
+        return None
+
+
+# Маркеры на стеке NodeTransformer: сборка узла или последовательности
+_REBUILD_NODE = object()
+_REBUILD_SEQUENCE = object()
+
+
+class NodeTransformer(NodeVisitor):
+    """
+    Проход, строящий новое дерево. transform() обходит дерево без рекурсии
+    в обратном порядке: метод узла получает узел, дочерние узлы которого
+    уже преобразованы, и возвращает узел-замену (generic_visit возвращает
+    узел без изменений). Узлы не изменяются на месте: если дочерние узлы
+    изменились, строится копия (с тем же положением span), иначе узел
+    переиспользуется. Общий узел (InterningNodes) преобразуется один раз
+    """
+
+    def transform(self, root: ASTNode, *args) -> ASTNode:
+        table = self._dispatch_table
+        done = {}  # id узла -> (узел, замена)
+        results = []
+        work = [root]
+
+        while work:
+            item = work.pop()
+
+            if item is _REBUILD_NODE:
+                node = work.pop()
+                names = work.pop()
+                start = len(results) - len(names)
+                values = results[start:]
+                del results[start:]
+                new = node
+                for name, value in zip(names, values):
+                    if value is not getattr(node, name):
+                        new = self.rebuild(node, dict(zip(names, values)))
+                        break
+                new_type = type(new)
+                new = (table.get(new_type) or self.dispatch(new_type))(self, new, *args)
+                done[id(node)] = (node, new)
+                results.append(new)
+
+            elif item is _REBUILD_SEQUENCE:
+                sequence = work.pop()
+                start = len(results) - len(sequence)
+                values = results[start:]
+                del results[start:]
+                for value, old in zip(values, sequence):
+                    if value is not old:
+                        sequence = values if isinstance(sequence, list) else tuple(values)
+                        break
+                results.append(sequence)
+
+            elif isinstance(item, ASTNode):
+                finished = done.get(id(item))
+                if finished is not None:
+                    results.append(finished[1])
+                    continue
+                item_type = type(item)
+                names = child_names(item_type)
+                if not names:
+                    # Лист (литерал, тип, пустой оператор): сразу метод узла
+                    new = (table.get(item_type) or self.dispatch(item_type))(self, item, *args)
+                    done[id(item)] = (item, new)
+                    results.append(new)
+                    continue
+                work.append(names)
+                work.append(item)
+                work.append(_REBUILD_NODE)
+                for name in reversed(names):
+                    work.append(getattr(item, name))
+
+            elif isinstance(item, (list, tuple)) and item:
+                work.append(item)
+                work.append(_REBUILD_SEQUENCE)
+                work.extend(reversed(item))
+
+            else:
+                results.append(item)
+
+        return results[0]
+
+    @staticmethod
+    def rebuild(node: ASTNode, changed: dict) -> ASTNode:
+        # Копия узла с новыми значениями полей из changed (и тем же position)
+        node_type = type(node)
+        values = [
+            changed[name] if name in changed else getattr(node, name)
+            for name in field_names(node_type)
+        ]
+        return node_class(node_type)(*values, position=node.position)
+
+    def generic_visit(self, node: ASTNode, *args) -> ASTNode:
+        return node